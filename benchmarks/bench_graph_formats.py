@@ -0,0 +1,97 @@
+"""Compare load/save times of the knowledge graph storage formats.
+
+Usage:
+    python -m benchmarks.bench_graph_formats [--sizes 10 1000 10000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from services.knowledge_graph import mastery
+from services.knowledge_graph.arrow_store import ArrowFileStore
+from services.knowledge_graph.storage import GraphStore, JSONFileStore, SQLiteStore
+
+
+def make_graph(topics: int, seed: int = 0) -> Dict[str, dict]:
+    rng = random.Random(seed)
+    graph = {"topics": {}}
+    start = datetime(2026, 1, 1)
+    for i in range(topics):
+        name = f"Unit {i // 20 + 1}: topic {i}"
+        for _ in range(rng.randint(1, 4)):
+            now = start + timedelta(seconds=rng.randint(0, 200 * 86400), microseconds=rng.randint(0, 999999))
+            mastery.update_mastery(graph, name, rng.choice([-10, 5, 10]), now=now)
+    return graph
+
+
+def _median_ms(fn: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def bench_store(name: str, store: GraphStore, graph: Dict[str, dict], repeat: int) -> Dict[str, object]:
+    student_id = "bench"
+    row = {"format": name}
+    row["save_ms"] = _median_ms(lambda: store.save(student_id, graph), repeat)
+    assert store.load(student_id) == graph, f"{name} did not round-trip the graph"
+    row["load_ms"] = _median_ms(lambda: store.load(student_id), repeat)
+    # The graph cache only ever goes through the compact calls
+    compact = store.load_compact(student_id)
+    row["load_compact_ms"] = _median_ms(lambda: store.load_compact(student_id), repeat)
+    row["save_compact_ms"] = _median_ms(lambda: store.save_compact(student_id, compact), repeat)
+    if isinstance(store, ArrowFileStore):
+        row["partial_ms"] = _median_ms(lambda: store.read_columns(student_id, ["topic", "mastery"]), repeat)
+        row["bytes"] = os.path.getsize(store._path(student_id))
+    elif isinstance(store, JSONFileStore):
+        row["bytes"] = os.path.getsize(store._path(student_id))
+    return row
+
+
+def run(sizes: List[int], repeat: int) -> List[Dict[str, object]]:
+    rows = []
+    for size in sizes:
+        graph = make_graph(size)
+        with tempfile.TemporaryDirectory() as tmp:
+            stores = [
+                ("json", JSONFileStore(os.path.join(tmp, "json"))),
+                ("sqlite", SQLiteStore(os.path.join(tmp, "sqlite", "knowledge.sqlite3"))),
+                ("arrow", ArrowFileStore(os.path.join(tmp, "arrow"))),
+            ]
+            for name, store in stores:
+                row = bench_store(name, store, graph, repeat)
+                row["topics"] = size
+                rows.append(row)
+    return rows
+
+
+def _fmt(value: Optional[object]) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    columns = ["topics", "format", "save_ms", "load_ms", "save_compact_ms", "load_compact_ms", "partial_ms", "bytes"]
+    print(" ".join(f"{c:>15}" for c in columns))
+    for row in run(args.sizes, args.repeat):
+        print(" ".join(f"{_fmt(row.get(c)):>15}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Check and time the incremental JSON scanner against the old greedy-regex extraction.
+
+The corpus (benchmarks/data/llm_outputs.jsonl) holds model answers in the
+shapes the LLM tools get back: bare JSON, code fences, prose around the
+object, a second object, stray braces, braces and quotes inside strings,
+answers cut off at the token limit. For each the check asserts that
+extract_json_from_text finds the expected object, and fuzzes the streaming
+path: any split of the text into chunks, and any prefix of it, must give the
+same events as scanning it whole. Timing covers growing flashcard answers
+and a run of unmatched braces, which the old regex scans quadratically.
+
+Usage:
+    python -m benchmarks.bench_json_scanner [--corpus PATH] [--splits 200] [--sizes 10 100 1000]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import time
+from typing import Callable, Dict, List, Optional
+
+from utilities.llm_parsers import JSONStreamScanner, extract_json_from_text
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "data", "llm_outputs.jsonl")
+
+
+def legacy_extract_json_from_text(text: str) -> dict:
+    # The extraction as it was before the scanner, for comparison
+    m = re.search(r'\{.*\}', text, flags=re.S)
+    if not m:
+        raise ValueError("No JSON object found")
+    return json.loads(m.group(0))
+
+
+def load_corpus(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _extract(fn: Callable[[str], dict], text: str) -> Optional[dict]:
+    try:
+        return fn(text)
+    except (ValueError, json.JSONDecodeError):
+        return None
+
+
+def _scan(chunks: List[str]) -> list:
+    scanner = JSONStreamScanner()
+    events = []
+    for chunk in chunks:
+        events.extend(scanner.feed(chunk))
+    return events
+
+
+def _random_split(text: str, rng: random.Random) -> List[str]:
+    chunks, pos = [], 0
+    while pos < len(text):
+        size = rng.choice([1, 1, 2, 3, 5, 8, 13, 40])
+        chunks.append(text[pos:pos + size])
+        pos += size
+    return chunks
+
+
+def check(corpus: List[Dict], splits: int, seed: int = 0) -> List[Dict[str, object]]:
+    rng = random.Random(seed)
+    rows = []
+    for case in corpus:
+        text, expected = case["text"], case["expected"]
+        found = _extract(extract_json_from_text, text)
+        assert found == expected, f"{case['name']}: extracted {found!r}"
+        whole = _scan([text])
+        for _ in range(splits):
+            assert _scan(_random_split(text, rng)) == whole, f"{case['name']}: chunking changed the events"
+        # A prefix is what a streaming caller has seen when generation stops there
+        for cut in range(0, len(text) + 1, max(1, len(text) // 50)):
+            prefix_events = _scan([text[:cut]])
+            assert prefix_events == whole[:len(prefix_events)], f"{case['name']}: prefix {cut} disagrees"
+        items = [value for kind, _, value in whole if kind == "item"]
+        rows.append({
+            "case": case["name"],
+            "legacy_ok": _extract(legacy_extract_json_from_text, text) == expected,
+            "scanner_ok": True,
+            "items": len(items),
+        })
+    return rows
+
+
+def _median_ms(fn: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def bench(sizes: List[int], repeat: int) -> List[Dict[str, object]]:
+    rows = []
+    for size in sizes:
+        answer = {"flashcards": [{"q": f"Question {i} about {{sets}}?", "a": f"Answer \"{i}\" [see notes]"} for i in range(size)]}
+        texts = {
+            "flashcards": "Here you go:\n```json\n" + json.dumps(answer, indent=2) + "\n```\nEnjoy!",
+            "unmatched braces": "{ " * (size * 20),
+        }
+        for name, text in texts.items():
+            rows.append({
+                "input": name,
+                "chars": len(text),
+                "legacy_ms": _median_ms(lambda: _extract(legacy_extract_json_from_text, text), repeat),
+                "scanner_ms": _median_ms(lambda: _extract(extract_json_from_text, text), repeat),
+                "streamed_ms": _median_ms(lambda: _scan([text[i:i + 4] for i in range(0, len(text), 4)]), repeat),
+            })
+    return rows
+
+
+def _print(rows: List[Dict[str, object]], columns: List[str]) -> None:
+    print(" ".join(f"{c:>30}" for c in columns))
+    for row in rows:
+        print(" ".join(f"{row[c]:>30.3f}" if isinstance(row[c], float) else f"{str(row[c]):>30}" for c in columns))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--splits", type=int, default=200, help="random chunkings fuzzed per corpus entry")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    _print(check(load_corpus(args.corpus), args.splits), ["case", "legacy_ok", "scanner_ok", "items"])
+    print()
+    _print(bench(args.sizes, args.repeat), ["input", "chars", "legacy_ms", "scanner_ms", "streamed_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Simulate LLM traffic through the scheduler and compare waits with plain FIFO.
+
+A fake model with a fixed number of parallel slots answers each request after
+a fixed service time. One student starts a burst of batch study plans, others
+queue flashcards, and explanations arrive throughout. The same traffic then
+goes through a FIFO semaphore, which is how the registry used to admit LLM
+calls. The table reports wait times per priority class; with the scheduler,
+interactive waits should stay near one service time whatever the backlog.
+
+Usage:
+    python -m benchmarks.bench_llm_scheduler [--slots 2] [--service-ms 20] [--batch 40]
+"""
+import argparse
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from llm_runtime.scheduler import LLMScheduler
+
+# (delay before arrival in ms, priority, student)
+Request = Tuple[float, str, str]
+
+
+def traffic(batch: int, standard: int, interactive: int, service_ms: float) -> List[Request]:
+    requests = [(0.0, "batch", "planner") for _ in range(batch)]
+    requests += [(service_ms * (i % 5), "standard", f"student_{i % 4}") for i in range(standard)]
+    # Explanations keep arriving while the backlog drains
+    requests += [(service_ms * 2 * (i + 1), "interactive", f"student_{i % 4}") for i in range(interactive)]
+    return requests
+
+
+class FifoSlots:
+    """The baseline: a plain semaphore, first come first served."""
+
+    def __init__(self, slots: int):
+        self._sem = threading.Semaphore(slots)
+
+    @contextmanager
+    def slot(self, priority: str, student_id: str = None):
+        self._sem.acquire()
+        try:
+            yield
+        finally:
+            self._sem.release()
+
+
+def simulate(slots, requests: List[Request], service_ms: float) -> Dict[str, Dict]:
+    waits: Dict[str, List[float]] = {}
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def client(delay_ms: float, priority: str, student: str) -> None:
+        time.sleep(delay_ms / 1000)
+        arrived = time.perf_counter()
+        with slots.slot(priority, student):
+            waited = (time.perf_counter() - arrived) * 1000
+            time.sleep(service_ms / 1000)
+        with lock:
+            waits.setdefault(priority, []).append(waited)
+
+    threads = [threading.Thread(target=client, args=request) for request in requests]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total_ms = (time.perf_counter() - started) * 1000
+    return {
+        priority: {
+            "served": len(times),
+            "p50_ms": statistics.median(times),
+            "max_ms": max(times),
+            "total_ms": total_ms,
+        }
+        for priority, times in sorted(waits.items())
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--slots", type=int, default=2, help="parallel slots of the fake model")
+    parser.add_argument("--service-ms", type=float, default=20.0)
+    parser.add_argument("--batch", type=int, default=40)
+    parser.add_argument("--standard", type=int, default=20)
+    parser.add_argument("--interactive", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    requests = traffic(args.batch, args.standard, args.interactive, args.service_ms)
+    columns = ["mode", "class", "served", "p50_ms", "max_ms", "total_ms"]
+    print(" ".join(f"{c:>12}" for c in columns))
+    for mode, slots in (("fifo", FifoSlots(args.slots)), ("scheduler", LLMScheduler(args.slots))):
+        for priority, row in simulate(slots, requests, args.service_ms).items():
+            row = {"mode": mode, "class": priority, **row}
+            print(" ".join(f"{row[c]:>12.1f}" if isinstance(row[c], float) else f"{row[c]:>12}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Time quiz sampling from the question bank and check its dedup and weighting.
+
+A quiz used to cost an LLM generation; now it is a sample from the bank.
+This fills in-memory banks with pools of growing size, times sample() and
+add(), and checks that near-duplicate questions are banked once and that
+higher quality items are drawn more often.
+
+Usage:
+    python -m benchmarks.bench_question_bank [--pools 10 100 1000] [--number 2000]
+"""
+import argparse
+import collections
+import timeit
+from typing import Dict, List, Optional
+
+from services.question_bank import QuestionBank
+
+
+def _mcq(i: int, explained: bool = True) -> Dict[str, object]:
+    return {
+        "question": f"Which sort is stable in case {i}?",
+        "options": ["Merge sort", "Heap sort", "Quick sort", "Selection sort"],
+        "answer_index": 0,
+        "explanation": "Merge sort keeps equal keys in order." if explained else "",
+    }
+
+
+def check(draws: int = 20000) -> None:
+    bank = QuestionBank(path=None, seed=0)
+    added = bank.add("mcqs", "Sorting", [_mcq(1), _mcq(1), {**_mcq(1), "question": "which SORT is stable, in case 1"}])
+    assert len(added) == 1 and bank.count("mcqs", "Sorting") == 1, "near-duplicates were banked twice"
+    assert not bank.add("mcqs", "Sorting", [{**_mcq(2), "options": ["a", "a", "b", "c"]}, {**_mcq(3), "answer_index": 4}])
+    assert bank.add("mcqs", "Sorting", [_mcq(1)], difficulty="hard"), "a question is banked once per difficulty"
+    # Two items, quality 1.0 and 0.8: the better one should win a single draw about 5 times in 9
+    bank.add("mcqs", "Weights", [_mcq(1), _mcq(2, explained=False)])
+    wins = collections.Counter(bank.sample("mcqs", "Weights", 1)[0]["question"] for _ in range(draws))
+    share = wins[_mcq(1)["question"]] / draws
+    assert 0.53 < share < 0.58, f"better item drawn {share:.3f} of the time"
+    print(f"dedup and validation ok; better item drawn {share:.3f} of the time (expected 0.556)")
+
+
+def bench(pools: List[int], number: int) -> List[Dict[str, object]]:
+    rows = []
+    for size in pools:
+        bank = QuestionBank(path=None, seed=0)
+        add_s = timeit.timeit(lambda: bank.add("mcqs", "Sorting", [_mcq(i) for i in range(size)]), number=1)
+        rows.append({
+            "pool": size,
+            "add_ms": add_s * 1000,
+            "sample3_us": timeit.timeit(lambda: bank.sample("mcqs", "Sorting", 3), number=number) / number * 1e6,
+            "count_us": timeit.timeit(lambda: bank.count("mcqs", "Sorting"), number=number) / number * 1e6,
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pools", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--number", type=int, default=2000, help="samples timed per pool size")
+    args = parser.parse_args(argv)
+
+    check()
+    columns = ["pool", "add_ms", "sample3_us", "count_us"]
+    print(" ".join(f"{c:>14}" for c in columns))
+    for row in bench(args.pools, args.number):
+        print(" ".join(f"{row[c]:>14.3f}" if isinstance(row[c], float) else f"{row[c]:>14}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
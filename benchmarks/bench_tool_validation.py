@@ -0,0 +1,91 @@
+"""Measure the per-call cost of the registry's compiled argument validation.
+
+Every tool schema is compiled the way the server registers it, then typical
+arguments for each tool are validated repeatedly; invalid calls are timed too,
+since those now end at the validator instead of inside the tool.
+
+Usage:
+    python -m benchmarks.bench_tool_validation [--number 20000]
+"""
+import argparse
+import base64
+import timeit
+from typing import Dict, List, Optional, Tuple
+
+from mcp_server.tool_validation import ToolValidationError, compile_schema
+from mcp_server.tools.knowledge_tools import (
+    DECAY_SCHEMA,
+    DUE_SCHEMA,
+    SAVE_GRAPH_SCHEMA,
+    UPDATE_MANY_SCHEMA,
+    UPDATE_SCHEMA,
+    WEAK_SCHEMA,
+)
+from mcp_server.tools.llm_tools import EXPLAIN_SCHEMA, MCQ_SCHEMA, STUDYPLAN_SCHEMA
+from mcp_server.tools.syllabus_tools import PARSE_PDF_SCHEMA
+
+_GRAPH = {"topics": {f"Unit {i}": {"mastery": 50.0, "attempts": 3} for i in range(50)}, "version": 7}
+
+# (tool, schema, typical args, invalid args)
+CASES: List[Tuple[str, Dict, Dict, Dict]] = [
+    ("knowledge.update", UPDATE_SCHEMA,
+     {"student_id": "user_1", "topic": "Unit 1: Sorting", "delta": 10},
+     {"student_id": "user_1", "topic": "Unit 1: Sorting", "delta": "ten"}),
+    ("knowledge.update_many", UPDATE_MANY_SCHEMA,
+     {"student_id": "user_1", "events": [{"topic": f"Unit {i}", "delta": 5} for i in range(10)]},
+     {"student_id": "user_1", "events": "Unit 1"}),
+    ("knowledge.get_weak_topics", WEAK_SCHEMA, {"student_id": "user_1", "limit": 5}, {"limit": 5}),
+    ("knowledge.get_due_topics", DUE_SCHEMA, {"student_id": "user_1", "limit": None}, {"student_id": "user_1", "limit": 2.5}),
+    ("knowledge.apply_decay", DECAY_SCHEMA, {"all": True, "chunk_size": "500"}, {"all": "sometimes"}),
+    ("knowledge.save_graph", SAVE_GRAPH_SCHEMA,
+     {"student_id": "user_1", "graph": _GRAPH, "expected_version": 6},
+     {"student_id": "user_1", "graph": [], "expected_version": 6}),
+    ("llm.explain", EXPLAIN_SCHEMA, {"topic": "Dynamic programming", "context": "exam prep"}, {"context": "exam prep"}),
+    ("llm.generate_mcq", MCQ_SCHEMA, {"topic": "Graphs", "count": 3}, {"topic": "Graphs", "count": "three"}),
+    ("llm.studyplan", STUDYPLAN_SCHEMA,
+     {"topics": [f"Unit {i}" for i in range(20)], "days": 7, "student_state": {"Unit 1": 40}},
+     {"topics": "Unit 1", "days": 7, "student_state": {}}),
+    ("syllabus.parse_pdf", PARSE_PDF_SCHEMA,
+     {"pdf_base64": base64.b64encode(b"%PDF-" + b"x" * 200_000).decode("ascii")},
+     {"pdf_base64": 42}),
+]
+
+
+def _invalid(validate, args) -> None:
+    try:
+        validate(args)
+    except ToolValidationError:
+        return
+    raise AssertionError(f"accepted invalid args {args!r}")
+
+
+def run(number: int) -> List[Dict[str, object]]:
+    rows = []
+    for name, schema, valid, invalid in CASES:
+        started = timeit.default_timer()
+        validate = compile_schema(name, schema)
+        compile_ms = (timeit.default_timer() - started) * 1000
+        validate(valid)
+        _invalid(validate, invalid)
+        rows.append({
+            "tool": name,
+            "compile_ms": compile_ms,
+            "valid_us": timeit.timeit(lambda: validate(valid), number=number) / number * 1e6,
+            "invalid_us": timeit.timeit(lambda: _invalid(validate, invalid), number=number) / number * 1e6,
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="validations timed per case")
+    args = parser.parse_args(argv)
+
+    columns = ["tool", "compile_ms", "valid_us", "invalid_us"]
+    print(" ".join(f"{c:>26}" for c in columns))
+    for row in run(args.number):
+        print(" ".join(f"{row[c]:>26.3f}" if isinstance(row[c], float) else f"{row[c]:>26}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Check the single-pass topic extractor against the original three-regex one and time both.
+
+The golden check runs both extractors over a fixed set of syllabus snippets,
+optional PDF/text files and random fuzz inputs, and fails on the first
+difference. The timing runs both on adversarial inputs: long unpunctuated
+text after a heading, long dotted numbers and walls of headings.
+
+Usage:
+    python -m benchmarks.bench_topic_extractor [--files a.pdf b.txt] [--fuzz 5000] [--sizes 1000 10000 50000]
+"""
+import argparse
+import random
+import re
+import statistics
+import time
+from typing import Callable, Dict, List, Optional
+
+from services.syllabus_service import SyllabusService
+
+
+def legacy_extract_topics(text: str) -> List[str]:
+    # The extractor as it was before the single-pass rewrite, kept as the reference output
+    if not text or not text.strip():
+        return []
+    topics: List[str] = []
+    for m in re.finditer(
+        r"\b(Unit|Module|Chapter)\s*(\d+)?\s*[:\-]\s*(.+?)(?=\b(?:Unit|Module|Chapter)\b|\b\d{1,2}(?:\.\d+)*\b|[.;]|$)",
+        text,
+        flags=re.IGNORECASE,
+    ):
+        label = m.group(1).title()
+        num = m.group(2) or ""
+        title = m.group(3).strip()
+        if num:
+            topics.append(f"{label} {num}: {title}")
+        else:
+            topics.append(f"{label}: {title}")
+    for m in re.finditer(
+        r"\b(Unit|Module|Chapter)\s*(\d+)\b",
+        text,
+        flags=re.IGNORECASE,
+    ):
+        label = m.group(1).title()
+        num = m.group(2)
+        topics.append(f"{label} {num}")
+    for m in re.finditer(
+        r"\b(\d{1,2}(?:\.\d+)*)\s+([A-Z][^\d:;\-]{0,100})",
+        text,
+        flags=0,
+    ):
+        num = m.group(1)
+        title = m.group(2).strip()
+        topics.append(f"{num} {title}")
+    dedup: List[str] = []
+    seen = set()
+    for t in topics:
+        k = t.lower().strip()
+        if k not in seen:
+            seen.add(k)
+            dedup.append(t.strip())
+    return dedup
+
+
+GOLDEN = [
+    "",
+    "   ",
+    "Unit 1: Introduction to Algorithms. Unit 2: Sorting; Unit 3 - Graphs",
+    "Course Outline Module 1: Basics Module 2: Advanced Topics Chapter 3: Review",
+    "UNIT 4 : Dynamic programming and greedy methods 4.1 Knapsack 4.2 Interval scheduling",
+    "unit: orientation week module-assessment chapter12-final project",
+    "1 Introduction 1.1 Motivation 1.2 Outline 2 Background 2.1 Notation: sets and maps",
+    "Unit 1 Unit 2 Unit 3 unit 1 UNIT 2",
+    "Units: none here. Modules-also none. Chapter12 is referenced, Unit 7x is not.",
+    "Week 10 Lab 123 Exam 12.5.3 Final Review 3.x Not a section",
+    "Unit 1: a\nb Unit 2:\nc Unit 3:   \n",
+    "Unit 1:  \n",
+    "Unit 1:",
+    "Chapter 2 -   ",
+    "Module 3: ١٢ Arabic-Indic digits ٣ Unit ٤: Eastern numbers",
+    "Unit 1: Non-breaking spaces Unit 2: Line separator",
+    "Unıt 5: Dotless i. İNTRO Chapter 6: Dotted capital I",
+    "_Unit 1: underscore prefix Unit_2: underscore suffix 3_ Underscore number",
+    "12 A 1.2.3 B 1.2.3.4.5.6 C 123 D 1. E 1.a F",
+    "Chapter 1: " + "x" * 300 + " Chapter 2: end",
+    "2 " + "Abcdefghij" * 15,
+]
+
+_ALPHABET = [
+    "Unit", "unit", "MODULE", "Chapter", "Units", "1", "2", "12", "123", "٣",
+    ".", ";", ":", "-", " ", "  ", "\n", "\t", " ", "_", "Intro", "A", "b", "x2", "ı",
+]
+
+
+def fuzz_inputs(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    return ["".join(rng.choice(_ALPHABET) for _ in range(rng.randint(1, 40))) for _ in range(count)]
+
+
+def adversarial_inputs(size: int) -> Dict[str, str]:
+    return {
+        "unpunctuated heading": "Unit 1: " + "lorem ipsum " * (size // 12),
+        "dotted number": "1" + ".1" * (size // 2) + "x",
+        "heading wall": "Unit: " * (size // 6),
+        "spaces after colon": "Unit 1:" + " " * size + "\nx",
+        "numbered headings": "Chapter 3 - Title " * (size // 18),
+    }
+
+
+def _read(path: str) -> str:
+    if path.lower().endswith(".pdf"):
+        return SyllabusService().extract_text_from_pdf(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def check(service: SyllabusService, files: List[str], fuzz: int) -> int:
+    """Compare both extractors on every input; returns how many were checked."""
+    texts = list(GOLDEN)
+    for path in files:
+        raw = _read(path)
+        texts += [raw, service.clean_text(raw)]
+    texts += fuzz_inputs(fuzz)
+    for text in texts:
+        for variant in (text, service.clean_text(text)):
+            expected = legacy_extract_topics(variant)
+            actual = service.extract_topics(variant)
+            if actual != expected:
+                raise AssertionError(f"topics differ for {variant!r}:\n  legacy: {expected}\n  new:    {actual}")
+    return len(texts)
+
+
+def _median_ms(fn: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", nargs="*", default=[], help="syllabus PDFs or text files to add to the golden check")
+    parser.add_argument("--fuzz", type=int, default=5000, help="random inputs to compare")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    service = SyllabusService()
+    checked = check(service, args.files, args.fuzz)
+    print(f"golden: {checked} input(s), raw and cleaned, match the legacy extractor")
+
+    columns = ["input", "chars", "legacy_ms", "single_pass_ms"]
+    print(" ".join(f"{c:>22}" for c in columns))
+    for size in args.sizes:
+        for name, text in adversarial_inputs(size).items():
+            assert service.extract_topics(text) == legacy_extract_topics(text), name
+            legacy = _median_ms(lambda: legacy_extract_topics(text), args.repeat)
+            single = _median_ms(lambda: service.extract_topics(text), args.repeat)
+            row = [name, str(len(text)), f"{legacy:.3f}", f"{single:.3f}"]
+            print(" ".join(f"{c:>22}" for c in row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class _PoolStats:
+    """
+    Thread-safe counters shared by every adapter mounted on an HTTPPool.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_connection(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            requests_sent = self.requests
+            opened = self.connections_opened
+        reused = max(0, requests_sent - opened)
+        return {
+            "requests": requests_sent,
+            "connections_opened": opened,
+            "connections_reused": reused,
+            "reuse_ratio": (reused / requests_sent) if requests_sent else 0.0,
+        }
+
+
+class _CountingAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that counts requests sent and new TCP connections opened.
+    """
+    def __init__(self, stats: _PoolStats, **kwargs):
+        self._stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        stats = self._stats
+
+        def counting(pool_cls):
+            class CountingPool(pool_cls):
+                def _new_conn(self):
+                    stats.record_connection()
+                    return super()._new_conn()
+            return CountingPool
+
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: counting(cls)
+            for scheme, cls in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+    def send(self, request, **kwargs):
+        self._stats.record_request()
+        return super().send(request, **kwargs)
+
+
+class HTTPPool:
+    """
+    A keep-alive requests.Session with a bounded connection pool and retries.
+
+    One instance is meant to be shared by every client in the process so that
+    LLM calls and MCP tool calls reuse TCP connections instead of opening a new
+    one per request.
+    """
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 20,
+        pool_block: bool = False,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        status_forcelist=(502, 503, 504),
+        retry_methods=Retry.DEFAULT_ALLOWED_METHODS,
+    ):
+        """
+        Initialize the pool.
+
+        Args:
+            pool_connections (int): Number of per-host pools to keep (default: 10).
+            pool_maxsize (int): Maximum keep-alive connections per host (default: 20).
+            pool_block (bool): Block instead of opening extra connections once a host
+                has pool_maxsize connections in use (default: False).
+            max_retries (int): Retries for connection errors and retryable statuses (default: 3).
+            backoff_factor (float): Exponential backoff factor between retries (default: 0.5).
+            status_forcelist (tuple): HTTP statuses that trigger a retry (default: 502, 503, 504).
+            retry_methods (frozenset): HTTP methods retried on read errors and statuses.
+                Connection errors are retried for every method (default: urllib3's idempotent set).
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._stats = _PoolStats()
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=status_forcelist,
+            allowed_methods=retry_methods,
+            raise_on_status=False,
+        )
+        self.session = requests.Session()
+        adapter = _CountingAdapter(
+            self._stats,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            max_retries=retry,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.session.get(url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.session.post(url, **kwargs)
+
+    def stats(self) -> dict:
+        """
+        Return request and connection counters for the pool.
+
+        Returns:
+            dict: requests, connections_opened, connections_reused and reuse_ratio.
+        """
+        data = self._stats.snapshot()
+        data["pool_connections"] = self.pool_connections
+        data["pool_maxsize"] = self.pool_maxsize
+        return data
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def get_pool() -> HTTPPool:
+    """
+    Return the process-wide shared HTTPPool, creating it with defaults if needed.
+    """
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = HTTPPool()
+        return _default_pool
+
+
+def configure_pool(**kwargs) -> HTTPPool:
+    """
+    Replace the shared HTTPPool with one built from the given HTTPPool arguments.
+
+    Clients created afterwards pick up the new pool; existing clients keep theirs.
+    """
+    global _default_pool
+    with _default_lock:
+        if _default_pool is not None:
+            _default_pool.close()
+        _default_pool = HTTPPool(**kwargs)
+        return _default_pool
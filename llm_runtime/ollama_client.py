@@ -1,12 +1,32 @@
 import requests
 import json
-from utilities.llm_parsers import safe_parse_json
+from contextlib import nullcontext
+from typing import Callable, ContextManager, Iterator
+from llm_runtime.http_pool import HTTPPool, get_pool
+from llm_runtime.response_cache import LLMResponseCache
+from llm_runtime.scheduler import DEFAULT_PRIORITY, DeadlineExceeded, LLMScheduler
+from llm_runtime.singleflight import SingleFlight
+from utilities.llm_parsers import JSONStreamScanner, safe_parse_json
+
+# ask() and ask_stream() report failures in the text itself, starting with one of these
+ERROR_PREFIXES = ("Error connecting to LLM:", "Error from LLM:", "LLM request dropped:")
+
+def is_error_text(text: str) -> bool:
+    """
+    Tell whether an answer from ask() or ask_stream() is really an error message.
+    """
+    return text.startswith(ERROR_PREFIXES)
+
+def _parses_as_json(text: str) -> bool:
+    parsed = safe_parse_json(text)
+    return not (isinstance(parsed, dict) and "_raw" in parsed)
 
 class OllamaClient:
     """
     A simple client for interacting with the Ollama API.
     """
-    def __init__(self, model="llama3.1:8b", base_url="http://localhost:11434/api/generate", timeout=120):
+    def __init__(self, model="llama3.1:8b", base_url="http://localhost:11434/api/generate", timeout=120, pool: HTTPPool = None, cache: LLMResponseCache = None,
+                 scheduler: LLMScheduler = None):
         """
         Initialize the Ollama client.
 
@@ -14,52 +34,224 @@ class OllamaClient:
             model (str): The model name to use (default: "llama3.1:8b").
             base_url (str): The API endpoint URL (default: "http://localhost:11434/api/generate").
             timeout (int): Request timeout in seconds (default: 120).
+            pool (HTTPPool, optional): Connection pool to send requests through
+                (default: the process-wide shared pool).
+            cache (LLMResponseCache, optional): Response cache consulted before calling
+                the model (default: no caching).
+            scheduler (LLMScheduler, optional): Orders requests competing for the
+                model's slots (default: requests go straight to the server).
         """
         self.model = model
         self.base_url = base_url
         self.timeout = timeout
+        self.pool = pool or get_pool()
+        self.cache = cache
+        self.scheduler = scheduler
+        # Identical prompts already being generated are shared rather than resent
+        self.inflight = SingleFlight()
+
+    def _payload(self, prompt: str, max_tokens: int, stream: bool) -> dict:
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": {
+                "num_predict": max_tokens
+            }
+        }
 
-    def ask(self, prompt: str, max_tokens: int = 1024) -> str:
+    def _cache_lookup(self, payload: dict, bypass_cache: bool):
+        """
+        Return (key, cached_text) for a payload; key is None when caching is off.
+        """
+        if self.cache is None:
+            return None, None
+        key = self.cache.make_key(payload["model"], payload["prompt"], payload["options"])
+        if bypass_cache:
+            self.cache.record_bypass()
+            return key, None
+        return key, self.cache.get(key)
+
+    def _flight_key(self, payload: dict, cache_key: str) -> str:
+        if cache_key is not None:
+            return cache_key
+        return LLMResponseCache.make_key(payload["model"], payload["prompt"], payload["options"])
+
+    def _slot(self, priority: str, student_id: str, deadline: float) -> ContextManager:
+        # Only requests that actually reach the model queue: cache hits and
+        # coalesced callers never enter the slot
+        if self.scheduler is None or priority is None:
+            return nullcontext()
+        return self.scheduler.slot(priority, student_id, deadline)
+
+    def _generate(self, payload: dict, key: str, cache_check: Callable[[str], bool], slot: ContextManager) -> str:
+        with slot:
+            response = self.pool.post(self.base_url, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        text = data.get("response", "")
+        if key is not None and (cache_check is None or cache_check(text)):
+            self.cache.put(key, text)
+        return text
+
+    def _generate_stream(self, payload: dict, key: str, cache_check: Callable[[str], bool],
+                         slot: ContextManager) -> Iterator[str]:
+        parts = []
+        try:
+            # The slot is held until the stream finishes or its consumer closes it
+            with slot, self.pool.post(self.base_url, json=payload, timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    try:
+                        data = json.loads(line)
+                    except ValueError as e:
+                        # A garbled or truncated line; what came before it is not a complete answer either
+                        yield f"Error from LLM: unreadable stream line: {e}"
+                        return
+                    if data.get("error"):
+                        yield f"Error from LLM: {data['error']}"
+                        return
+                    token = data.get("response", "")
+                    if token:
+                        parts.append(token)
+                        yield token
+                    if data.get("done"):
+                        text = "".join(parts)
+                        if key is not None and (cache_check is None or cache_check(text)):
+                            self.cache.put(key, text)
+                        return
+        except requests.RequestException as e:
+            yield f"Error connecting to LLM: {str(e)}"
+        except DeadlineExceeded as e:
+            yield f"LLM request dropped: {str(e)}"
+
+    def ask(self, prompt: str, max_tokens: int = 1024, bypass_cache: bool = False,
+            cache_check: Callable[[str], bool] = None, priority: str = DEFAULT_PRIORITY,
+            student_id: str = None, deadline: float = None) -> str:
         """
         Send a prompt to the Ollama model and return the generated text.
 
         Args:
             prompt (str): The input prompt.
             max_tokens (int): Maximum tokens to generate (default: 1024).
+            bypass_cache (bool): Skip the cache lookup and regenerate; the fresh
+                answer still replaces the cached one (default: False).
+            cache_check (callable, optional): Only cache responses for which this
+                returns True (default: cache every successful response).
+            priority (str): Scheduler priority class, e.g. "interactive" or "batch" (default: "standard");
+                None skips the scheduler, for callers that already hold a slot.
+            student_id (str, optional): Student the request is for, so the scheduler can take turns between students.
+            deadline (float, optional): Seconds the request may wait for a model slot
+                before it is dropped (default: no limit).
 
-        Returns:
-            str: The generated response text.
+        Concurrent calls with the same prompt and options share one generation.
 
-        Raises:
-            requests.RequestException: If the HTTP request fails.
+        Returns:
+            str: The generated response text, or an error message if the request fails.
         """
-        payload = {
-            "model": self.model,
-            "prompt": prompt,
-            "stream": False,
-            "options": {
-                "num_predict": max_tokens
-            }
-        }
+        payload = self._payload(prompt, max_tokens, stream=False)
+        key, cached = self._cache_lookup(payload, bypass_cache)
+        if cached is not None:
+            return cached
         
         try:
-            response = requests.post(self.base_url, json=payload, timeout=self.timeout)
-            response.raise_for_status()
-            data = response.json()
-            return data.get("response", "")
+            return self.inflight.do(
+                self._flight_key(payload, key),
+                lambda: self._generate(payload, key, cache_check, self._slot(priority, student_id, deadline)),
+            )
         except requests.RequestException as e:
             return f"Error connecting to LLM: {str(e)}"
+        except DeadlineExceeded as e:
+            return f"LLM request dropped: {str(e)}"
+
+    def ask_stream(self, prompt: str, max_tokens: int = 1024, bypass_cache: bool = False,
+                   cache_check: Callable[[str], bool] = None, priority: str = DEFAULT_PRIORITY,
+                   student_id: str = None, deadline: float = None) -> Iterator[str]:
+        """
+        Send a prompt to the Ollama model and yield text chunks as they are generated.
+
+        Ollama streams one JSON object per line (NDJSON); each carries a "response"
+        fragment and the last one has "done": true.
+
+        Args:
+            prompt (str): The input prompt.
+            max_tokens (int): Maximum tokens to generate (default: 1024).
+            bypass_cache (bool): Skip the cache lookup and regenerate (default: False).
+            cache_check (callable, optional): Only cache responses for which this
+                returns True (default: cache every complete response).
+            priority (str): Scheduler priority class (default: "standard").
+            student_id (str, optional): Student the request is for.
+            deadline (float, optional): Seconds the request may wait for a model slot (default: no limit).
 
-    def ask_json(self, prompt: str, schema_key: str = None) -> dict:
+        Yields:
+            str: Generated text fragments, in order. A cached answer is yielded as a
+            single fragment, and callers asking for a prompt that is already streaming
+            replay that stream. On failure a single error message is yielded, mirroring ask().
+        """
+        payload = self._payload(prompt, max_tokens, stream=True)
+        key, cached = self._cache_lookup(payload, bypass_cache)
+        if cached is not None:
+            yield cached
+            return
+
+        yield from self.inflight.stream(
+            self._flight_key(payload, key),
+            lambda: self._generate_stream(payload, key, cache_check, self._slot(priority, student_id, deadline)),
+        )
+
+    def ask_json(self, prompt: str, schema_key: str = None, bypass_cache: bool = False,
+                 priority: str = DEFAULT_PRIORITY, student_id: str = None, deadline: float = None) -> dict:
         """
         Send a prompt and attempt to parse the response as JSON.
 
         Args:
             prompt (str): The input prompt.
             schema_key (str, optional): Not used in simple implementation but reserved for schema validation.
+            bypass_cache (bool): Skip the cache lookup and regenerate (default: False).
+            priority, student_id, deadline: Scheduling, as for ask().
 
         Returns:
             dict: The parsed JSON object or {"_raw": text} if parsing fails.
         """
-        text = self.ask(prompt)
+        # Unparseable answers are not cached, so a retry gets a fresh generation
+        text = self.ask(prompt, bypass_cache=bypass_cache, cache_check=_parses_as_json,
+                        priority=priority, student_id=student_id, deadline=deadline)
         return safe_parse_json(text)
+
+    def ask_json_stream(self, prompt: str, bypass_cache: bool = False, priority: str = DEFAULT_PRIORITY,
+                        student_id: str = None, deadline: float = None) -> Iterator[tuple]:
+        """
+        Streaming variant of ask_json that hands out array elements as soon as they are complete.
+
+        For an answer like {"mcqs": [{...}, {...}]} each MCQ is yielded when the
+        model closes it, long before the whole answer is generated.
+
+        Args:
+            prompt (str): The input prompt.
+            bypass_cache (bool): Skip the cache lookup and regenerate (default: False).
+            priority, student_id, deadline: Scheduling, as for ask().
+
+        Yields:
+            tuple: (key, element) for each object or array element of an array
+            member of the answer's first JSON object, e.g. ("mcqs", {...}).
+
+        Returns:
+            dict: The same result as ask_json for the complete answer.
+        """
+        parts = []
+        scanner = JSONStreamScanner()
+        answered = False
+        for chunk in self.ask_stream(prompt, bypass_cache=bypass_cache, cache_check=_parses_as_json,
+                                     priority=priority, student_id=student_id, deadline=deadline):
+            parts.append(chunk)
+            for kind, key, value in scanner.feed(chunk):
+                # Only the first object is the answer, as in ask_json
+                if answered:
+                    break
+                if kind == "object":
+                    answered = True
+                else:
+                    yield key, value
+        return safe_parse_json("".join(parts))
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from utilities.paths import cache_path
+
+
+class LLMResponseCache:
+    """
+    Two-tier cache of LLM responses keyed by model, prompt and generation options.
+
+    Lookups go to an in-memory LRU first and then to an SQLite file on disk.
+    Both tiers honour the same TTL; each tier evicts its least recently used
+    entries once it is over its size limit.
+    """
+    def __init__(
+        self,
+        path: Optional[str] = cache_path("llm_responses.sqlite3"),
+        max_memory_entries: int = 512,
+        max_disk_entries: int = 50000,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+        ttl: float = 7 * 24 * 3600,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            path (str, optional): SQLite file for the disk tier; None keeps the cache in memory only.
+            max_memory_entries (int): Entries kept in the in-memory LRU (default: 512).
+            max_disk_entries (int): Entries kept on disk (default: 50000).
+            max_disk_bytes (int): Total response bytes kept on disk (default: 256 MiB).
+            ttl (float): Seconds an entry stays valid (default: 7 days).
+        """
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "expired": 0,
+        }
+        self._db = None
+        self._disk_entries = 0
+        self._disk_bytes = 0
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " expires REAL NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+            self._db.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),))
+            count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            self._disk_entries = count
+            self._disk_bytes = total
+
+    @staticmethod
+    def make_key(model: str, prompt: str, options: dict) -> str:
+        """
+        Build the content address for a generation request.
+
+        Args:
+            model (str): Model name.
+            prompt (str): Full prompt text.
+            options (dict): Generation options sent to the model.
+
+        Returns:
+            str: Hex SHA-256 digest identifying the request.
+        """
+        material = json.dumps(
+            {"model": model, "prompt": prompt, "options": options or {}},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Return the cached response for key, or None on a miss or expired entry.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+                self._counters["expired"] += 1
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, size, expires FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, size, expires = row
+                    if expires > now:
+                        self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                        self._remember(key, value, expires)
+                        self._counters["disk_hits"] += 1
+                        return value
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._disk_entries -= 1
+                    self._disk_bytes -= size
+                    self._counters["expired"] += 1
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key: str, value: str) -> None:
+        """
+        Store a response in both tiers, evicting old entries if over the limits.
+        """
+        now = time.time()
+        expires = now + self.ttl
+        with self._lock:
+            self._remember(key, value, expires)
+            self._counters["stores"] += 1
+            if self._db is None:
+                return
+            size = len(value.encode("utf-8"))
+            old = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, expires, now),
+            )
+            if old is None:
+                self._disk_entries += 1
+            else:
+                self._disk_bytes -= old[0]
+            self._disk_bytes += size
+            self._evict_disk()
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self._counters["bypassed"] += 1
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counters and current tier sizes.
+        """
+        with self._lock:
+            data = dict(self._counters)
+            data["memory_entries"] = len(self._memory)
+            data["disk_entries"] = self._disk_entries
+            data["disk_bytes"] = self._disk_bytes
+        lookups = data["memory_hits"] + data["disk_hits"] + data["misses"]
+        data["hit_ratio"] = ((data["memory_hits"] + data["disk_hits"]) / lookups) if lookups else 0.0
+        return data
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._disk_entries = 0
+                self._disk_bytes = 0
+
+    def _remember(self, key: str, value: str, expires: float) -> None:
+        self._memory[key] = (value, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._counters["memory_evictions"] += 1
+
+    def _evict_disk(self) -> None:
+        while self._disk_entries > self.max_disk_entries or self._disk_bytes > self.max_disk_bytes:
+            excess = max(1, self._disk_entries - self.max_disk_entries)
+            rows = self._db.execute(
+                "SELECT key, size FROM responses ORDER BY accessed LIMIT ?", (excess,)
+            ).fetchall()
+            if not rows:
+                self._disk_entries = 0
+                self._disk_bytes = 0
+                return
+            self._db.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k, _ in rows])
+            self._disk_entries -= len(rows)
+            self._disk_bytes -= sum(size for _, size in rows)
+            self._counters["disk_evictions"] += len(rows)
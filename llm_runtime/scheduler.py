@@ -0,0 +1,186 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+# Priority classes, most urgent first. Tools pick one per call: an explanation a
+# student is reading beats flashcards, which beat a multi-day study plan. Idle
+# work (content generated ahead of time) only runs when nothing else waits.
+PRIORITIES = ("interactive", "standard", "batch", "idle")
+DEFAULT_PRIORITY = "standard"
+IDLE = "idle"
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when a request is still waiting for a model slot at its deadline.
+    """
+
+
+class _Ticket:
+    __slots__ = ("priority", "student", "enqueued", "deadline", "granted", "expired")
+
+    def __init__(self, priority: str, student: str, deadline: Optional[float]):
+        self.priority = priority
+        self.student = student
+        self.enqueued = time.monotonic()
+        self.deadline = deadline
+        self.granted = False
+        self.expired = False
+
+
+class LLMScheduler:
+    """
+    Decides which waiting LLM request gets the next model slot.
+
+    At most max_concurrency requests run at once, matching the parallel slots
+    of the Ollama server; the rest wait in per-priority queues. The most urgent
+    class with waiting requests goes first, but a class counts one level more
+    urgent for every `aging` seconds its oldest request has waited, so batch
+    work is delayed rather than starved. The idle class never ages: it gets a
+    slot only when no other request waits, and leaves one slot free so a
+    student's request never queues behind background work. Within a class students take turns
+    (round robin), so one student's burst cannot hold back everyone else's
+    requests. A request that is still waiting at its deadline is dropped with
+    DeadlineExceeded: by then its caller has usually given up.
+    """
+    def __init__(self, max_concurrency: int = None, aging: float = 30.0, history: int = 1024):
+        """
+        Initialize the scheduler.
+
+        Args:
+            max_concurrency (int, optional): Requests sent to the model at once
+                (default: OLLAMA_NUM_PARALLEL, or 4 when that is not set).
+            aging (float): Seconds of waiting that raise a class by one priority level (default: 30).
+            history (int): Recent wait times kept per class for the stats (default: 1024).
+        """
+        self.max_concurrency = max_concurrency or int(os.environ.get("OLLAMA_NUM_PARALLEL", "4"))
+        self.aging = aging
+        self._cond = threading.Condition()
+        self._running = 0
+        # Per class: student -> their waiting tickets, in round-robin order
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}
+        self._waits = {priority: deque(maxlen=history) for priority in PRIORITIES}
+        self._counters = {priority: {"granted": 0, "expired": 0} for priority in PRIORITIES}
+
+    @contextmanager
+    def slot(self, priority: str = DEFAULT_PRIORITY, student_id: str = None, deadline: float = None) -> Iterator[None]:
+        """
+        Hold one model slot for the duration of the block.
+
+        Args:
+            priority (str): One of PRIORITIES (default: "standard").
+            student_id (str, optional): Whose request this is; requests without one share a queue.
+            deadline (float, optional): Seconds the request may wait for a slot (default: no limit).
+
+        Raises:
+            DeadlineExceeded: No slot became free within deadline seconds.
+        """
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority {priority!r}; expected one of {PRIORITIES}")
+        expires = time.monotonic() + deadline if deadline is not None else None
+        ticket = _Ticket(priority, student_id or "", expires)
+        self._acquire(ticket)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._dispatch()
+
+    def _acquire(self, ticket: _Ticket) -> None:
+        with self._cond:
+            self._queues[ticket.priority].setdefault(ticket.student, deque()).append(ticket)
+            self._dispatch()
+            while not ticket.granted:
+                if ticket.expired or (ticket.deadline is not None and time.monotonic() >= ticket.deadline):
+                    if not ticket.expired:
+                        self._expire(ticket)
+                        self._remove(ticket)
+                    waited = time.monotonic() - ticket.enqueued
+                    raise DeadlineExceeded(f"LLM request waited {waited:.1f}s for a model slot")
+                self._cond.wait(ticket.deadline - time.monotonic() if ticket.deadline is not None else None)
+
+    def _expire(self, ticket: _Ticket) -> None:
+        ticket.expired = True
+        self._counters[ticket.priority]["expired"] += 1
+
+    def _remove(self, ticket: _Ticket) -> None:
+        students = self._queues[ticket.priority]
+        tickets = students.get(ticket.student)
+        if tickets is not None and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del students[ticket.student]
+
+    def _next_class(self, now: float) -> Optional[str]:
+        best, best_rank = None, None
+        for level, priority in enumerate(PRIORITIES):
+            students = self._queues[priority]
+            if not students or priority == IDLE:
+                continue
+            oldest = min(tickets[0].enqueued for tickets in students.values())
+            rank = level - int((now - oldest) // self.aging) if self.aging else level
+            if best_rank is None or rank < best_rank:
+                best, best_rank = priority, rank
+        if best is None and self._queues[IDLE] and self._running < max(1, self.max_concurrency - 1):
+            best = IDLE
+        return best
+
+    def _dispatch(self) -> None:
+        # Called with the condition held, whenever a slot frees up or a request arrives
+        granted = False
+        now = time.monotonic()
+        while self._running < self.max_concurrency:
+            priority = self._next_class(now)
+            if priority is None:
+                break
+            students = self._queues[priority]
+            student, tickets = next(iter(students.items()))
+            ticket = tickets.popleft()
+            if tickets:
+                # This student goes to the back of the line for their next request
+                students.move_to_end(student)
+            else:
+                del students[student]
+            if ticket.deadline is not None and now >= ticket.deadline:
+                self._expire(ticket)
+                granted = True
+                continue
+            ticket.granted = True
+            self._running += 1
+            self._counters[priority]["granted"] += 1
+            self._waits[priority].append(now - ticket.enqueued)
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        """
+        Return running and queued requests overall and, per class, queue depth,
+        counters and recent wait times in milliseconds.
+        """
+        with self._cond:
+            classes = {}
+            for priority in PRIORITIES:
+                students = self._queues[priority]
+                waits = sorted(self._waits[priority])
+                classes[priority] = {
+                    "queued": sum(len(tickets) for tickets in students.values()),
+                    "students_waiting": len(students),
+                    **self._counters[priority],
+                    "wait_ms": {
+                        "mean": sum(waits) / len(waits) * 1000 if waits else 0.0,
+                        "p50": waits[len(waits) // 2] * 1000 if waits else 0.0,
+                        "p95": waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000 if waits else 0.0,
+                        "max": waits[-1] * 1000 if waits else 0.0,
+                    },
+                }
+            return {
+                "max_concurrency": self.max_concurrency,
+                "running": self._running,
+                "queued": sum(c["queued"] for c in classes.values()),
+                "classes": classes,
+            }
@@ -0,0 +1,201 @@
+import threading
+from typing import Callable, Hashable, Iterable, Iterator
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _StreamCall:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.chunks = []
+        self.done = False
+        self.error = None
+        # Callers replaying the chunks, not counting the one driving the source
+        self.followers = 0
+        # The source, left by a driver whose consumer went away, until a follower takes it over
+        self.orphan = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into a single execution.
+
+    The first caller for a key (the leader) runs the work; callers arriving while
+    it is in flight wait for the leader's result instead of repeating the work.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+        self._leaders = 0
+        self._coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], object]):
+        """
+        Run fn once per in-flight key and return its result to every caller.
+
+        Args:
+            key (hashable): Identity of the work, e.g. a prompt hash.
+            fn (callable): Zero-argument function doing the work.
+
+        Returns:
+            The leader's return value.
+
+        Raises:
+            Exception: Whatever the leader's fn raised, re-raised in every caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._leaders += 1
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    def stream(self, key: Hashable, factory: Callable[[], Iterable]) -> Iterator:
+        """
+        Streaming counterpart of do(): followers replay the leader's chunks as they arrive.
+
+        Followers are paced by the leader's consumer. If that consumer goes
+        away before the stream is exhausted, a follower takes over the same
+        source where it stopped, so the others never notice; only when
+        nobody is left reading is the source closed. If the work itself
+        fails, followers raise RuntimeError after the chunks produced so far.
+
+        Args:
+            key (hashable): Identity of the work.
+            factory (callable): Zero-argument function returning the chunk iterable.
+
+        Yields:
+            The leader's chunks, in order.
+        """
+        with self._lock:
+            call = self._streams.get(key)
+            leader = call is None
+            if leader:
+                call = _StreamCall()
+                self._streams[key] = call
+                self._leaders += 1
+            else:
+                self._coalesced += 1
+                with call.cond:
+                    call.followers += 1
+
+        if leader:
+            yield from self._drive(key, call, iter(factory()))
+            return
+
+        index = 0
+        source = None
+        try:
+            while True:
+                with call.cond:
+                    while index >= len(call.chunks) and not call.done and call.orphan is None:
+                        call.cond.wait()
+                    if call.orphan is not None and index >= len(call.chunks):
+                        # Caught up with a stream nobody drives any more: carry on with it
+                        source, call.orphan = call.orphan, None
+                        call.followers -= 1
+                    pending = call.chunks[index:]
+                    index += len(pending)
+                    finished = call.done and index >= len(call.chunks)
+                yield from pending
+                if source is not None or finished:
+                    break
+        finally:
+            if source is None:
+                self._leave(key, call)
+        if source is not None:
+            yield from self._drive(key, call, source)
+            return
+        if call.error is not None:
+            raise RuntimeError(f"Coalesced generation failed: {call.error}")
+
+    def _drive(self, key: Hashable, call: _StreamCall, source: Iterator) -> Iterator:
+        # Pull chunks from source for everyone, yielding them to this caller
+        completed = handed_off = False
+        try:
+            for chunk in source:
+                with call.cond:
+                    call.chunks.append(chunk)
+                    call.cond.notify_all()
+                yield chunk
+            completed = True
+        except GeneratorExit:
+            # Decided under self._lock, so nobody joins between the check and the close
+            with self._lock, call.cond:
+                if call.followers:
+                    call.orphan = source
+                    handed_off = True
+                    call.cond.notify_all()
+                else:
+                    self._detach(key, call)
+            raise
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            if not handed_off:
+                self._finish(key, call, None if completed else source)
+
+    def _leave(self, key: Hashable, call: _StreamCall) -> None:
+        # A follower stops reading; the last one out closes a source nobody took over
+        with self._lock, call.cond:
+            call.followers -= 1
+            if call.followers or call.orphan is None:
+                return
+            orphan, call.orphan = call.orphan, None
+            self._detach(key, call)
+        self._finish(key, call, orphan)
+
+    def _detach(self, key: Hashable, call: _StreamCall) -> None:
+        # Call with self._lock held; later callers for key start a new execution
+        if self._streams.get(key) is call:
+            del self._streams[key]
+
+    def _finish(self, key: Hashable, call: _StreamCall, unfinished) -> None:
+        with self._lock:
+            self._detach(key, call)
+        with call.cond:
+            if unfinished is not None and call.error is None:
+                call.error = RuntimeError("Leading stream was closed before it finished")
+            call.done = True
+            call.cond.notify_all()
+        close = getattr(unfinished, "close", None)
+        if close is not None:
+            close()
+
+    def stats(self) -> dict:
+        """
+        Return how many executions ran and how many callers were coalesced onto them.
+        """
+        with self._lock:
+            return {
+                "leaders": self._leaders,
+                "coalesced": self._coalesced,
+                "in_flight": len(self._calls) + len(self._streams),
+            }
@@ -1,39 +1,79 @@
 # mcp_server/server.py
 
-from fastapi import FastAPI
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from mcp_server.tool_registry import ToolRegistry
+from mcp_server.tool_validation import ToolValidationError
 
 # Import tools
-from mcp_server.tools.syllabus_tools import parse_syllabus, SCHEMA as S_SCHEMA
+from mcp_server.tools.syllabus_tools import parse_syllabus, parse_pdf, parse_pdf_stream, SCHEMA as S_SCHEMA, PARSE_PDF_SCHEMA
+from mcp_server.tools.syllabus_tools import cache as syllabus_cache, topic_listeners
 from mcp_server.tools.mastery_tools import update_mastery, SCHEMA as M_SCHEMA
 from mcp_server.tools.knowledge_tools import (
     load_knowledge,
     update_knowledge,
+    update_knowledge_many,
+    replay_knowledge,
+    apply_decay,
     get_weak_topics,
+    get_due_topics,
+    get_overdue_students,
     get_graph,
+    save_graph,
     LOAD_SCHEMA,
     UPDATE_SCHEMA,
+    UPDATE_MANY_SCHEMA,
+    REPLAY_SCHEMA,
+    DECAY_SCHEMA,
     WEAK_SCHEMA,
+    DUE_SCHEMA,
+    OVERDUE_SCHEMA,
     GRAPH_SCHEMA,
+    SAVE_GRAPH_SCHEMA,
+    service as knowledge_service,
 )
-from mcp_server.tools.llm_tools import explain_topic, flashcards_for_topic, generate_mcq, generate_studyplan
-from mcp_server.tools.llm_tools import EXPLAIN_SCHEMA, FLAShCARD_SCHEMA, MCQ_SCHEMA, STUDYPLAN_SCHEMA
+from mcp_server.tools.llm_tools import llm, explain_topic, explain_topic_stream, flashcards_for_topic, flashcards_stream, generate_mcq, generate_mcq_stream, generate_studyplan
+from mcp_server.tools.llm_tools import bank, content, pregenerator, pregenerate
+from mcp_server.tools.llm_tools import EXPLAIN_SCHEMA, FLAShCARD_SCHEMA, MCQ_SCHEMA, STUDYPLAN_SCHEMA, PREGENERATE_SCHEMA
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    pregenerator.stop()
+    # Write back any student graphs still dirty in the write-behind cache
+    knowledge_service.flush()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 registry = ToolRegistry()
 
 # Register tools
 registry.register("syllabus.parse", parse_syllabus, S_SCHEMA)
+registry.register("syllabus.parse_pdf", parse_pdf, PARSE_PDF_SCHEMA, stream=parse_pdf_stream)
 registry.register("mastery.update", update_mastery, M_SCHEMA)
 registry.register("knowledge.load", load_knowledge, LOAD_SCHEMA)
 registry.register("knowledge.update", update_knowledge, UPDATE_SCHEMA)
+registry.register("knowledge.update_many", update_knowledge_many, UPDATE_MANY_SCHEMA)
+registry.register("knowledge.replay", replay_knowledge, REPLAY_SCHEMA)
+registry.register("knowledge.apply_decay", apply_decay, DECAY_SCHEMA)
 registry.register("knowledge.get_weak_topics", get_weak_topics, WEAK_SCHEMA)
+registry.register("knowledge.get_due_topics", get_due_topics, DUE_SCHEMA)
+registry.register("knowledge.get_overdue_students", get_overdue_students, OVERDUE_SCHEMA)
 registry.register("knowledge.get_graph", get_graph, GRAPH_SCHEMA)
-registry.register("llm.explain", explain_topic, EXPLAIN_SCHEMA)
-registry.register("llm.flashcards", flashcards_for_topic, FLAShCARD_SCHEMA)
-registry.register("llm.generate_mcq", generate_mcq, MCQ_SCHEMA)
-registry.register("llm.studyplan", generate_studyplan, STUDYPLAN_SCHEMA)
+registry.register("knowledge.save_graph", save_graph, SAVE_GRAPH_SCHEMA)
+registry.register("llm.explain", explain_topic, EXPLAIN_SCHEMA, stream=explain_topic_stream)
+registry.register("llm.flashcards", flashcards_for_topic, FLAShCARD_SCHEMA, stream=flashcards_stream, category="llm_standard")
+registry.register("llm.generate_mcq", generate_mcq, MCQ_SCHEMA, stream=generate_mcq_stream, category="llm_standard")
+registry.register("llm.studyplan", generate_studyplan, STUDYPLAN_SCHEMA, category="llm_batch")
+registry.register("llm.pregenerate", pregenerate, PREGENERATE_SCHEMA)
+
+# Every parsed syllabus queues its topics' explanations, flashcards and MCQs
+topic_listeners.append(pregenerator.submit)
 
 # -------- API MODELS -------- #
 
@@ -41,17 +81,73 @@ class ToolCall(BaseModel):
     name: str
     args: dict
 
+class ToolBatch(BaseModel):
+    calls: List[ToolCall]
+
 # -------- ENDPOINTS -------- #
 
+@app.exception_handler(ToolValidationError)
+async def tool_validation_error(request: Request, exc: ToolValidationError):
+    # Bad arguments are the caller's mistake: 422 like any other request validation failure
+    return JSONResponse(status_code=422, content={"detail": exc.errors, "tool": exc.tool})
+
 @app.get("/tools")
 def get_tools():
     return registry.list_tools()
 
 @app.post("/call")
-def call_tool(call: ToolCall):
-    result = registry.call(call.name, call.args)
+async def call_tool(call: ToolCall):
+    result = await registry.call_async(call.name, call.args)
     return {"result": result}
 
+async def _call_in_batch(call: ToolCall):
+    try:
+        return {"result": await registry.call_async(call.name, call.args)}
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.post("/call_batch")
+async def call_tool_batch(batch: ToolBatch):
+    # Calls are independent: run them concurrently, answer in request order
+    results = await asyncio.gather(*(_call_in_batch(call) for call in batch.calls))
+    return {"results": list(results)}
+
+async def _sse_events(name: str, args: dict):
+    # Server-sent events: one "data" event per chunk, then "done" with the final result
+    try:
+        async for kind, value in registry.call_stream_async(name, args):
+            if kind == "chunk":
+                yield f"data: {json.dumps({'chunk': value})}\n\n"
+            else:
+                yield f"event: done\ndata: {json.dumps({'result': value})}\n\n"
+    except Exception as e:
+        yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+@app.post("/call_stream")
+async def call_tool_stream(call: ToolCall):
+    # Checked before the stream starts, so bad arguments get a 422 rather than an error event
+    args = registry.validate(call.name, call.args)
+    return StreamingResponse(
+        _sse_events(call.name, args),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/stats")
+def get_stats():
+    return {
+        "http_pool": llm.pool.stats(),
+        "llm_cache": llm.cache.stats(),
+        "llm_inflight": llm.inflight.stats(),
+        "llm_scheduler": llm.scheduler.stats(),
+        "pregeneration": {**pregenerator.stats(), "store": content.stats()},
+        "question_bank": bank.stats(),
+        "syllabus_cache": syllabus_cache.stats(),
+        "tools": registry.stats(),
+        "graph_cache": knowledge_service.cache.stats() if knowledge_service.cache is not None else None,
+        "review_index": knowledge_service.index.stats(),
+    }
+
 # -------- TEMP TEST ENDPOINT -------- #
 @app.post("/test/pdf")
 def test_pdf(payload: dict):
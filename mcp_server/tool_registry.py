@@ -1,22 +1,231 @@
 # mcp_server/tool_registry.py
 
+import asyncio
+import inspect
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from mcp_server.tool_validation import compile_schema
+
+# Max concurrent calls per tool category (the part of the tool name before the first dot)
+DEFAULT_CATEGORY_LIMITS = {
+    # LLM calls queue in the LLM scheduler, which orders them by priority and
+    # student; these only bound the worker threads waiting there. Each priority
+    # class has a gate of its own, so a burst of batch calls cannot hold up
+    # interactive ones in front of the scheduler.
+    "llm": 32,
+    "llm_standard": 16,
+    "llm_batch": 8,
+    "knowledge": 32,
+    "syllabus": 4,
+}
+DEFAULT_LIMIT = 8
+
+_STREAM_END = object()
+
+
+def _next_chunk(gen):
+    # Runs in a worker thread; StopIteration cannot cross an executor future
+    try:
+        return next(gen), None
+    except StopIteration as stop:
+        return _STREAM_END, stop.value
+
+
 class ToolRegistry:
-    def __init__(self):
+    def __init__(self, limits=None):
         self.tools = {}
+        self.limits = dict(DEFAULT_CATEGORY_LIMITS)
+        self.limits.update(limits or {})
+        self._lock = threading.Lock()
+        self._executors = {}
+        # asyncio primitives belong to one event loop, so semaphores are kept per loop
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._waiting = {}
+        self._running = {}
 
-    def register(self, name, func, schema=None):
+    def register(self, name, func, schema=None, stream=None, category=None):
         self.tools[name] = {
             "func": func,
-            "schema": schema or {}
+            "schema": schema or {},
+            # Compiled once here; every call is checked against it before the tool runs
+            "validate": compile_schema(name, schema or {}),
+            "stream": stream,
+            "category": category or name.split(".", 1)[0],
         }
 
     def list_tools(self):
         return [
-            {"name": name, "schema": info["schema"]}
+            {
+                "name": name,
+                "schema": info["schema"],
+                "stream": info["stream"] is not None,
+                "category": info["category"],
+            }
             for name, info in self.tools.items()
         ]
 
-    def call(self, name, args):
+    def _get(self, name):
         if name not in self.tools:
             raise ValueError(f"Tool '{name}' not found")
-        return self.tools[name]["func"](args)
+        return self.tools[name]
+
+    def _validate(self, tool, args):
+        validate = tool["validate"]
+        return validate(args) if validate is not None else args
+
+    def validate(self, name, args):
+        """
+        Check args against the tool's schema without calling it.
+
+        Returns the args with declared arguments coerced to their schema types;
+        raises ToolValidationError if they do not fit.
+        """
+        return self._validate(self._get(name), args)
+
+    def _run(self, tool, args):
+        func = tool["func"]
+        if inspect.iscoroutinefunction(func):
+            return asyncio.run(func(args))
+        return func(args)
+
+    def call(self, name, args):
+        tool = self._get(name)
+        return self._run(tool, self._validate(tool, args))
+
+    def _stream(self, tool, args):
+        stream = tool["stream"]
+        if stream is None:
+            return self._run(tool, args)
+        return (yield from stream(args))
+
+    def call_stream(self, name, args):
+        """
+        Generator yielding a tool's partial output; its return value is the final result.
+
+        Tools registered without a stream function produce no chunks and just
+        return the result of the regular call.
+        """
+        tool = self._get(name)
+        return (yield from self._stream(tool, self._validate(tool, args)))
+
+    # -------- async dispatch -------- #
+
+    def _limit(self, category):
+        return self.limits.get(category, DEFAULT_LIMIT)
+
+    def _executor(self, category):
+        # Each category gets its own threads so slow tools cannot starve fast ones
+        with self._lock:
+            executor = self._executors.get(category)
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=self._limit(category),
+                    thread_name_prefix=f"tool-{category}",
+                )
+                self._executors[category] = executor
+            return executor
+
+    def _semaphore(self, category):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            per_loop = self._semaphores.setdefault(loop, {})
+            sem = per_loop.get(category)
+            if sem is None:
+                sem = asyncio.Semaphore(self._limit(category))
+                per_loop[category] = sem
+            return sem
+
+    async def _acquire(self, category):
+        sem = self._semaphore(category)
+        with self._lock:
+            self._waiting[category] = self._waiting.get(category, 0) + 1
+        try:
+            await sem.acquire()
+        finally:
+            with self._lock:
+                self._waiting[category] -= 1
+        with self._lock:
+            self._running[category] = self._running.get(category, 0) + 1
+        return sem
+
+    def _release(self, category, sem):
+        with self._lock:
+            self._running[category] -= 1
+        sem.release()
+
+    async def call_async(self, name, args):
+        """
+        Run a tool without blocking the event loop.
+
+        Async tools are awaited directly; sync tools run on their category's
+        thread pool. At most limits[category] calls of a category run at once,
+        the rest wait on the event loop. Invalid args are rejected before a
+        slot is taken.
+        """
+        tool = self._get(name)
+        args = self._validate(tool, args)
+        category = tool["category"]
+        func = tool["func"]
+        sem = await self._acquire(category)
+        try:
+            if inspect.iscoroutinefunction(func):
+                return await func(args)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor(category), func, args)
+        finally:
+            self._release(category, sem)
+
+    async def call_stream_async(self, name, args):
+        """
+        Async generator over a tool stream, holding one slot of the tool's category.
+
+        Yields ("chunk", value) for each partial output, then ("result", value).
+        The slot is held until the tool's generator is closed, which, when
+        the caller goes away mid-chunk, is once the worker thread returns.
+        """
+        tool = self._get(name)
+        args = self._validate(tool, args)
+        category = tool["category"]
+        sem = await self._acquire(category)
+        gen = self._stream(tool, args)
+        loop = asyncio.get_running_loop()
+        pending = None
+        try:
+            executor = self._executor(category)
+            while True:
+                pending = executor.submit(_next_chunk, gen)
+                chunk, result = await asyncio.wrap_future(pending)
+                pending = None
+                if chunk is _STREAM_END:
+                    yield "result", result
+                    return
+                yield "chunk", chunk
+        finally:
+            if pending is not None and not pending.done():
+                # Cancelled while a worker thread is still inside next(gen): the generator
+                # cannot be closed, nor its slot reused, until that thread is done with it
+                pending.add_done_callback(
+                    lambda _: loop.call_soon_threadsafe(self._close_stream, gen, category, sem)
+                )
+            else:
+                self._close_stream(gen, category, sem)
+
+    def _close_stream(self, gen, category, sem):
+        try:
+            gen.close()
+        finally:
+            self._release(category, sem)
+
+    def stats(self):
+        with self._lock:
+            categories = set(self.limits) | {info["category"] for info in self.tools.values()}
+            return {
+                category: {
+                    "limit": self._limit(category),
+                    "running": self._running.get(category, 0),
+                    "waiting": self._waiting.get(category, 0),
+                }
+                for category in sorted(categories)
+            }
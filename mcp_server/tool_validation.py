@@ -0,0 +1,93 @@
+# mcp_server/tool_validation.py
+
+from typing import Any, Dict, List
+
+from pydantic import ConfigDict, TypeAdapter, ValidationError
+from typing_extensions import NotRequired, Required, TypedDict
+
+# Type names used by the tool schemas, in both the short {"input": {...}} form and JSON Schema
+_TYPES = {
+    "string": str,
+    "number": float,
+    "integer": int,
+    "boolean": bool,
+    "object": Dict[str, Any],
+    "list": List[Any],
+    "array": List[Any],
+}
+
+
+class ToolValidationError(ValueError):
+    """A tool was called with arguments its schema rejects; errors lists each problem."""
+
+    def __init__(self, tool, errors):
+        self.tool = tool
+        self.errors = errors
+        problems = "; ".join(f"{'.'.join(str(part) for part in e['loc']) or 'args'}: {e['msg']}" for e in errors)
+        super().__init__(f"Invalid arguments for '{tool}': {problems}")
+
+
+def _typed_dict(name, properties, required):
+    fields = {}
+    for field, spec in properties.items():
+        kind = _field_type(spec, f"{name}_{field}")
+        fields[field] = Required[kind] if field in required else NotRequired[kind]
+    # A TypedDict validates straight into a dict: no model instance to build and dump per call
+    args_type = TypedDict(name, fields, total=False)
+    args_type.__pydantic_config__ = ConfigDict(extra="allow")
+    return args_type
+
+
+def _field_type(spec, name="item"):
+    # A JSON Schema property ({"type": ..., "items": ..., "properties": ...}) or a bare type name
+    if isinstance(spec, dict):
+        kind = spec.get("type")
+        if kind == "array" and "items" in spec:
+            return List[_field_type(spec["items"], name)]
+        if kind == "object" and "properties" in spec:
+            return _typed_dict(name, spec["properties"], set(spec.get("required", ())))
+        spec = kind
+    if spec not in _TYPES:
+        raise ValueError(f"Unsupported schema type {spec!r}")
+    return _TYPES[spec]
+
+
+def input_fields(schema):
+    """
+    The arguments a tool schema declares, as (properties, required names).
+
+    JSON Schemas list them under "properties" and "required"; the short form
+    maps names to type names under "input", with an optional "required" list.
+    """
+    if "properties" in schema:
+        return schema["properties"], set(schema.get("required", ()))
+    return schema.get("input", {}), set(schema.get("required", ()))
+
+
+def compile_schema(name, schema):
+    """
+    Build the argument validator for a tool, or None if its schema declares no inputs.
+
+    The validator takes the raw args and returns a new dict with the declared
+    arguments coerced to their types ("5" becomes 5 for an integer). Arguments
+    the schema does not declare pass through untouched, and optional arguments
+    that were left out (or sent as null) stay out, so the tool's own defaults
+    still apply. Invalid args raise ToolValidationError.
+    """
+    properties, required = input_fields(schema)
+    if not properties:
+        return None
+    adapter = TypeAdapter(_typed_dict(f"{name.replace('.', '_')}_args", properties, required))
+    optional = frozenset(properties) - required
+
+    def validate(args):
+        if isinstance(args, dict) and None in args.values():
+            args = {k: v for k, v in args.items() if v is not None or k not in optional}
+        try:
+            return adapter.validate_python(args)
+        except ValidationError as e:
+            # Inputs are left out: a rejected PDF upload would otherwise be echoed back
+            errors = e.errors(include_url=False, include_context=False, include_input=False)
+            raise ToolValidationError(name, errors) from None
+
+    return validate
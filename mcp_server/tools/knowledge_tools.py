@@ -1,10 +1,21 @@
+import os
+from datetime import datetime
 from typing import Dict, List
 
+from mcp_server.tool_validation import ToolValidationError
+from services.knowledge_graph.graph_cache import GraphCache
 from services.knowledge_graph.graph_service import KnowledgeGraphService
 from services.knowledge_graph.models import KnowledgeGraph, TopicState
+from services.knowledge_graph.storage import graph_version, make_store
 
 
-service = KnowledgeGraphService()
+# Hot student graphs are served from memory and written back in the background.
+# The cache assumes a single server process: with several workers sharing a
+# store, set KNOWLEDGE_CACHE=0 so every update is a locked read-modify-write.
+if os.environ.get("KNOWLEDGE_CACHE", "1") != "0":
+    service = KnowledgeGraphService(cache=GraphCache(make_store()))
+else:
+    service = KnowledgeGraphService(make_store())
 
 
 def load_knowledge(args: Dict) -> Dict:
@@ -16,46 +27,145 @@ def load_knowledge(args: Dict) -> Dict:
 def update_knowledge(args: Dict) -> Dict:
     student_id = args.get("student_id", "")
     topic = args.get("topic", "")
-    delta = float(args.get("delta", 0))
-    graph = service.load_graph(student_id)
-    service.ensure_topic(graph, topic)
-    service.update_mastery(graph, topic, delta)
-    service.save_graph(student_id, graph)
-    mastery = graph["topics"][topic]["mastery"]
-    return {"topic": topic, "mastery": mastery}
+    delta = args.get("delta", 0)
+    results = service.update_topics(student_id, [{"topic": topic, "delta": delta}])
+    return results[0]
+
+
+def update_knowledge_many(args: Dict) -> Dict:
+    student_id = args.get("student_id", "")
+    events = args.get("events", [])
+    results = service.update_topics(student_id, events)
+    return {"results": results}
+
+
+def replay_knowledge(args: Dict) -> Dict:
+    student_id = args.get("student_id", "")
+    until_seq = args.get("until_seq")
+    until = args.get("until")
+    if not hasattr(service.store, "replay"):
+        # Only stores that keep history (the event log) can replay a graph
+        raise ToolValidationError("knowledge.replay", [{
+            "type": "value_error", "loc": [], "msg": "the configured knowledge store does not keep history; set KNOWLEDGE_STORE=eventlog",
+        }])
+    if until:
+        try:
+            datetime.fromisoformat(until)
+        except ValueError:
+            raise ToolValidationError("knowledge.replay", [{
+                "type": "value_error", "loc": ["until"], "msg": "until must be an ISO 8601 timestamp",
+            }]) from None
+    graph = service.replay(
+        student_id,
+        until_seq=until_seq,
+        until=until,
+    )
+    return {"graph": graph}
+
+
+def apply_decay(args: Dict) -> Dict:
+    if args.get("all"):
+        return service.decay_all(chunk_size=args.get("chunk_size", 500))
+    student_id = args.get("student_id", "")
+    return {"student_id": student_id, "topics_decayed": service.decay_student(student_id)}
 
 
 def get_weak_topics(args: Dict) -> Dict:
     student_id = args.get("student_id", "")
-    limit = int(args.get("limit", 5))
-    graph = service.load_graph(student_id)
-    topics = service.get_weak_topics(graph, limit=limit)
+    limit = args.get("limit", 5)
+    topics = service.weak_topics(student_id, limit=limit)
     return {"topics": topics}
 
 
+def get_due_topics(args: Dict) -> Dict:
+    student_id = args.get("student_id", "")
+    limit = args.get("limit")
+    topics = service.due_topics(student_id, limit=limit)
+    return {"topics": topics}
+
+
+def get_overdue_students(args: Dict) -> Dict:
+    more_than = args.get("more_than", 0)
+    return {"students": service.overdue_students(more_than=more_than)}
+
+
 def get_graph(args: Dict) -> Dict:
     student_id = args.get("student_id", "")
     graph = service.load_graph(student_id)
     return {"graph": graph}
 
 
+def save_graph(args: Dict) -> Dict:
+    """Compare-and-swap: save the graph only if the stored one is still at expected_version."""
+    student_id = args.get("student_id", "")
+    graph = args.get("graph") or {"topics": {}}
+    saved = service.compare_and_swap(student_id, args.get("expected_version", 0), graph)
+    version = graph_version(graph) if saved else graph_version(service.load_graph(student_id))
+    return {"saved": saved, "version": version}
+
+
+# "input" maps each argument to its type; the registry validates and coerces calls against it
 LOAD_SCHEMA = {
     "input": {"student_id": "string"},
+    "required": ["student_id"],
     "output": {"graph": "object"},
 }
 
 UPDATE_SCHEMA = {
     "input": {"topic": "string", "delta": "number", "student_id": "string"},
+    "required": ["student_id", "topic", "delta"],
     "output": {"topic": "string", "mastery": "number"},
 }
 
+UPDATE_MANY_SCHEMA = {
+    "input": {
+        "events": {
+            "type": "array",
+            "items": {"type": "object", "properties": {"topic": "string", "delta": "number"}, "required": ["topic", "delta"]},
+        },
+        "student_id": "string",
+    },
+    "required": ["student_id", "events"],
+    "output": {"results": "list"},
+}
+
+REPLAY_SCHEMA = {
+    "input": {"student_id": "string", "until_seq": "integer", "until": "string"},
+    "required": ["student_id"],
+    "output": {"graph": "object"},
+}
+
+DECAY_SCHEMA = {
+    "input": {"student_id": "string", "all": "boolean", "chunk_size": "integer"},
+    "output": {"topics_decayed": "integer"},
+}
+
 WEAK_SCHEMA = {
-    "input": {"student_id": "string", "limit": "number"},
+    "input": {"student_id": "string", "limit": "integer"},
+    "required": ["student_id"],
+    "output": {"topics": "list"},
+}
+
+DUE_SCHEMA = {
+    "input": {"student_id": "string", "limit": "integer"},
+    "required": ["student_id"],
     "output": {"topics": "list"},
 }
 
+OVERDUE_SCHEMA = {
+    "input": {"more_than": "integer"},
+    "output": {"students": "list"},
+}
+
 GRAPH_SCHEMA = {
     "input": {"student_id": "string"},
+    "required": ["student_id"],
     "output": {"graph": "object"},
 }
 
+SAVE_GRAPH_SCHEMA = {
+    "input": {"student_id": "string", "graph": "object", "expected_version": "integer"},
+    "required": ["student_id", "graph", "expected_version"],
+    "output": {"saved": "boolean", "version": "integer"},
+}
+
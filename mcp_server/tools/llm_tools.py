@@ -1,8 +1,28 @@
-from llm_runtime.ollama_client import OllamaClient
+from llm_runtime.ollama_client import OllamaClient, is_error_text
+from llm_runtime.response_cache import LLMResponseCache
+from llm_runtime.scheduler import IDLE, LLMScheduler
+from mcp_server.tool_validation import ToolValidationError
+from services.content_store import ContentStore
+from services.knowledge_graph.cohort import topic_mastery
+from services.pregeneration import Pregenerator
+from services.question_bank import DEFAULT_DIFFICULTY, DIFFICULTIES, QuestionBank, pool_name, validate_item
+from functools import partial
+import hashlib
 import json
 
-# Instantiate the LLM client module-level
-llm = OllamaClient()
+# Instantiate the LLM client module-level; identical prompts are served from the response cache,
+# and the scheduler decides which tool call gets the next model slot
+llm = OllamaClient(cache=LLMResponseCache(), scheduler=LLMScheduler())
+
+# Seconds a call of each priority class may wait for a model slot before it is dropped;
+# a caller can pass its own "deadline". All stay well under the UI client's 30 s read
+# timeout (ui/mcp_client.py), leaving time to generate: a call still queued after the
+# client gave up would only spend a model slot on an answer nobody reads.
+DEFAULT_DEADLINES = {
+    "interactive": 10.0,
+    "standard": 15.0,
+    "batch": 20.0,
+}
 
 # --- Prompt Templates ---
 
@@ -10,7 +30,7 @@ EXPLAIN_PROMPT_TEMPLATE = """Explain the academic topic '{topic}' in simple lang
 
 FLASHCARD_PROMPT_TEMPLATE = """You are an educational assistant. Generate {count} concise flashcards for the topic: "{topic}". Each flashcard must have 'q' (question) and 'a' (short answer). Output STRICT JSON only, with the top-level object: {{"flashcards": [{{"q":"...", "a":"..."}}, ...]}}. No extra commentary or plaintext outside JSON."""
 
-MCQ_PROMPT_TEMPLATE = """You are an exam generator. Create {count} high-quality multiple-choice questions for the topic: "{topic}". Each MCQ must include:
+MCQ_PROMPT_TEMPLATE = """You are an exam generator. Create {count} high-quality multiple-choice questions of {difficulty} difficulty for the topic: "{topic}". Each MCQ must include:
 - "question": string
 - "options": array of exactly 4 strings
 - "answer_index": integer (0-based index of correct option)
@@ -30,52 +50,121 @@ STUDYPLAN_PROMPT_TEMPLATE = """You are a curriculum planner. Given topics: {topi
 
 No extra text outside the JSON."""
 
+# --- Pre-generated content ---
+
+# Flashcards and MCQs generated per background job, banked for later quizzes
+PREGENERATED_COUNTS = {"flashcards": 8, "mcqs": 5}
+
+# Explanations written by another model or for another prompt are dropped when the store opens
+CONTENT_VERSION = hashlib.sha256("\n".join([llm.model, EXPLAIN_PROMPT_TEMPLATE]).encode("utf-8")).hexdigest()[:16]
+content = ContentStore(version=CONTENT_VERSION)
+# Validated, deduplicated MCQs and flashcards; quizzes are sampled from here
+bank = QuestionBank()
+
 # --- Tool Functions ---
 
+def _topic(args: dict) -> str:
+    return (args.get("topic") or "").strip()
+
+def _stored(kind: str, args: dict):
+    # Pre-generated content answers plain requests; 'fresh' asks for a new generation
+    if args.get("fresh"):
+        return None
+    return content.get(kind, _topic(args))
+
+def _schedule(args: dict, priority: str) -> dict:
+    # Scheduling keyword arguments for the llm.ask* calls of one tool call
+    return {
+        "priority": priority,
+        "student_id": args.get("student_id"),
+        "deadline": args.get("deadline", DEFAULT_DEADLINES[priority]),
+    }
+
+def _explain_prompt(args: dict) -> str:
+    topic = args.get("topic")
+    context = args.get("context", "")
+    prompt = EXPLAIN_PROMPT_TEMPLATE.format(topic=topic)
+    if context:
+        prompt += f"\n\nContext: {context}"
+    return prompt
+
 def explain_topic(args: dict) -> dict:
     """
-    Explains an academic topic.
+    Explains an academic topic, from the pre-generated content when there is no 'context'.
     
     Args:
-        args (dict): Must contain 'topic' (str) and optionally 'context' (str).
+        args (dict): Must contain 'topic' (str) and optionally 'context' (str),
+            'fresh' (bool) to bypass the response cache, and 'student_id' (str)
+            and 'deadline' (seconds) for the scheduler.
         
     Returns:
         dict: {"topic": str, "explanation": str}
     """
-    topic = args.get("topic")
-    context = args.get("context", "")
-    
-    # Simple check to append context if needed, or just rely on the template implication
-    # The template says "If additional context is provided...", so we should probably inject it into the prompt if distinct, 
-    # but the template has '{topic}'. It doesn't look like it has a '{context}' placeholder in the text provided in section 4.
-    # However, the first section prompt template had "If context is provided, prioritize context." 
-    # I will construct the prompt by formatting {topic}. If context exists, I'll append it to the prompt.
-    
-    prompt = EXPLAIN_PROMPT_TEMPLATE.format(topic=topic)
-    if context:
-        prompt += f"\n\nContext: {context}"
-        
-    result_text = llm.ask(prompt)
-    return {"topic": topic, "explanation": result_text}
+    stored = None if args.get("context") else _stored("explanation", args)
+    if stored is not None:
+        return {"topic": args.get("topic"), "explanation": stored}
+    result_text = llm.ask(_explain_prompt(args), bypass_cache=bool(args.get("fresh", False)),
+                          **_schedule(args, "interactive"))
+    return {"topic": args.get("topic"), "explanation": result_text}
 
-def flashcards_for_topic(args: dict) -> dict:
+def explain_topic_stream(args: dict):
     """
-    Generates flashcards for a given topic.
+    Streaming variant of explain_topic.
     
     Args:
-        args (dict): 'topic' (str), optional 'count' (int, default 8).
+        args (dict): Same as explain_topic.
+        
+    Yields:
+        str: Explanation text fragments as the model generates them.
         
     Returns:
-        dict: JSON response with flashcards list or raw fallback.
+        dict: {"topic": str, "explanation": str} once generation finishes.
     """
-    topic = args.get("topic")
-    count = args.get("count", 8)
-    
-    prompt = FLASHCARD_PROMPT_TEMPLATE.format(topic=topic, count=count)
-    response = llm.ask_json(prompt)
-    
+    stored = None if args.get("context") else _stored("explanation", args)
+    if stored is not None:
+        yield stored
+        return {"topic": args.get("topic"), "explanation": stored}
+    parts = []
+    for chunk in llm.ask_stream(_explain_prompt(args), bypass_cache=bool(args.get("fresh", False)),
+                                **_schedule(args, "interactive")):
+        parts.append(chunk)
+        yield chunk
+    return {"topic": args.get("topic"), "explanation": "".join(parts)}
+
+# Tools serving each kind from the bank, for their validation errors
+_BANKED_TOOLS = {"flashcards": "llm.flashcards", "mcqs": "llm.generate_mcq"}
+
+def _count(kind: str, args: dict, default_count: int) -> int:
+    count = args.get("count", default_count)
+    if count <= 0:
+        # Reported the same way as a schema violation
+        raise ToolValidationError(_BANKED_TOOLS[kind], [{
+            "type": "value_error", "loc": ["count"], "msg": "count must be at least 1",
+        }])
+    return count
+
+def _banked(kind: str, args: dict, default_count: int, difficulty: str = None):
+    # Quizzes are sampled from the question bank; None sends the call to the LLM
+    count = _count(kind, args, default_count)
+    if args.get("fresh"):
+        return None
+    topic = _topic(args)
+    items = bank.sample(kind, topic, count, difficulty)
+    # The pool that was asked for is refilled in the background once it runs low. Every
+    # submission costs a cohort lookup, so a pool already queued is not submitted again
+    pool = pool_name(kind, difficulty)
+    if not bank.has(pool, topic) and not pregenerator.pending(pool, topic):
+        pregenerator.submit([topic], [pool])
+    return items if len(items) >= count else None
+
+def _flashcards_prompt(args: dict) -> str:
+    return FLASHCARD_PROMPT_TEMPLATE.format(topic=args.get("topic"), count=args.get("count", 8))
+
+def _flashcards_result(response: dict) -> dict:
     # Validate structure if parsed
     if "flashcards" in response and isinstance(response["flashcards"], list):
+        cards = (validate_item("flashcards", card) for card in response["flashcards"])
+        response["flashcards"] = [card for card in cards if card is not None]
         return response
     
     # Fallback/Raw
@@ -84,39 +173,135 @@ def flashcards_for_topic(args: dict) -> dict:
          
     return {"flashcards": [], "_error": "Failed to parse flashcards", "_raw": str(response)}
 
+def flashcards_for_topic(args: dict) -> dict:
+    """
+    Samples flashcards for a given topic from the question bank, generating them if it has too few.
+    
+    Args:
+        args (dict): 'topic' (str), optional 'count' (int, default 8), 'fresh' (bool) to
+            generate new cards, 'student_id' (str) and 'deadline' (seconds).
+        
+    Returns:
+        dict: JSON response with flashcards list or raw fallback.
+    """
+    banked = _banked("flashcards", args, 8)
+    if banked is not None:
+        return {"flashcards": banked}
+    response = llm.ask_json(_flashcards_prompt(args), bypass_cache=bool(args.get("fresh", False)),
+                            **_schedule(args, "standard"))
+    result = _flashcards_result(response)
+    bank.add("flashcards", _topic(args), result.get("flashcards", []))
+    return result
+
+def flashcards_stream(args: dict):
+    """
+    Streaming variant of flashcards_for_topic.
+    
+    Args:
+        args (dict): Same as flashcards_for_topic.
+        
+    Yields:
+        dict: Each flashcard ({"q", "a"}) as soon as the model has finished it.
+        
+    Returns:
+        dict: Same as flashcards_for_topic.
+    """
+    banked = _banked("flashcards", args, 8)
+    if banked is not None:
+        yield from banked
+        return {"flashcards": banked}
+    gen = llm.ask_json_stream(_flashcards_prompt(args), bypass_cache=bool(args.get("fresh", False)),
+                              **_schedule(args, "standard"))
+    while True:
+        try:
+            key, card = next(gen)
+        except StopIteration as stop:
+            result = _flashcards_result(stop.value)
+            bank.add("flashcards", _topic(args), result.get("flashcards", []))
+            return result
+        card = validate_item("flashcards", card) if key == "flashcards" else None
+        if card is not None:
+            yield card
+
+def _difficulty(args: dict) -> str:
+    difficulty = (args.get("difficulty") or DEFAULT_DIFFICULTY["mcqs"]).strip().lower()
+    if difficulty not in DIFFICULTIES:
+        # Reported the same way as a schema violation
+        raise ToolValidationError("llm.generate_mcq", [{
+            "type": "value_error", "loc": ["difficulty"], "msg": f"difficulty must be one of {', '.join(DIFFICULTIES)}",
+        }])
+    return difficulty
+
+def _mcq_prompt(args: dict, difficulty: str) -> str:
+    return MCQ_PROMPT_TEMPLATE.format(topic=args.get("topic"), count=args.get("count", 3), difficulty=difficulty)
+
+def _mcq_result(response: dict) -> dict:
+    # Only MCQs the bank would accept are returned: 4 distinct options and an answer_index in range
+    if "mcqs" in response and isinstance(response["mcqs"], list):
+        mcqs = (validate_item("mcqs", mcq) for mcq in response["mcqs"])
+        response["mcqs"] = [mcq for mcq in mcqs if mcq is not None]
+    return response
+
 def generate_mcq(args: dict) -> dict:
     """
-    Generates multiple-choice questions.
+    Samples multiple-choice questions from the question bank, generating them if it has too few.
     
     Args:
-        args (dict): 'topic' (str), optional 'count' (int, default 3).
+        args (dict): 'topic' (str), optional 'count' (int, default 3), 'difficulty'
+            ("easy", "medium" or "hard", default "medium"), 'fresh' (bool) to generate
+            new questions, 'student_id' (str) and 'deadline' (seconds).
         
     Returns:
         dict: JSON response with mcqs list.
     """
-    topic = args.get("topic")
-    count = args.get("count", 3)
-    
-    prompt = MCQ_PROMPT_TEMPLATE.format(topic=topic, count=count)
-    response = llm.ask_json(prompt)
+    difficulty = _difficulty(args)
+    banked = _banked("mcqs", args, 3, difficulty)
+    if banked is not None:
+        return {"mcqs": banked}
+    response = llm.ask_json(_mcq_prompt(args, difficulty), bypass_cache=bool(args.get("fresh", False)),
+                            **_schedule(args, "standard"))
+    result = _mcq_result(response)
+    bank.add("mcqs", _topic(args), result.get("mcqs", []), difficulty)
+    return result
+
+def generate_mcq_stream(args: dict):
+    """
+    Streaming variant of generate_mcq.
     
-    # Validation logic could be added here as per prompt instructions check array length etc.
-    if "mcqs" in response and isinstance(response["mcqs"], list):
-        # Basic validation (optional but requested "validate mcqs before returning")
-        valid_mcqs = []
-        for mcq in response["mcqs"]:
-            if len(mcq.get("options", [])) == 4 and "answer_index" in mcq:
-                 valid_mcqs.append(mcq)
-        response["mcqs"] = valid_mcqs
+    Args:
+        args (dict): Same as generate_mcq.
         
-    return response
+    Yields:
+        dict: Each valid MCQ as soon as the model has finished it.
+        
+    Returns:
+        dict: Same as generate_mcq.
+    """
+    difficulty = _difficulty(args)
+    banked = _banked("mcqs", args, 3, difficulty)
+    if banked is not None:
+        yield from banked
+        return {"mcqs": banked}
+    gen = llm.ask_json_stream(_mcq_prompt(args, difficulty), bypass_cache=bool(args.get("fresh", False)),
+                              **_schedule(args, "standard"))
+    while True:
+        try:
+            key, mcq = next(gen)
+        except StopIteration as stop:
+            result = _mcq_result(stop.value)
+            bank.add("mcqs", _topic(args), result.get("mcqs", []), difficulty)
+            return result
+        mcq = validate_item("mcqs", mcq) if key == "mcqs" else None
+        if mcq is not None:
+            yield mcq
 
 def generate_studyplan(args: dict) -> dict:
     """
     Generates a study plan.
     
     Args:
-        args (dict): 'topics' (list), 'days' (int), 'student_state' (dict).
+        args (dict): 'topics' (list), 'days' (int), 'student_state' (dict), optional 'fresh' (bool),
+            'student_id' (str) and 'deadline' (seconds).
         
     Returns:
         dict: Plan JSON and text summary.
@@ -127,7 +312,54 @@ def generate_studyplan(args: dict) -> dict:
     
     # Convert lists/dicts to string representation for the prompt
     prompt = STUDYPLAN_PROMPT_TEMPLATE.format(topics=topics, student_state=json.dumps(student_state), days=days)
-    return llm.ask_json(prompt)
+    return llm.ask_json(prompt, bypass_cache=bool(args.get("fresh", False)), **_schedule(args, "batch"))
+
+def _pregenerate_explanation(topic: str):
+    # The pregenerator already holds an idle scheduler slot, hence priority=None
+    text = llm.ask(_explain_prompt({"topic": topic}), priority=None)
+    return None if is_error_text(text) else text
+
+def _pregenerate_flashcards(topic: str):
+    # A refill needs a fresh answer: the cached one is already in the bank
+    prompt = _flashcards_prompt({"topic": topic, "count": PREGENERATED_COUNTS["flashcards"]})
+    response = llm.ask_json(prompt, bypass_cache=bank.count("flashcards", topic) > 0, priority=None)
+    return _flashcards_result(response).get("flashcards") or None
+
+def _pregenerate_mcqs(topic: str, difficulty: str = DEFAULT_DIFFICULTY["mcqs"]):
+    prompt = _mcq_prompt({"topic": topic, "count": PREGENERATED_COUNTS["mcqs"]}, difficulty)
+    response = llm.ask_json(prompt, bypass_cache=bank.count("mcqs", topic, difficulty) > 0, priority=None)
+    return _mcq_result(response).get("mcqs") or None
+
+# MCQ pools at the other difficulties are only refilled once a quiz asks for them
+_MCQ_POOLS = {pool_name("mcqs", difficulty): partial(_pregenerate_mcqs, difficulty=difficulty)
+              for difficulty in DIFFICULTIES if difficulty != DEFAULT_DIFFICULTY["mcqs"]}
+
+# Fills the content store and the question bank on idle model capacity, weakest topics
+# across the cohort first
+pregenerator = Pregenerator(
+    {"explanation": _pregenerate_explanation, "flashcards": _pregenerate_flashcards, "mcqs": _pregenerate_mcqs,
+     **_MCQ_POOLS},
+    content,
+    weakness=topic_mastery,
+    slot=lambda: llm.scheduler.slot(IDLE),
+    stores={"flashcards": bank, "mcqs": bank, **dict.fromkeys(_MCQ_POOLS, bank)},
+    kinds=("explanation", "flashcards", "mcqs"),
+)
+
+def pregenerate(args: dict) -> dict:
+    """
+    Queues explanations, flashcards and MCQs for topics, generated in the background.
+    Content already stored, and question pools that are not running low, are skipped.
+    
+    Args:
+        args (dict): 'topics' (list of str).
+        
+    Returns:
+        dict: {"queued": int} topics handed to the pipeline; see /stats for progress.
+    """
+    topics = args.get("topics", [])
+    pregenerator.submit(topics)
+    return {"queued": len(topics)}
 
 # --- Schemas ---
 
@@ -135,7 +367,10 @@ EXPLAIN_SCHEMA = {
     "type": "object",
     "properties": {
         "topic": {"type": "string"},
-        "context": {"type": "string"}
+        "context": {"type": "string"},
+        "fresh": {"type": "boolean"},
+        "student_id": {"type": "string"},
+        "deadline": {"type": "number"}
     },
     "required": ["topic"]
 }
@@ -144,7 +379,10 @@ FLAShCARD_SCHEMA = {
     "type": "object",
     "properties": {
         "topic": {"type": "string"},
-        "count": {"type": "integer"}
+        "count": {"type": "integer"},
+        "fresh": {"type": "boolean"},
+        "student_id": {"type": "string"},
+        "deadline": {"type": "number"}
     },
     "required": ["topic"]
 }
@@ -154,7 +392,10 @@ MCQ_SCHEMA = {
     "properties": {
         "topic": {"type": "string"},
         "count": {"type": "integer"},
-        "difficulty": {"type": "string"}
+        "difficulty": {"type": "string"},
+        "fresh": {"type": "boolean"},
+        "student_id": {"type": "string"},
+        "deadline": {"type": "number"}
     },
     "required": ["topic"]
 }
@@ -164,7 +405,18 @@ STUDYPLAN_SCHEMA = {
     "properties": {
         "topics": {"type": "array", "items": {"type": "string"}},
         "days": {"type": "integer"},
-        "student_state": {"type": "object"}
+        "student_state": {"type": "object"},
+        "fresh": {"type": "boolean"},
+        "student_id": {"type": "string"},
+        "deadline": {"type": "number"}
     },
     "required": ["topics", "days", "student_state"]
 }
+
+PREGENERATE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "topics": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["topics"]
+}
@@ -1,14 +1,143 @@
-from services.syllabus_service import SyllabusService
+import base64
+import binascii
+import os
+import tempfile
+
+from llm_runtime.singleflight import SingleFlight
+from mcp_server.tool_validation import ToolValidationError
+from services.syllabus_cache import SyllabusCache
+from services.syllabus_service import PARSER_VERSION, SyllabusService
 
 service = SyllabusService()
+# Shared by every student who uploads the same course PDF
+cache = SyllabusCache(parser_version=PARSER_VERSION)
+# Simultaneous uploads of one PDF are parsed once
+inflight = SingleFlight()
+# Called with the topics of every successful parse, e.g. to generate study content ahead of time
+topic_listeners = []
+
+def _publish(topics):
+    for listener in topic_listeners:
+        listener(topics)
 
 def parse_syllabus(args):
     pdf_text = args.get("text", "")
     cleaned = service.clean_text(pdf_text)
     topics = service.extract_topics(cleaned)
+    _publish(topics)
     return {"topics": topics}
 
+def _invalid(field, message):
+    # Rules the schema cannot express, reported the same way as a schema violation
+    return ToolValidationError("syllabus.parse_pdf", [{"type": "value_error", "loc": [field], "msg": message}])
+
+def _pdf_args(args):
+    sha256 = (args.get("sha256") or "").strip().lower()
+    data = args.get("pdf_base64")
+    if not data:
+        if not sha256:
+            raise _invalid("pdf_base64", "syllabus.parse_pdf needs 'pdf_base64' or 'sha256'")
+        return sha256, None
+    try:
+        pdf = base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError):
+        # Non-alphabet characters or bad padding; without validate they would be skipped silently
+        raise _invalid("pdf_base64", "'pdf_base64' is not valid base64") from None
+    digest = SyllabusCache.make_key(pdf)
+    if sha256 and sha256 != digest:
+        raise _invalid("sha256", "'sha256' does not match the uploaded PDF")
+    return digest, pdf
+
+def _parse_updates(key, pdf):
+    # pdfminer and the extraction workers read the PDF by path
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf)
+        for update in service.iter_parse_pdf(path):
+            if update["done"] and update["pages"] and not update["timed_out"]:
+                # A parse cut short by the time limit is returned but not kept
+                cache.put(key, {k: v for k, v in update.items() if k != "done"})
+            yield update
+    finally:
+        os.remove(path)
+
+def _parse(key, pdf):
+    entry = None
+    for entry in _parse_updates(key, pdf):
+        pass
+    return entry
+
+def _result(key, entry, cached, include_text):
+    if entry is None:
+        return {"sha256": key, "found": False, "cached": False, "topics": []}
+    result = {
+        "sha256": key,
+        "found": True,
+        "cached": cached,
+        "topics": entry["topics"],
+        "pages": entry["pages"],
+        "page_count": entry["page_count"],
+        "timed_out": entry.get("timed_out", False),
+    }
+    if include_text:
+        result["raw_text"] = entry["raw_text"]
+        result["cleaned_text"] = entry["cleaned_text"]
+    return result
+
+def parse_pdf(args):
+    """
+    Parse a syllabus PDF, or look up an earlier parse of the same PDF.
+
+    Args:
+        args (dict): 'pdf_base64' (str) and/or 'sha256' (str, hex digest of the PDF bytes),
+            optional 'include_text' (bool, default True).
+
+    Returns:
+        dict: sha256, found, cached, topics, pages, page_count, timed_out, and raw_text and
+        cleaned_text with include_text. With only a sha256 that is not cached, found is
+        False and the client should send the bytes.
+    """
+    key, pdf = _pdf_args(args)
+    include_text = bool(args.get("include_text", True))
+    entry = cache.get(key)
+    cached = entry is not None
+    if entry is None and pdf is not None:
+        entry = inflight.do(key, lambda: _parse(key, pdf))
+    if entry is not None:
+        _publish(entry["topics"])
+    return _result(key, entry, cached, include_text)
+
+def parse_pdf_stream(args):
+    """
+    Streaming variant of parse_pdf for cache misses.
+
+    Yields:
+        dict: {"pages", "page_count", "topics"} with the topics found so far, every few pages.
+
+    Returns:
+        dict: Same as parse_pdf.
+    """
+    key, pdf = _pdf_args(args)
+    include_text = bool(args.get("include_text", True))
+    entry = cache.get(key)
+    cached = entry is not None
+    if entry is None and pdf is not None:
+        for update in inflight.stream(key, lambda: _parse_updates(key, pdf)):
+            if update["done"]:
+                entry = update
+            else:
+                yield {"pages": update["pages"], "page_count": update["page_count"], "topics": update["topics"]}
+    if entry is not None:
+        _publish(entry["topics"])
+    return _result(key, entry, cached, include_text)
+
 SCHEMA = {
     "input": {"text": "string"},
     "output": {"topics": "list"}
 }
+
+PARSE_PDF_SCHEMA = {
+    "input": {"pdf_base64": "string", "sha256": "string", "include_text": "boolean"},
+    "output": {"sha256": "string", "found": "boolean", "cached": "boolean", "topics": "list", "raw_text": "string"}
+}
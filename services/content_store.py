@@ -0,0 +1,92 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from utilities.paths import cache_path
+
+
+class ContentStore:
+    """
+    Persistent store of study content generated ahead of time, keyed by kind and topic.
+
+    A kind is what was generated ("explanation", "flashcards", "mcqs"); the
+    value is whatever JSON the generator produced for it. Entries belong to a
+    content version (the model and prompts that produced them) and those from
+    other versions are dropped on open, so a prompt change is never answered
+    with content written for the old prompt.
+    """
+    def __init__(self, path: Optional[str] = cache_path("content.sqlite3"), version: str = "1"):
+        """
+        Initialize the store.
+
+        Args:
+            path (str, optional): SQLite file; None keeps the store in memory only.
+            version (str): Version of the generators; entries of other versions are dropped.
+        """
+        self.version = version
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0}
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False, isolation_level=None)
+        if path:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS content ("
+            " kind TEXT NOT NULL,"
+            " topic TEXT NOT NULL,"
+            " version TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " PRIMARY KEY (kind, topic))"
+        )
+        self._db.execute("DELETE FROM content WHERE version != ?", (version,))
+
+    def get(self, kind: str, topic: str) -> Optional[Any]:
+        """
+        Return the stored content of this kind for topic, or None.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM content WHERE kind = ? AND topic = ?", (kind, topic)
+            ).fetchone()
+            self._counters["hits" if row is not None else "misses"] += 1
+        return json.loads(row[0]) if row is not None else None
+
+    def has(self, kind: str, topic: str) -> bool:
+        """
+        Tell whether content of this kind exists for topic, without counting a lookup.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM content WHERE kind = ? AND topic = ?", (kind, topic)
+            ).fetchone()
+        return row is not None
+
+    def put(self, kind: str, topic: str, value: Any) -> None:
+        """
+        Store content, replacing any earlier content of this kind for topic.
+        """
+        data = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO content (kind, topic, version, value, created) VALUES (?, ?, ?, ?, ?)",
+                (kind, topic, self.version, data, time.time()),
+            )
+            self._counters["stores"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return lookup counters and the number of entries per kind.
+        """
+        with self._lock:
+            data = dict(self._counters)
+            data["entries"] = dict(self._db.execute("SELECT kind, COUNT(*) FROM content GROUP BY kind").fetchall())
+        lookups = data["hits"] + data["misses"]
+        data["hit_ratio"] = data["hits"] / lookups if lookups else 0.0
+        return data
@@ -0,0 +1,218 @@
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import pyarrow as pa
+
+from services.knowledge_graph.compact import CompactGraph, CompactTopic
+from services.knowledge_graph.storage import LOCK_FILE, CorruptGraphError, GraphStore, JSONFileStore
+
+FORMAT_NAME = b"knowledge-graph"
+FORMAT_VERSION = 1
+
+_TIME = pa.timestamp("us")
+SCHEMA = pa.schema([
+    ("topic", pa.string()),
+    ("mastery", pa.float64()),
+    ("last_review", _TIME),
+    ("next_review", _TIME),
+    ("attempts", pa.int64()),
+    ("correct", pa.int64()),
+    ("wrong", pa.int64()),
+    ("decay_rate", pa.float64()),
+    ("decayed_at", _TIME),
+    # JSON for the rare topic that needs more than the columns: unknown keys,
+    # missing standard keys and timestamps kept verbatim (see CompactTopic)
+    ("wire", pa.string()),
+])
+_TIME_COLUMNS = ("last_review", "next_review", "decayed_at")
+
+
+def _wire_column(topic: CompactTopic) -> Optional[str]:
+    if topic.extra is None and topic.absent is None and topic.raw is None:
+        return None
+    return json.dumps({
+        "extra": topic.extra,
+        "absent": sorted(topic.absent) if topic.absent else None,
+        "raw": {name: [micros, text] for name, (micros, text) in topic.raw.items()} if topic.raw else None,
+    }, ensure_ascii=False)
+
+
+def graph_to_table(graph: CompactGraph) -> pa.Table:
+    topics = list(graph.topics.values())
+    columns = {
+        "topic": list(graph.topics),
+        "mastery": [float(t.mastery) for t in topics],
+        "last_review": [t.last_review for t in topics],
+        "next_review": [t.next_review for t in topics],
+        "attempts": [int(t.attempts) for t in topics],
+        "correct": [int(t.correct) for t in topics],
+        "wrong": [int(t.wrong) for t in topics],
+        "decay_rate": [float(t.decay_rate) for t in topics],
+        "decayed_at": [t.decayed_at for t in topics],
+        "wire": [_wire_column(t) for t in topics],
+    }
+    metadata = {
+        b"format": FORMAT_NAME,
+        b"version": str(FORMAT_VERSION).encode(),
+        b"meta": json.dumps(graph.meta or {}, ensure_ascii=False).encode("utf-8"),
+    }
+    # Timestamps go in as integer microseconds; Arrow stores them unchanged
+    arrays = [
+        pa.array(columns[field.name], type=pa.int64()).cast(_TIME) if field.name in _TIME_COLUMNS
+        else pa.array(columns[field.name], type=field.type)
+        for field in SCHEMA
+    ]
+    return pa.Table.from_arrays(arrays, schema=SCHEMA.with_metadata(metadata))
+
+
+def _column(table: pa.Table, name: str) -> list:
+    column = table.column(name)
+    if name in _TIME_COLUMNS:
+        column = column.cast(pa.int64())
+    return column.to_pylist()
+
+
+def table_to_graph(table: pa.Table) -> CompactGraph:
+    metadata = table.schema.metadata or {}
+    meta = json.loads(metadata.get(b"meta", b"{}").decode("utf-8"))
+    names = _column(table, "topic")
+    columns = [_column(table, name) for name in ("mastery", "last_review", "next_review", "attempts", "correct", "wrong", "decay_rate", "decayed_at", "wire")]
+    graph = CompactGraph(meta=meta or None)
+    new = CompactTopic.__new__
+    for name, mastery, last_review, next_review, attempts, correct, wrong, decay_rate, decayed_at, wire in zip(names, *columns):
+        topic = new(CompactTopic)
+        topic.mastery = mastery
+        topic.last_review = last_review
+        topic.next_review = next_review
+        topic.attempts = attempts
+        topic.correct = correct
+        topic.wrong = wrong
+        topic.decay_rate = decay_rate
+        topic.decayed_at = decayed_at
+        topic.extra = topic.absent = topic.raw = None
+        if wire is not None:
+            extras = json.loads(wire)
+            topic.extra = extras.get("extra")
+            topic.absent = frozenset(extras["absent"]) if extras.get("absent") else None
+            if extras.get("raw"):
+                topic.raw = {field: (micros, text) for field, (micros, text) in extras["raw"].items()}
+        graph.topics[sys.intern(name)] = topic
+    return graph
+
+
+class ArrowFileStore(GraphStore):
+    """One students/<id>/knowledge.arrow per student, an Arrow IPC file with one row per topic.
+
+    Files are memory-mapped on read, so read_columns() only touches the
+    columns it asks for. The file format is versioned through schema
+    metadata. Students that only have a knowledge.json are read from it
+    and move to Arrow on their next save; export_json() writes the JSON
+    form back out.
+    """
+
+    def __init__(self, base_dir: str = "students"):
+        self.base_dir = base_dir
+        self.json = JSONFileStore(base_dir)
+
+    def _path(self, student_id: str) -> str:
+        return os.path.join(self.base_dir, student_id, "knowledge.arrow")
+
+    def _lock_path(self, student_id: str) -> str:
+        return os.path.join(self.base_dir, student_id, LOCK_FILE)
+
+    def _read_table(self, student_id: str, columns: Optional[Sequence[str]] = None) -> Optional[pa.Table]:
+        path = self._path(student_id)
+        try:
+            # The table's buffers point into the mapping and keep it alive; no copy is made
+            reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+        except FileNotFoundError:
+            return None
+        except (OSError, pa.ArrowInvalid) as e:
+            raise CorruptGraphError(f"Unreadable knowledge graph at {path}: {e}") from e
+        metadata = reader.schema.metadata or {}
+        if metadata.get(b"format") != FORMAT_NAME:
+            raise CorruptGraphError(f"{path} is not a knowledge graph file")
+        version = int(metadata.get(b"version", b"0"))
+        if version > FORMAT_VERSION:
+            raise CorruptGraphError(f"{path} uses format version {version}; this build reads up to {FORMAT_VERSION}")
+        try:
+            # Zero-copy from the mapping, so columns nobody reads are never paged in
+            table = reader.read_all()
+        except (OSError, pa.ArrowInvalid) as e:
+            raise CorruptGraphError(f"Unreadable knowledge graph at {path}: {e}") from e
+        return table.select(list(columns)) if columns is not None else table
+
+    def load_compact(self, student_id: str) -> Optional[CompactGraph]:
+        table = self._read_table(student_id)
+        if table is None:
+            graph = self.json.load(student_id)
+            return CompactGraph.from_wire(graph) if graph is not None else None
+        return table_to_graph(table)
+
+    def load(self, student_id: str) -> Optional[Dict[str, dict]]:
+        graph = self.load_compact(student_id)
+        return graph.to_wire() if graph is not None else None
+
+    def read_columns(self, student_id: str, columns: Sequence[str]) -> Optional[Dict[str, list]]:
+        """Read only the named columns (timestamps as epoch microseconds), e.g. ["topic", "mastery"]."""
+        table = self._read_table(student_id, columns)
+        if table is None:
+            graph = self.json.load(student_id)
+            if graph is None:
+                return None
+            table = graph_to_table(CompactGraph.from_wire(graph)).select(list(columns))
+        return {name: _column(table, name) for name in columns}
+
+    def save_compact(self, student_id: str, graph: CompactGraph) -> None:
+        path = self._path(student_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = graph_to_table(graph)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            with pa.ipc.new_file(f, table.schema) as writer:
+                writer.write_table(table)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def save(self, student_id: str, graph: Dict[str, dict]) -> None:
+        self.save_compact(student_id, CompactGraph.from_wire(graph))
+
+    def save_topics(self, student_id: str, topics: Dict[str, dict], version: Optional[int] = None) -> None:
+        with self.lock(student_id):
+            graph = self.load_compact(student_id) or CompactGraph()
+            for name, entry in topics.items():
+                graph.topics[sys.intern(name)] = CompactTopic.from_wire(entry)
+            graph.version = graph.version + 1 if version is None else version
+            self.save_compact(student_id, graph)
+
+    def modified_at(self, student_id: str) -> Optional[float]:
+        times = []
+        for path in (self._path(student_id), self.json._path(student_id)):
+            try:
+                times.append(os.path.getmtime(path))
+            except OSError:
+                pass
+        return max(times) if times else None
+
+    def export_json(self, student_id: str) -> Optional[str]:
+        """Write the student's graph as knowledge.json next to the Arrow file; returns its path."""
+        graph = self.load(student_id)
+        if graph is None:
+            return None
+        self.json.save(student_id, graph)
+        return self.json._path(student_id)
+
+    def append_events(self, student_id: str, events: Iterable[dict], now: datetime) -> int:
+        return self._save_events(student_id, events, now)
+
+    def student_ids(self) -> List[str]:
+        if not os.path.isdir(self.base_dir):
+            return []
+        return sorted(
+            name for name in os.listdir(self.base_dir)
+            if os.path.isfile(self._path(name)) or os.path.isfile(self.json._path(name))
+        )
@@ -0,0 +1,123 @@
+"""Cohort-wide mastery queries over the Parquet dataset written by services.knowledge_graph.export.
+
+Usage:
+    python -m services.knowledge_graph.cohort weak [--dataset exports/knowledge] [--limit 10] [--below 50]
+    python -m services.knowledge_graph.cohort distribution [--dataset exports/knowledge] [--bins 10] [--topic NAME]
+"""
+import argparse
+import os
+import sys
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from services.knowledge_graph.export import SCHEMA
+from utilities.paths import export_path
+
+DEFAULT_DATASET = export_path("knowledge")
+
+
+def open_dataset(path: str = DEFAULT_DATASET) -> ds.Dataset:
+    # An explicit schema keeps an empty or not yet exported dataset queryable
+    return ds.dataset(path, schema=SCHEMA, format="parquet", partitioning="hive")
+
+
+def _read(path: str, columns: List[str], topics: Optional[List[str]] = None) -> pa.Table:
+    # Only the named columns are read; the topic filter is pushed down to the row groups
+    dataset = open_dataset(path)
+    filter = ds.field("topic").isin(topics) if topics else None
+    return dataset.to_table(columns=columns, filter=filter)
+
+
+def weak_topics(path: str = DEFAULT_DATASET, limit: int = 10, below: float = 50.0, min_students: int = 1) -> pd.DataFrame:
+    """Topics with the lowest mean mastery across the cohort.
+
+    Columns: topic, students, mean_mastery, median_mastery, share_below (the
+    fraction of students under below). Topics studied by fewer than
+    min_students students are left out.
+    """
+    table = _read(path, ["topic", "mastery"])
+    table = table.append_column("is_below", pc.less(table.column("mastery"), below))
+    stats = table.group_by("topic").aggregate([
+        ("mastery", "count"),
+        ("mastery", "mean"),
+        ("mastery", "approximate_median"),
+        ("is_below", "mean"),
+    ])
+    frame = stats.to_pandas().rename(columns={
+        "mastery_count": "students",
+        "mastery_mean": "mean_mastery",
+        "mastery_approximate_median": "median_mastery",
+        "is_below_mean": "share_below",
+    })
+    frame = frame[frame["students"] >= min_students]
+    frame = frame.sort_values(["mean_mastery", "topic"], kind="stable").head(limit)
+    return frame[["topic", "students", "mean_mastery", "median_mastery", "share_below"]].reset_index(drop=True)
+
+
+def topic_mastery(topics: List[str], path: str = DEFAULT_DATASET) -> Dict[str, float]:
+    """Mean mastery across the cohort for each of topics that anyone has studied.
+
+    Topics nobody has studied are left out; before the first export the
+    result is empty.
+    """
+    if not topics or not os.path.isdir(path):
+        return {}
+    stats = _read(path, ["topic", "mastery"], topics).group_by("topic").aggregate([("mastery", "mean")])
+    return dict(zip(stats.column("topic").to_pylist(), stats.column("mastery_mean").to_pylist()))
+
+
+def mastery_distribution(path: str = DEFAULT_DATASET, bins: int = 10, topics: Optional[List[str]] = None, by_topic: bool = False) -> pd.DataFrame:
+    """Histogram of mastery over [0, 100] in bins equal-width bins.
+
+    One row per bin (low, high, count, share), or per (topic, bin) with
+    by_topic. topics restricts the rows read to those topics.
+    """
+    columns = ["topic", "mastery"] if by_topic else ["mastery"]
+    table = _read(path, columns, topics)
+    mastery = table.column("mastery").to_numpy()
+    width = 100.0 / bins
+    # Mastery is clamped to [0, 100]; 100 falls into the last bin
+    index = np.clip((mastery // width).astype(np.int64), 0, bins - 1)
+    if by_topic:
+        frame = pd.DataFrame({"topic": table.column("topic").to_numpy(zero_copy_only=False), "bin": index})
+        counts = frame.groupby(["topic", "bin"]).size().rename("count").reset_index()
+        counts["share"] = counts["count"] / counts.groupby("topic")["count"].transform("sum")
+    else:
+        counted = np.bincount(index, minlength=bins)
+        counts = pd.DataFrame({"bin": np.arange(bins), "count": counted})
+        counts["share"] = counts["count"] / max(int(counted.sum()), 1)
+    counts.insert(counts.columns.get_loc("bin"), "low", counts["bin"] * width)
+    counts.insert(counts.columns.get_loc("bin") + 1, "high", (counts["bin"] + 1) * width)
+    return counts.drop(columns="bin")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="query", required=True)
+    weak = sub.add_parser("weak", help="weakest topics across the cohort")
+    weak.add_argument("--limit", type=int, default=10)
+    weak.add_argument("--below", type=float, default=50.0, help="mastery counted as struggling")
+    weak.add_argument("--min-students", type=int, default=1)
+    dist = sub.add_parser("distribution", help="histogram of mastery")
+    dist.add_argument("--bins", type=int, default=10)
+    dist.add_argument("--topic", action="append", help="restrict to a topic (repeatable)")
+    dist.add_argument("--by-topic", action="store_true")
+    for command in (weak, dist):
+        command.add_argument("--dataset", default=DEFAULT_DATASET, help="directory written by the export job")
+    args = parser.parse_args(argv)
+
+    if args.query == "weak":
+        frame = weak_topics(args.dataset, args.limit, args.below, args.min_students)
+    else:
+        frame = mastery_distribution(args.dataset, args.bins, args.topic, args.by_topic)
+    print(frame.to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+DAY_US = 86400 * 1000000
+
+# Wire-format fields held in slots, in the order they are written back out
+_NUMERIC = ("mastery", "attempts", "correct", "wrong", "decay_rate")
+_TIMES = ("last_review", "next_review", "decayed_at")
+_DEFAULTS = {
+    "mastery": 0,
+    "last_review": None,
+    "next_review": None,
+    "attempts": 0,
+    "correct": 0,
+    "wrong": 0,
+    "decay_rate": 0.05,
+    "decayed_at": None,
+}
+_DEFAULT_DECAY_RATE = _DEFAULTS["decay_rate"]
+_FIELD_ORDER = ("mastery", "last_review", "next_review", "attempts", "correct", "wrong", "decay_rate", "decayed_at")
+# Top-level wire key holding the graph's version
+VERSION_KEY = "version"
+
+
+def to_micros(moment: datetime) -> int:
+    """Microseconds since the epoch for a naive UTC datetime."""
+    return (moment.replace(tzinfo=None) - _EPOCH) // _MICROSECOND
+
+
+def from_micros(micros: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=micros)
+
+
+def _parse_time(value: Optional[str]) -> Tuple[Optional[int], bool]:
+    """(micros, canonical): canonical when from_micros(micros).isoformat() gives value back."""
+    if not value:
+        return None, value is None
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None, False
+    if moment.tzinfo is not None:
+        return to_micros(moment), False
+    return (moment - _EPOCH) // _MICROSECOND, moment.isoformat() == value
+
+
+class CompactTopic:
+    """One topic's state in slots, with timestamps as integer microseconds since the epoch.
+
+    Round-trips the JSON wire entry exactly: fields the entry lacked stay out
+    of to_wire() until they change, timestamps that isoformat() would not
+    reproduce verbatim are echoed back as given, and unknown keys are kept.
+    """
+
+    __slots__ = (
+        "mastery", "last_review", "next_review", "attempts", "correct", "wrong", "decay_rate", "decayed_at",
+        "extra", "absent", "raw",
+    )
+
+    def __init__(self, mastery=40, attempts=0, correct=0, wrong=0, decay_rate=0.05):
+        self.mastery = mastery
+        self.last_review = None
+        self.next_review = None
+        self.attempts = attempts
+        self.correct = correct
+        self.wrong = wrong
+        self.decay_rate = decay_rate
+        self.decayed_at = None
+        # Unknown wire keys, standard keys the entry did not have, and timestamp
+        # strings kept verbatim ({field: (micros, text)}); None when empty
+        self.extra = None
+        self.absent = None
+        self.raw = None
+
+    @classmethod
+    def from_wire(cls, entry: Dict[str, object]) -> "CompactTopic":
+        topic = cls.__new__(cls)
+        absent = []
+        for name in _FIELD_ORDER:
+            if name not in entry:
+                absent.append(name)
+        for name in _NUMERIC:
+            setattr(topic, name, entry.get(name, _DEFAULTS[name]))
+        if topic.decay_rate == _DEFAULT_DECAY_RATE and type(topic.decay_rate) is float:
+            # Nearly every topic has the default rate; share one float object
+            topic.decay_rate = _DEFAULT_DECAY_RATE
+        raw = None
+        for name in _TIMES:
+            text = entry.get(name)
+            micros, canonical = _parse_time(text)
+            setattr(topic, name, micros)
+            explicit_none = text is None and name == "decayed_at" and name in entry
+            if explicit_none or not canonical:
+                raw = raw or {}
+                raw[name] = (micros, text)
+        if "decayed_at" in absent:
+            absent.remove("decayed_at")
+        topic.absent = frozenset(absent) or None
+        topic.raw = raw
+        extra = {k: v for k, v in entry.items() if k not in _DEFAULTS}
+        topic.extra = extra or None
+        return topic
+
+    def to_wire(self) -> Dict[str, object]:
+        entry = {}
+        absent = self.absent
+        raw = self.raw
+        for name in _FIELD_ORDER:
+            value = getattr(self, name)
+            if absent is not None and name in absent and value == _DEFAULTS[name]:
+                continue
+            if name in _TIMES:
+                if raw is not None and name in raw and raw[name][0] == value:
+                    value = raw[name][1]
+                elif value is not None:
+                    value = from_micros(value).isoformat()
+                elif name == "decayed_at":
+                    continue
+            entry[name] = value
+        if self.extra:
+            entry.update(self.extra)
+        return entry
+
+    def copy(self) -> "CompactTopic":
+        topic = CompactTopic.__new__(CompactTopic)
+        for name in CompactTopic.__slots__:
+            setattr(topic, name, getattr(self, name))
+        if self.extra is not None:
+            topic.extra = dict(self.extra)
+        return topic
+
+
+class CompactGraph:
+    """A student's topics as {interned name: CompactTopic}, plus any other top-level wire keys."""
+
+    __slots__ = ("topics", "meta")
+
+    def __init__(self, topics: Optional[Dict[str, CompactTopic]] = None, meta: Optional[dict] = None):
+        self.topics = topics if topics is not None else {}
+        self.meta = meta
+
+    @classmethod
+    def from_wire(cls, graph: Optional[Dict[str, object]]) -> "CompactGraph":
+        if graph is None:
+            return cls()
+        topics = {
+            sys.intern(name): CompactTopic.from_wire(entry)
+            for name, entry in graph.get("topics", {}).items()
+        }
+        meta = {k: v for k, v in graph.items() if k != "topics"}
+        return cls(topics, meta or None)
+
+    @property
+    def version(self) -> int:
+        """Write counter kept in the "version" wire key; 0 for a graph never written with one."""
+        return int(self.meta.get(VERSION_KEY, 0)) if self.meta else 0
+
+    @version.setter
+    def version(self, value: int) -> None:
+        if self.meta is None:
+            self.meta = {}
+        self.meta[VERSION_KEY] = value
+
+    def to_wire(self) -> Dict[str, object]:
+        graph = dict(self.meta) if self.meta else {}
+        graph["topics"] = {name: topic.to_wire() for name, topic in self.topics.items()}
+        return graph
+
+    def topic(self, name: str) -> CompactTopic:
+        """The named topic, created with the default starting state if it does not exist."""
+        topic = self.topics.get(name)
+        if topic is None:
+            topic = CompactTopic()
+            self.topics[sys.intern(name)] = topic
+        return topic
+
+    def copy(self) -> "CompactGraph":
+        return CompactGraph(
+            {name: topic.copy() for name, topic in self.topics.items()},
+            dict(self.meta) if self.meta else None,
+        )
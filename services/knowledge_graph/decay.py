@@ -0,0 +1,138 @@
+"""Apply the forgetting curve to every stored student graph.
+
+Meant to run as a nightly batch job:
+    python -m services.knowledge_graph.decay [--store json|sqlite|eventlog] [--path PATH] [--chunk-size 500]
+
+This writes to the store directly, so run it while the MCP server is stopped;
+against a live server, call the knowledge.apply_decay tool with {"all": true}
+so its graph cache sees the change.
+"""
+import argparse
+import sys
+import time
+from contextlib import ExitStack
+from datetime import datetime
+from typing import Iterable, List, Optional, Set
+
+import numpy as np
+
+from services.knowledge_graph.compact import DAY_US, CompactGraph, to_micros
+from services.knowledge_graph.storage import GraphStore, make_store
+
+# Stands in for a missing timestamp in the int64 microsecond arrays
+_MISSING = np.iinfo(np.int64).min
+
+
+def elapsed_days(since: np.ndarray, now_us: int) -> np.ndarray:
+    """Whole days elapsed since `since` (int64 microseconds); 0 where it is missing or in the future."""
+    missing = since == _MISSING
+    return np.where(missing, 0, np.maximum(now_us - np.where(missing, now_us, since), 0) // DAY_US)
+
+
+def decay_arrays(mastery: np.ndarray, since: np.ndarray, rate: np.ndarray, now_us: int) -> np.ndarray:
+    """Return mastery * (1 - rate) ** days, where days is the whole days elapsed since `since`.
+
+    Timestamps are int64 microseconds since the epoch. Entries less than a
+    day past `since`, or with `since` missing, are returned unchanged.
+    """
+    factor = np.power(1.0 - rate, elapsed_days(since, now_us))
+    return np.clip(mastery * factor, 0.0, 100.0)
+
+
+class DecayEngine:
+    """Vectorized forgetting curve over one compact graph or many.
+
+    Each topic decays by whole days, as it always has, counted from the
+    later of its last_review and its decayed_at. decayed_at moves on by the
+    days applied only, keeping the part of a day not yet decayed, so
+    running the engine repeatedly (for example nightly) compounds to exactly
+    the same value as a single run at the end, and a run within a day of
+    the last review leaves mastery alone. Topics that were never reviewed do
+    not decay.
+    """
+
+    def apply_many(self, graphs: Iterable[CompactGraph], now: Optional[datetime] = None) -> List[Set[str]]:
+        """Decay all topics of all graphs in place, in one array pass.
+
+        Returns:
+            For each graph, the set of topics whose mastery changed.
+        """
+        now_us = to_micros(now or datetime.utcnow())
+        graphs = list(graphs)
+        states, owners, names = [], [], []
+        for index, graph in enumerate(graphs):
+            for topic, state in graph.topics.items():
+                states.append(state)
+                owners.append(index)
+                names.append(topic)
+        changed = [set() for _ in graphs]
+        if not states:
+            return changed
+
+        count = len(states)
+        mastery = np.fromiter((float(s.mastery) for s in states), dtype=np.float64, count=count)
+        rate = np.fromiter((float(s.decay_rate) for s in states), dtype=np.float64, count=count)
+        last_review = np.fromiter(
+            (_MISSING if s.last_review is None else s.last_review for s in states), dtype=np.int64, count=count
+        )
+        decayed_at = np.fromiter(
+            (_MISSING if s.decayed_at is None else s.decayed_at for s in states), dtype=np.int64, count=count
+        )
+        # A topic never decayed before starts from last_review; one never reviewed does not decay
+        since = np.where(last_review == _MISSING, _MISSING, np.maximum(last_review, decayed_at))
+
+        days = elapsed_days(since, now_us)
+        decayed = np.clip(mastery * np.power(1.0 - rate, days), 0.0, 100.0)
+        for i in np.flatnonzero(decayed != mastery):
+            state = states[i]
+            state.mastery = float(decayed[i])
+            state.decayed_at = int(since[i] + days[i] * DAY_US)
+            changed[owners[i]].add(names[i])
+        return changed
+
+    def apply(self, graph: CompactGraph, now: Optional[datetime] = None) -> Set[str]:
+        """Decay one graph in place; returns the topics whose mastery changed."""
+        return self.apply_many([graph], now)[0]
+
+
+def decay_store(store: GraphStore, engine: Optional[DecayEngine] = None, chunk_size: int = 500, now: Optional[datetime] = None) -> dict:
+    """Decay every student in store, chunk_size students per vectorized pass."""
+    engine = engine or DecayEngine()
+    if now is None:
+        now = datetime.utcnow()
+    student_ids = store.student_ids()
+    students = topics = 0
+    for start in range(0, len(student_ids), chunk_size):
+        chunk = student_ids[start:start + chunk_size]
+        with ExitStack() as stack:
+            # Lock the chunk (in sorted order) so concurrent writers are not overwritten
+            for sid in chunk:
+                stack.enter_context(store.lock(sid))
+            graphs = [store.load_compact(sid) or CompactGraph() for sid in chunk]
+            for sid, graph, changed in zip(chunk, graphs, engine.apply_many(graphs, now)):
+                if changed:
+                    store.save_topics(sid, {t: graph.topics[t].to_wire() for t in changed})
+                    students += 1
+                    topics += len(changed)
+    return {"students": len(student_ids), "students_decayed": students, "topics_decayed": topics}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", default=None, help="store kind (defaults to KNOWLEDGE_STORE)")
+    parser.add_argument("--path", default=None, help="store location (defaults to KNOWLEDGE_STORE_PATH)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="students decayed per vectorized pass")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    report = decay_store(make_store(args.store, args.path), chunk_size=args.chunk_size)
+    elapsed = time.perf_counter() - started
+    print(
+        f"Decayed {report['topics_decayed']} topic(s) across {report['students_decayed']}"
+        f"/{report['students']} student(s) in {elapsed:.1f}s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
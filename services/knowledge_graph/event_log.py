@@ -0,0 +1,301 @@
+import json
+import os
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from services.knowledge_graph import mastery
+from services.knowledge_graph.arrow_store import ArrowFileStore
+from services.knowledge_graph.compact import VERSION_KEY, CompactGraph, to_micros
+from services.knowledge_graph.storage import LOCK_FILE, CorruptGraphError, GraphStore
+
+_SEQ_WIDTH = 12
+
+
+class EventLogStore(GraphStore):
+    """Event-sourced store: mastery changes are appended to a per-student log.
+
+    Layout under <base_dir>/<student_id>/:
+        events.log            events since the latest snapshot (one JSON object per line)
+        snapshots/<seq>.json  full graph as of event <seq>
+        segments/<seq>.log    compacted events, up to and including <seq>
+
+    An update is a single append. Once snapshot_every events have accumulated,
+    the graph is snapshotted and the active log rotated into a segment, so a
+    load reads one snapshot plus a short tail. Segments are kept, so replay()
+    can rebuild the graph as of any earlier event. A graph left by the file
+    stores (knowledge.arrow or knowledge.json) is used as the initial state
+    when a student has no log yet.
+
+    A snapshot carries the timestamp of the event at its seq, so replay()
+    up to a time picks exactly the snapshots of the events before it.
+
+    A graph's version is the sequence number of its last event. Appends and
+    compaction hold the student's lock file, so several processes can share
+    one log directory.
+    """
+
+    appends_events = True
+
+    def __init__(self, base_dir: str = "students", snapshot_every: int = 200, fsync: bool = False):
+        self.base_dir = base_dir
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        # student_id -> (last seq, events in the active log, _log_stamp() when read)
+        self._heads = {}
+        # Reads knowledge.arrow, else knowledge.json
+        self._legacy = ArrowFileStore(base_dir)
+
+    # -------- paths -------- #
+
+    def _dir(self, student_id: str) -> str:
+        return os.path.join(self.base_dir, student_id)
+
+    def _log_path(self, student_id: str) -> str:
+        return os.path.join(self._dir(student_id), "events.log")
+
+    def _lock_path(self, student_id: str) -> str:
+        return os.path.join(self._dir(student_id), LOCK_FILE)
+
+    def _snapshot_dir(self, student_id: str) -> str:
+        return os.path.join(self._dir(student_id), "snapshots")
+
+    def _segment_dir(self, student_id: str) -> str:
+        return os.path.join(self._dir(student_id), "segments")
+
+    @staticmethod
+    def _seq_name(seq: int, ext: str) -> str:
+        return f"{seq:0{_SEQ_WIDTH}d}{ext}"
+
+    @staticmethod
+    def _listed_seqs(directory: str, ext: str) -> List[int]:
+        if not os.path.isdir(directory):
+            return []
+        return sorted(int(name[:-len(ext)]) for name in os.listdir(directory) if name.endswith(ext))
+
+    # -------- reading -------- #
+
+    def _snapshot_path(self, student_id: str, seq: int) -> str:
+        return os.path.join(self._snapshot_dir(student_id), self._seq_name(seq, ".json"))
+
+    def _read_snapshot(self, student_id: str, seq: int) -> dict:
+        with open(self._snapshot_path(student_id, seq), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _base(self, student_id: str, accept=None) -> Tuple[int, Optional[Dict[str, dict]]]:
+        """Latest snapshot (seq, graph) satisfying accept, falling back to the file store's graph at seq 0."""
+        for seq in reversed(self._listed_seqs(self._snapshot_dir(student_id), ".json")):
+            snapshot = self._read_snapshot(student_id, seq)
+            if accept is None or accept(seq, snapshot.get("ts")):
+                return seq, snapshot["graph"]
+        return 0, self._legacy.load(student_id)
+
+    @staticmethod
+    def _read_events(path: str) -> Iterator[dict]:
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-append; everything before it is intact
+                    return
+
+    def _events_after(self, student_id: str, seq: int) -> Iterator[dict]:
+        segments = self._listed_seqs(self._segment_dir(student_id), ".log")
+        for end in segments:
+            if end <= seq:
+                continue
+            path = os.path.join(self._segment_dir(student_id), self._seq_name(end, ".log"))
+            for event in self._read_events(path):
+                if event["seq"] > seq:
+                    yield event
+        for event in self._read_events(self._log_path(student_id)):
+            if event["seq"] > seq:
+                yield event
+
+    @staticmethod
+    def _apply(graph: CompactGraph, event: dict) -> None:
+        if event.get("op") == "update":
+            now_us = to_micros(datetime.fromisoformat(event["ts"]))
+            mastery.update_compact(graph, event["topic"], float(event["delta"]), now_us)
+
+    def load(self, student_id: str) -> Optional[Dict[str, dict]]:
+        with self.lock(student_id):
+            seq, base = self._base(student_id)
+            graph = CompactGraph.from_wire(base) if base is not None else None
+            last = seq
+            tail = 0
+            for event in self._events_after(student_id, seq):
+                if graph is None:
+                    graph = CompactGraph()
+                self._apply(graph, event)
+                last = event["seq"]
+                tail += 1
+            self._heads[student_id] = (last, tail, self._log_stamp(student_id))
+            if graph is None:
+                return None
+            graph.version = last
+            return graph.to_wire()
+
+    def replay(self, student_id: str, until_seq: Optional[int] = None, until: Optional[str] = None) -> Dict[str, dict]:
+        """Rebuild the graph as of event until_seq and/or ISO timestamp until (inclusive).
+
+        Raises CorruptGraphError if a whole-graph save on the way has lost its snapshot.
+        """
+        until_dt = datetime.fromisoformat(until) if until else None
+
+        def accept(seq, ts):
+            if until_seq is not None and seq > until_seq:
+                return False
+            if until_dt is not None and ts is not None and datetime.fromisoformat(ts) > until_dt:
+                return False
+            return True
+
+        with self.lock(student_id):
+            seq, base = self._base(student_id, accept)
+            graph = CompactGraph.from_wire(base)
+            for event in self._events_after(student_id, seq):
+                if not accept(event["seq"], event["ts"]):
+                    break
+                if event.get("op") == "save":
+                    # Only the save's snapshot holds the graph it wrote
+                    if not os.path.exists(self._snapshot_path(student_id, event["seq"])):
+                        raise CorruptGraphError(
+                            f"Cannot replay the graph of '{student_id}' past event {event['seq']}: its snapshot is missing"
+                        )
+                    graph = CompactGraph.from_wire(self._read_snapshot(student_id, event["seq"])["graph"])
+                    continue
+                self._apply(graph, event)
+            return graph.to_wire()
+
+    def history(self, student_id: str) -> Iterator[dict]:
+        """Every retained event for the student, oldest first."""
+        return self._events_after(student_id, 0)
+
+    # -------- writing -------- #
+
+    def _log_stamp(self, student_id: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self._log_path(student_id))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size
+
+    def _head(self, student_id: str) -> Tuple[int, int]:
+        """(last seq, events in the active log); re-read when another process has appended or rotated."""
+        head = self._heads.get(student_id)
+        if head is None or head[2] != self._log_stamp(student_id):
+            self.load(student_id)
+            head = self._heads[student_id]
+        return head[0], head[1]
+
+    def _append(self, student_id: str, records: List[dict]) -> None:
+        os.makedirs(self._dir(student_id), exist_ok=True)
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        with open(self._log_path(student_id), "a", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def append_events(self, student_id: str, events: Iterable[dict], now: datetime) -> int:
+        """Append (topic, delta) updates applied at now; returns the last sequence number."""
+        with self.lock(student_id):
+            last, tail = self._head(student_id)
+            ts = now.isoformat()
+            records = []
+            for event in events:
+                last += 1
+                records.append({
+                    "seq": last,
+                    "ts": ts,
+                    "op": "update",
+                    "topic": event.get("topic", ""),
+                    "delta": float(event.get("delta", 0)),
+                })
+            if not records:
+                return last
+            self._append(student_id, records)
+            tail += len(records)
+            self._heads[student_id] = (last, tail, self._log_stamp(student_id))
+            if tail >= self.snapshot_every:
+                self.compact(student_id)
+            return last
+
+    def _write_snapshot(self, student_id: str, seq: int, ts: Optional[str], graph: Dict[str, dict]) -> None:
+        """Write the graph as of event seq, stamped with that event's ts."""
+        os.makedirs(self._snapshot_dir(student_id), exist_ok=True)
+        path = self._snapshot_path(student_id, seq)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"seq": seq, "ts": ts, "graph": graph}, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _rotate(self, student_id: str, seq: int) -> None:
+        log = self._log_path(student_id)
+        if os.path.exists(log):
+            directory = self._segment_dir(student_id)
+            os.makedirs(directory, exist_ok=True)
+            os.replace(log, os.path.join(directory, self._seq_name(seq, ".log")))
+
+    def compact(self, student_id: str) -> int:
+        """Snapshot the current graph and rotate the active log into a segment."""
+        with self.lock(student_id):
+            graph = self.load(student_id) or {"topics": {}}
+            last = self._heads[student_id][0]
+            self._write_snapshot(student_id, last, self._event_ts(student_id, last), graph)
+            self._rotate(student_id, last)
+            self._heads[student_id] = (last, 0, None)
+            return last
+
+    def _event_ts(self, student_id: str, seq: int) -> Optional[str]:
+        """ts of event seq; None for seq 0, the graph left by the file stores."""
+        if seq <= 0:
+            return None
+        for event in self._events_after(student_id, seq - 1):
+            if event["seq"] == seq:
+                return event["ts"]
+        # Not in the log any more: compacted again without new events, so the snapshot has it
+        return self._read_snapshot(student_id, seq).get("ts")
+
+    def save(self, student_id: str, graph: Dict[str, dict]) -> None:
+        # A whole-graph write (e.g. decay) is not expressible as updates: log a marker and snapshot it
+        with self.lock(student_id):
+            last, _ = self._head(student_id)
+            last += 1
+            ts = datetime.utcnow().isoformat()
+            self._append(student_id, [{"seq": last, "ts": ts, "op": "save"}])
+            self._write_snapshot(student_id, last, ts, {**graph, VERSION_KEY: last})
+            self._rotate(student_id, last)
+            self._heads[student_id] = (last, 0, None)
+
+    def modified_at(self, student_id: str) -> Optional[float]:
+        # Appends touch events.log; compaction and save() add a file to snapshots/
+        times = []
+        for path in (self._log_path(student_id), self._snapshot_dir(student_id)):
+            try:
+                times.append(os.path.getmtime(path))
+            except OSError:
+                pass
+        legacy = self._legacy.modified_at(student_id)
+        if legacy is not None:
+            times.append(legacy)
+        return max(times) if times else None
+
+    def student_ids(self) -> List[str]:
+        if not os.path.isdir(self.base_dir):
+            return []
+        legacy = set(self._legacy.student_ids())
+        return sorted(
+            name for name in os.listdir(self.base_dir)
+            if os.path.isdir(self._dir(name))
+            and (os.path.exists(self._log_path(name))
+                 or os.path.isdir(self._snapshot_dir(name))
+                 or name in legacy)
+        )
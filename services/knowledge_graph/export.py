@@ -0,0 +1,229 @@
+"""Export every student's knowledge graph into a partitioned Parquet dataset.
+
+One row per (student, topic) with typed columns, written as hive-style
+partitions <out>/bucket=NNN/part-0.parquet; students are assigned to buckets
+by a stable hash of their id. Runs are incremental: a manifest records when
+each student was last exported, and only buckets holding students that were
+changed, added or removed since are rewritten, one bucket per worker process.
+
+Usage:
+    python -m services.knowledge_graph.export [--store KIND] [--path PATH] [--out exports/knowledge]
+        [--buckets 32] [--workers N] [--full]
+
+--out defaults to knowledge/ under EXPORTS_DIR (default: exports/).
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from services.knowledge_graph.arrow_store import graph_to_table
+from services.knowledge_graph.models import TopicState
+from services.knowledge_graph.storage import CorruptGraphError, GraphStore, make_store
+from utilities.paths import export_path
+
+MANIFEST = "_manifest.json"
+MANIFEST_VERSION = 1
+PART_FILE = "part-0.parquet"
+
+# TopicState's fields, with timestamps typed, plus what the wire format adds
+_TIME = pa.timestamp("us")
+_STATE_TYPES = {
+    "mastery": pa.float64(),
+    "last_review": _TIME,
+    "next_review": _TIME,
+    "attempts": pa.int64(),
+    "correct": pa.int64(),
+    "wrong": pa.int64(),
+    "decay_rate": pa.float64(),
+}
+SCHEMA = pa.schema(
+    [("student_id", pa.string()), ("topic", pa.string())]
+    + [(name, _STATE_TYPES[name]) for name in TopicState.model_fields]
+    + [("decayed_at", _TIME), ("graph_version", pa.int64())]
+)
+
+
+def bucket_of(student_id: str, buckets: int) -> int:
+    return zlib.crc32(student_id.encode("utf-8")) % buckets
+
+
+def _bucket_path(out: str, bucket: int) -> str:
+    return os.path.join(out, f"bucket={bucket:03d}", PART_FILE)
+
+
+def student_table(student_id: str, graph) -> pa.Table:
+    """The student's rows: the Arrow store's columns plus student_id and graph_version."""
+    table = graph_to_table(graph)
+    rows = table.num_rows
+    columns = {
+        "student_id": pa.array([student_id] * rows, type=pa.string()),
+        "graph_version": pa.array([graph.version] * rows, type=pa.int64()),
+    }
+    return pa.Table.from_arrays(
+        [columns[f.name] if f.name in columns else table.column(f.name) for f in SCHEMA],
+        schema=SCHEMA,
+    )
+
+
+def _write_atomic(table: pa.Table, path: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Dot-prefixed, so dataset readers skip a file that is still being written
+    tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)
+
+
+def export_bucket(
+    kind: Optional[str],
+    store_path: Optional[str],
+    out: str,
+    bucket: int,
+    changed: Sequence[str],
+    removed: Sequence[str],
+) -> dict:
+    """Rewrite one bucket file: keep the rows of untouched students, re-read the changed ones.
+
+    Runs in a worker process, so the store is opened from its kind and path.
+    """
+    store = make_store(kind, store_path)
+    tables, exported, skipped = [], {}, []
+    for student_id in changed:
+        try:
+            graph = store.load_compact(student_id)
+        except CorruptGraphError as e:
+            skipped.append((student_id, str(e)))
+            continue
+        exported[student_id] = graph.version if graph is not None else None
+        if graph is not None and graph.topics:
+            tables.append(student_table(student_id, graph))
+
+    path = _bucket_path(out, bucket)
+    replaced = [sid for sid in exported] + list(removed)
+    if os.path.exists(path):
+        old = pq.ParquetFile(path).read()
+        # Students that failed to load keep their previous rows
+        keep = pc.invert(pc.is_in(old.column("student_id"), value_set=pa.array(replaced, type=pa.string())))
+        tables.insert(0, old.filter(keep))
+    table = pa.concat_tables(tables) if tables else SCHEMA.empty_table()
+    if table.num_rows:
+        _write_atomic(table, path)
+    elif os.path.exists(path):
+        os.remove(path)
+    return {"bucket": bucket, "rows": table.num_rows, "exported": exported, "skipped": skipped}
+
+
+def _read_manifest(out: str) -> dict:
+    try:
+        with open(os.path.join(out, MANIFEST), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_manifest(out: str, manifest: dict) -> None:
+    path = os.path.join(out, MANIFEST)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def plan(store: GraphStore, manifest: dict, buckets: int) -> Tuple[Dict[int, Tuple[List[str], List[str]]], Dict[str, Optional[float]]]:
+    """Which students each bucket must re-export or drop, and the modification time seen for each student."""
+    known = manifest.get("students", {})
+    seen = {}
+    work = {}
+    for student_id in store.student_ids():
+        modified = store.modified_at(student_id)
+        seen[student_id] = modified
+        entry = known.get(student_id)
+        # A store that cannot report modification times is re-exported every run
+        if entry is None or modified is None or entry.get("modified_at") != modified:
+            work.setdefault(bucket_of(student_id, buckets), ([], []))[0].append(student_id)
+    for student_id in known:
+        if student_id not in seen:
+            work.setdefault(bucket_of(student_id, buckets), ([], []))[1].append(student_id)
+    return work, seen
+
+
+def export(
+    kind: Optional[str] = None,
+    store_path: Optional[str] = None,
+    out: str = export_path("knowledge"),
+    buckets: int = 32,
+    workers: Optional[int] = None,
+    full: bool = False,
+) -> dict:
+    """Bring the dataset at out up to date with the store; returns a summary of the run."""
+    store = make_store(kind, store_path)
+    manifest = _read_manifest(out)
+    if full or manifest.get("version") != MANIFEST_VERSION or manifest.get("buckets") != buckets:
+        # Bucket assignment changed (or a fresh start was asked for): rebuild everything
+        if os.path.isdir(out):
+            for name in os.listdir(out):
+                if name.startswith("bucket="):
+                    shutil.rmtree(os.path.join(out, name))
+        manifest = {}
+    os.makedirs(out, exist_ok=True)
+    work, seen = plan(store, manifest, buckets)
+
+    jobs = [(kind, store_path, out, bucket, changed, removed) for bucket, (changed, removed) in sorted(work.items())]
+    if workers == 1 or len(jobs) <= 1:
+        results = [export_bucket(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(export_bucket, *zip(*jobs)))
+
+    students = dict(manifest.get("students", {}))
+    for _, removed in work.values():
+        for student_id in removed:
+            students.pop(student_id, None)
+    skipped = []
+    for result in results:
+        skipped.extend(result["skipped"])
+        for student_id, version in result["exported"].items():
+            students[student_id] = {"modified_at": seen[student_id], "version": version}
+    _write_manifest(out, {"version": MANIFEST_VERSION, "buckets": buckets, "exported_at": time.time(), "students": students})
+    return {
+        "students": len(seen),
+        "exported": sum(len(r["exported"]) for r in results),
+        "removed": sum(len(removed) for _, removed in work.values()),
+        "buckets_written": len(results),
+        "skipped": skipped,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", default=None, help="store kind (defaults to KNOWLEDGE_STORE)")
+    parser.add_argument("--path", default=None, help="store location (defaults to KNOWLEDGE_STORE_PATH)")
+    parser.add_argument("--out", default=export_path("knowledge"), help="dataset directory")
+    parser.add_argument("--buckets", type=int, default=32, help="number of student partitions")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (defaults to the CPU count)")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and re-export every student")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    report = export(args.store, args.path, args.out, args.buckets, args.workers, args.full)
+    elapsed = time.perf_counter() - started
+    print(
+        f"Exported {report['exported']}/{report['students']} student(s), removed {report['removed']},"
+        f" rewrote {report['buckets_written']} bucket(s) in {elapsed:.1f}s"
+    )
+    for student_id, reason in report["skipped"]:
+        print(f"Skipped {student_id}: {reason}", file=sys.stderr)
+    return 1 if report["skipped"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
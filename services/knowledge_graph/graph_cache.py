@@ -0,0 +1,336 @@
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import ExitStack
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from services.knowledge_graph.compact import CompactGraph
+from services.knowledge_graph.locking import StudentLock, StudentLocks
+from services.knowledge_graph.storage import GraphStore
+
+# Rough in-memory footprint of one compact topic (slotted state, its key and dict slot)
+_TOPIC_BYTES = 320
+_GRAPH_BYTES = 256
+
+logger = logging.getLogger(__name__)
+
+
+def _estimate_bytes(graph: CompactGraph) -> int:
+    return _GRAPH_BYTES + _TOPIC_BYTES * len(graph.topics)
+
+
+class _Entry:
+    __slots__ = ("graph", "dirty_topics", "dirty_all", "size")
+
+    def __init__(self, graph: CompactGraph):
+        self.graph = graph
+        self.dirty_topics = set()
+        self.dirty_all = False
+        self.size = _estimate_bytes(graph)
+
+    @property
+    def dirty(self) -> bool:
+        return self.dirty_all or bool(self.dirty_topics)
+
+
+class GraphCache:
+    """Process-level write-behind cache of student graphs in front of a GraphStore.
+
+    Graphs are held as CompactGraph and converted to the JSON wire format
+    only at the edges. Reads are served from memory after the first load. Writes only mark the
+    entry dirty; dirty entries are written back every flush_interval seconds,
+    when they are evicted (LRU, bounded by student count and an estimated
+    memory budget) and at interpreter exit. The cache assumes it is the only
+    writer for the students it holds, i.e. a single server process.
+
+    Each student has a lock of their own, held while their graph is loaded,
+    changed or written back. The cache-wide lock only covers the LRU
+    bookkeeping and is never held across I/O or a caller's function, so
+    requests for different students run in parallel.
+    """
+
+    def __init__(
+        self,
+        store: GraphStore,
+        max_students: int = 2000,
+        max_bytes: int = 128 * 1024 * 1024,
+        flush_interval: float = 5.0,
+    ):
+        self.store = store
+        self.max_students = max_students
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        # Guards _entries, _bytes and _counters
+        self._lock = threading.RLock()
+        self._students = StudentLocks()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "flushes": 0, "write_back_errors": 0}
+        self._last_error = None
+        self._stop = threading.Event()
+        self._flusher = None
+        # Called with the student_id of every student dropped from the cache
+        self.evict_listeners: List[Callable[[str], None]] = []
+        atexit.register(self.close)
+
+    # -------- reads -------- #
+
+    def _entry(self, student_id: str) -> _Entry:
+        # Callers hold the student's lock, so a student is loaded by one thread at a time
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is not None:
+                self._entries.move_to_end(student_id)
+                self._counters["hits"] += 1
+                return entry
+            self._counters["misses"] += 1
+        entry = _Entry(self.store.load_compact(student_id) or CompactGraph())
+        with self._lock:
+            self._entries[student_id] = entry
+            self._bytes += entry.size
+            victims = self._evict(keep=student_id)
+        self._write_back_evicted(victims)
+        return entry
+
+    def get(self, student_id: str) -> Dict[str, dict]:
+        """Return the student's graph in wire format, loading it from the store on a miss."""
+        with self._students.hold(student_id):
+            return self._entry(student_id).graph.to_wire()
+
+    # -------- writes -------- #
+
+    def put(self, student_id: str, graph: Dict[str, dict]) -> None:
+        """Replace the student's graph; the whole graph is written on the next flush."""
+        with self._students.hold(student_id):
+            entry = self._entry(student_id)
+            compact = CompactGraph.from_wire(graph)
+            compact.version = entry.graph.version + 1
+            entry.graph = compact
+            entry.dirty_all = True
+            self._resize(student_id, entry)
+        self._ensure_flusher()
+
+    def compare_and_swap(
+        self,
+        student_id: str,
+        expected_version: int,
+        graph: CompactGraph,
+        on_swap: Optional[Callable[[CompactGraph], None]] = None,
+    ) -> bool:
+        """Replace the student's graph only if its version is still expected_version.
+
+        Args:
+            student_id: Student whose graph to replace.
+            expected_version: Version the caller's graph was derived from.
+            graph: The new graph; its version is set to expected_version + 1.
+            on_swap: Called with graph after a successful swap, still under the student's lock.
+
+        Returns:
+            False, leaving the cached graph alone, if another write got in first.
+        """
+        with self._students.hold(student_id):
+            entry = self._entry(student_id)
+            if entry.graph.version != expected_version:
+                return False
+            graph.version = expected_version + 1
+            entry.graph = graph
+            entry.dirty_all = True
+            if on_swap is not None:
+                on_swap(graph)
+            self._resize(student_id, entry)
+        self._ensure_flusher()
+        return True
+
+    def update(self, student_id: str, fn: Callable[[CompactGraph], object], topics: Optional[Iterable[str]] = None):
+        """Mutate the cached graph in place with fn and mark it dirty.
+
+        The graph's version goes up by one unless fn set it itself.
+
+        Args:
+            student_id: Student whose graph to change.
+            fn: Called with the live CompactGraph under the student's lock; its return value is returned.
+            topics: Topics fn touches; only these are written back. None marks the whole graph.
+        """
+        with self._students.hold(student_id):
+            entry = self._entry(student_id)
+            graph = entry.graph
+            version = graph.version
+            result = fn(graph)
+            if graph.version == version:
+                graph.version = version + 1
+            if topics is None:
+                entry.dirty_all = True
+            else:
+                entry.dirty_topics.update(topics)
+            self._resize(student_id, entry)
+        self._ensure_flusher()
+        return result
+
+    def update_many(self, student_ids: Sequence[str], fn: Callable[[List[CompactGraph]], List[Set[str]]]) -> List[Set[str]]:
+        """Mutate many graphs at once without pulling them all into the cache.
+
+        Cached students are changed in memory and written back later; the
+        others are loaded, changed and saved straight to the store. Every
+        student in the batch stays locked throughout, so no request can load
+        or change one of their graphs mid-batch.
+
+        Args:
+            student_ids: Students to change.
+            fn: Called with their graphs, in order; returns the topics it changed in each.
+        """
+        with ExitStack() as stack:
+            # A fixed order, so two batches over the same students cannot deadlock
+            for student_id in sorted(set(student_ids)):
+                stack.enter_context(self._students.hold(student_id))
+            with self._lock:
+                entries = [self._entries.get(sid) for sid in student_ids]
+            for sid, entry in sorted(zip(student_ids, entries), key=lambda item: item[0]):
+                if entry is None:
+                    stack.enter_context(self.store.lock(sid))
+            graphs = [
+                entry.graph if entry is not None else (self.store.load_compact(sid) or CompactGraph())
+                for sid, entry in zip(student_ids, entries)
+            ]
+            changed = fn(graphs)
+            for sid, entry, graph, topics in zip(student_ids, entries, graphs, changed):
+                if not topics:
+                    continue
+                graph.version += 1
+                if entry is not None:
+                    entry.dirty_topics.update(topics)
+                else:
+                    self.store.save_topics(
+                        sid, {t: graph.topics[t].to_wire() for t in topics if t in graph.topics}, version=graph.version,
+                    )
+        self._ensure_flusher()
+        return changed
+
+    # -------- write-back -------- #
+
+    def _write_back(self, student_id: str, entry: _Entry) -> None:
+        # Callers hold the student's lock
+        with self.store.lock(student_id):
+            if entry.dirty_all:
+                self.store.save_compact(student_id, entry.graph)
+            elif entry.dirty_topics:
+                topics = entry.graph.topics
+                self.store.save_topics(
+                    student_id, {t: topics[t].to_wire() for t in entry.dirty_topics if t in topics}, version=entry.graph.version,
+                )
+            else:
+                return
+        entry.dirty_all = False
+        entry.dirty_topics = set()
+        with self._lock:
+            self._counters["flushes"] += 1
+
+    def flush(self) -> int:
+        """Write every dirty graph back to the store; returns how many were written.
+
+        A student whose write fails is logged, counted in stats() and left
+        dirty for the next flush; the others are still written.
+        """
+        with self._lock:
+            dirty = [(sid, entry) for sid, entry in self._entries.items() if entry.dirty]
+        written = 0
+        for student_id, entry in dirty:
+            try:
+                with self._students.hold(student_id):
+                    # An eviction may have written it back in the meantime
+                    if entry.dirty:
+                        self._write_back(student_id, entry)
+                        written += 1
+            except Exception as e:
+                self._write_back_failed(student_id, e)
+        return written
+
+    def _resize(self, student_id: str, entry: _Entry) -> None:
+        size = _estimate_bytes(entry.graph)
+        with self._lock:
+            self._bytes += size - entry.size
+            entry.size = size
+            victims = self._evict(keep=student_id)
+        self._write_back_evicted(victims)
+
+    def _over_budget(self) -> bool:
+        return len(self._entries) > 1 and (len(self._entries) > self.max_students or self._bytes > self.max_bytes)
+
+    def _evict(self, keep: str) -> List[Tuple[str, _Entry, StudentLock]]:
+        """Drop least recently used entries until back within budget; call with self._lock held.
+
+        Students someone is working on are skipped. Each victim comes back
+        with its lock taken; _write_back_evicted saves it and releases the
+        lock, and until then anyone asking for that student waits for it.
+        """
+        victims = []
+        if not self._over_budget():
+            return victims
+        for student_id in list(self._entries):
+            if not self._over_budget():
+                break
+            if student_id == keep:
+                continue
+            lock = self._students.get(student_id)
+            if not lock.try_acquire():
+                continue
+            entry = self._entries.pop(student_id)
+            self._bytes -= entry.size
+            self._counters["evictions"] += 1
+            victims.append((student_id, entry, lock))
+        return victims
+
+    def _write_back_evicted(self, victims: List[Tuple[str, _Entry, StudentLock]]) -> None:
+        # Each victim on its own: one failed write must not leave the others locked
+        for student_id, entry, lock in victims:
+            try:
+                self._write_back(student_id, entry)
+            except Exception as e:
+                # Keep the unsaved changes in memory for the next flush; as most recently
+                # used, so clean entries are evicted before it is tried again
+                self._write_back_failed(student_id, e)
+                with self._lock:
+                    if student_id not in self._entries:
+                        self._entries[student_id] = entry
+                        self._bytes += entry.size
+            else:
+                for listener in self.evict_listeners:
+                    listener(student_id)
+            finally:
+                lock.release()
+
+    def _write_back_failed(self, student_id: str, error: Exception) -> None:
+        logger.error("Writing back the graph of %s failed: %s", student_id, error, exc_info=error)
+        with self._lock:
+            self._counters["write_back_errors"] += 1
+            self._last_error = f"{student_id}: {error}"
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None or self._stop.is_set():
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run_flusher, name="graph-cache-flush", daemon=True)
+                self._flusher.start()
+
+    def _run_flusher(self) -> None:
+        # Nothing may end this thread but close(): it is never started twice
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Graph cache flush failed")
+
+    def close(self) -> None:
+        """Stop the background flusher and write back everything still dirty."""
+        self._stop.set()
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._counters)
+            data["students"] = len(self._entries)
+            data["dirty"] = sum(1 for e in self._entries.values() if e.dirty)
+            data["estimated_bytes"] = self._bytes
+            data["last_error"] = self._last_error
+            return data
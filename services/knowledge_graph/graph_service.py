@@ -1,92 +1,235 @@
-import json
-import os
-from datetime import datetime, timedelta
-from typing import Dict, List
+import heapq
+import random
+import time
+from contextlib import ExitStack
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set
+
+from services.knowledge_graph import mastery
+from services.knowledge_graph.compact import VERSION_KEY, CompactGraph, to_micros
+from services.knowledge_graph.decay import DecayEngine
+from services.knowledge_graph.graph_cache import GraphCache
+from services.knowledge_graph.review_index import ReviewIndex
+from services.knowledge_graph.storage import GraphStore, VersionConflictError, graph_version, make_store
+
+
+def _checked_events(events: Iterable[dict]) -> List[dict]:
+    # All events are checked before any is applied: the cached graph is changed in place
+    checked = []
+    for i, event in enumerate(events):
+        if not isinstance(event, dict) or not isinstance(event.get("topic"), str):
+            raise ValueError(f"Event {i} needs a string 'topic'")
+        delta = event.get("delta", 0)
+        if isinstance(delta, bool) or not isinstance(delta, (int, float)) or delta != delta:
+            raise ValueError(f"Event {i} needs a numeric 'delta', got {delta!r}")
+        checked.append({"topic": event["topic"], "delta": float(delta)})
+    return checked
 
 
 class KnowledgeGraphService:
-    def _path(self, student_id: str) -> str:
-        base = os.path.join("students", student_id)
-        os.makedirs(base, exist_ok=True)
-        return os.path.join(base, "knowledge.json")
+    def __init__(self, store: Optional[GraphStore] = None, cache: Optional[GraphCache] = None):
+        self.store = store or (cache.store if cache is not None else make_store())
+        self.cache = cache
+        self.decay = DecayEngine()
+        # Sorted due/mastery index, updated on every write below. With the cache it holds the
+        # cached students and nothing of evicted ones; without it other processes may write,
+        # so entries are checked against the store
+        if cache is not None:
+            self.index = ReviewIndex(max_students=cache.max_students, summaries=False)
+            cache.evict_listeners.append(self.index.drop)
+        else:
+            self.index = ReviewIndex(stamp=self.store.modified_at)
 
     def load_graph(self, student_id: str) -> Dict[str, dict]:
-        path = self._path(student_id)
-        if not os.path.exists(path):
-            graph = {"topics": {}}
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(graph, f, ensure_ascii=False, indent=2)
-            return graph
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            if not isinstance(data, dict) or "topics" not in data:
-                return {"topics": {}}
-            return data
-        except Exception:
+        if self.cache is not None:
+            return self.cache.get(student_id)
+        graph = self.store.load(student_id)
+        if graph is None:
             return {"topics": {}}
+        return graph
 
     def save_graph(self, student_id: str, graph: Dict[str, dict]) -> None:
-        path = self._path(student_id)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(graph, f, ensure_ascii=False, indent=2)
+        """Replace the student's whole graph, whatever its version."""
+        if self.cache is not None:
+            self.cache.put(student_id, graph)
+        else:
+            with self.store.transaction(student_id) as current:
+                current.clear()
+                current.update(graph)
+        self.index.index_graph(student_id, CompactGraph.from_wire(graph))
+
+    def update_topics(self, student_id: str, events: Iterable[dict]) -> List[dict]:
+        events = _checked_events(events)
+        now = datetime.utcnow()
+        logged = self.store.appends_events
+        touched = {event.get("topic", "") for event in events}
+
+        def apply(graph):
+            results = self.apply_updates(graph, events, now=now)
+            if logged:
+                # Event-sourced stores persist the update as an O(1) append; the version is its sequence number
+                graph.version = self.store.append_events(student_id, events, now)
+            self.index.index_graph(student_id, graph, touched)
+            return results
+
+        # Both paths hold the student's lock, so updates to one student apply one at a time
+        if self.cache is not None:
+            return self.cache.update(student_id, apply, topics=() if logged else touched)
+        if logged:
+            with self.store.lock(student_id):
+                return apply(self.store.load_compact(student_id) or CompactGraph())
+        # One atomic load/mutate/save; backends with row storage write only the touched topics
+        with self.store.transaction(student_id) as wire:
+            graph = CompactGraph.from_wire(wire)
+            results = apply(graph)
+            wire.setdefault("topics", {}).update({t: graph.topics[t].to_wire() for t in touched})
+            return results
+
+    def compare_and_swap(self, student_id: str, expected_version: int, graph: Dict[str, dict]) -> bool:
+        """Replace the student's graph only if its version is still expected_version.
+
+        A student without a graph is at version 0. Returns False, writing
+        nothing, when another write got in first.
+        """
+        compact = CompactGraph.from_wire(graph)
+        if self.cache is not None:
+            if not self.cache.compare_and_swap(
+                student_id, expected_version, compact, on_swap=lambda g: self.index.index_graph(student_id, g),
+            ):
+                return False
+            graph[VERSION_KEY] = compact.version
+            return True
+        with self.store.lock(student_id):
+            if not self.store.compare_and_swap(student_id, expected_version, graph):
+                return False
+            compact.version = graph_version(graph)
+            self.index.index_graph(student_id, compact)
+            return True
+
+    def update_graph(self, student_id: str, fn: Callable[[Dict[str, dict]], object], retries: int = 8):
+        """Optimistic read-modify-write of a whole graph.
+
+        fn mutates a fresh copy of the graph in wire format. The result is
+        saved with compare_and_swap; when another writer got in first, fn is
+        run again on the newer graph, after a short randomised backoff.
+
+        Returns:
+            fn's return value from the attempt that was saved.
+
+        Raises:
+            VersionConflictError: Every one of retries + 1 attempts hit a conflict.
+        """
+        for attempt in range(retries + 1):
+            graph = self.load_graph(student_id)
+            expected = graph_version(graph)
+            result = fn(graph)
+            if self.compare_and_swap(student_id, expected, graph):
+                return result
+            time.sleep(random.uniform(0, 0.005 * 2 ** attempt))
+        raise VersionConflictError(f"Graph of student '{student_id}' kept changing; gave up after {retries + 1} attempts")
+
+    def replay(self, student_id: str, until_seq: Optional[int] = None, until: Optional[str] = None) -> Dict[str, dict]:
+        if not hasattr(self.store, "replay"):
+            raise ValueError("The configured knowledge store does not keep history")
+        self.flush()
+        return self.store.replay(student_id, until_seq=until_seq, until=until)
+
+    def flush(self) -> None:
+        if self.cache is not None:
+            self.cache.flush()
 
     def ensure_topic(self, graph: Dict[str, dict], topic: str) -> None:
-        topics = graph.setdefault("topics", {})
-        if topic not in topics:
-            topics[topic] = {
-                "mastery": 40,
-                "last_review": None,
-                "next_review": None,
-                "attempts": 0,
-                "correct": 0,
-                "wrong": 0,
-                "decay_rate": 0.05,
-            }
-
-    def update_mastery(self, graph: Dict[str, dict], topic: str, delta: float) -> None:
-        self.ensure_topic(graph, topic)
-        entry = graph["topics"][topic]
-        old = float(entry.get("mastery", 0))
-        new = max(0.0, min(100.0, old + float(delta)))
-        entry["mastery"] = new
-        entry["attempts"] = int(entry.get("attempts", 0)) + 1
-        if delta > 0:
-            entry["correct"] = int(entry.get("correct", 0)) + 1
-        elif delta < 0:
-            entry["wrong"] = int(entry.get("wrong", 0)) + 1
-        now = datetime.utcnow().isoformat()
-        entry["last_review"] = now
-        if delta > 0:
-            if new >= 70:
-                days = 3
-            elif new >= 40:
-                days = 2
-            else:
-                days = 1
-        else:
-            days = 1
-        entry["next_review"] = (datetime.utcnow() + timedelta(days=days)).isoformat()
-
-    def apply_forgetting_curve(self, graph: Dict[str, dict]) -> None:
-        topics = graph.get("topics", {})
-        for t, entry in topics.items():
-            lr = entry.get("last_review")
-            rate = float(entry.get("decay_rate", 0.05))
-            if not lr:
-                continue
-            try:
-                last = datetime.fromisoformat(lr)
-            except Exception:
-                continue
-            days = (datetime.utcnow() - last).days
-            if days <= 0:
-                continue
-            factor = (1.0 - rate) ** days
-            entry["mastery"] = max(0.0, min(100.0, float(entry.get("mastery", 0)) * factor))
+        mastery.ensure_topic(graph, topic)
+
+    def update_mastery(self, graph: Dict[str, dict], topic: str, delta: float, now: Optional[datetime] = None) -> None:
+        mastery.update_mastery(graph, topic, delta, now=now)
+
+    def apply_updates(self, graph: CompactGraph, events: Iterable[dict], now: Optional[datetime] = None) -> List[dict]:
+        """Apply (topic, delta) events in order, exactly as repeated update_mastery calls would.
+
+        All events share one timestamp. Returns {"topic", "mastery"} after each event.
+        """
+        now_us = to_micros(now or datetime.utcnow())
+        results = []
+        for event in events:
+            topic = event.get("topic", "")
+            state = mastery.update_compact(graph, topic, float(event.get("delta", 0)), now_us)
+            results.append({"topic": topic, "mastery": state.mastery})
+        return results
+
+    def apply_forgetting_curve(self, graph: Dict[str, dict], now: Optional[datetime] = None) -> Set[str]:
+        compact = CompactGraph.from_wire(graph)
+        changed = self.decay.apply(compact, now)
+        for topic in changed:
+            graph["topics"][topic].update(compact.topics[topic].to_wire())
+        return changed
+
+    def _update_many(self, student_ids: Sequence[str], fn: Callable[[List[CompactGraph]], List[Set[str]]]) -> List[Set[str]]:
+        def apply(graphs):
+            changed = fn(graphs)
+            for student_id, graph, topics in zip(student_ids, graphs, changed):
+                if topics:
+                    self.index.index_graph(student_id, graph, topics)
+            return changed
+
+        if self.cache is not None:
+            return self.cache.update_many(student_ids, apply)
+        with ExitStack() as stack:
+            # Other processes may write too: hold every student's store lock from load to save,
+            # taken in a fixed order so two batches cannot deadlock
+            for student_id in sorted(set(student_ids)):
+                stack.enter_context(self.store.lock(student_id))
+            graphs = [self.store.load_compact(sid) or CompactGraph() for sid in student_ids]
+            changed = apply(graphs)
+            for student_id, graph, topics in zip(student_ids, graphs, changed):
+                if topics:
+                    self.store.save_topics(student_id, {t: graph.topics[t].to_wire() for t in topics})
+            return changed
+
+    def decay_student(self, student_id: str, now: Optional[datetime] = None) -> int:
+        changed = self._update_many([student_id], lambda graphs: self.decay.apply_many(graphs, now))
+        return len(changed[0])
+
+    def decay_all(self, chunk_size: int = 500, now: Optional[datetime] = None) -> dict:
+        """Decay every stored student, chunk_size students per vectorized pass."""
+        if now is None:
+            now = datetime.utcnow()
+        # Students created since the last write-back exist only in the cache until flushed
+        self.flush()
+        student_ids = self.store.student_ids()
+        students = topics = 0
+        for start in range(0, len(student_ids), chunk_size):
+            chunk = student_ids[start:start + chunk_size]
+            for changed in self._update_many(chunk, lambda graphs: self.decay.apply_many(graphs, now)):
+                if changed:
+                    students += 1
+                    topics += len(changed)
+        return {"students": len(student_ids), "students_decayed": students, "topics_decayed": topics}
 
     def get_weak_topics(self, graph: Dict[str, dict], limit: int = 5) -> List[str]:
-        topics = graph.get("topics", {})
-        ordered = sorted(topics.items(), key=lambda kv: float(kv[1].get("mastery", 0)))
-        return [name for name, _ in ordered[:limit]]
+        # nsmallest is a stable top-k, equivalent to sorted(...)[:limit] without the full sort
+        weakest = heapq.nsmallest(limit, graph.get("topics", {}).items(), key=lambda kv: float(kv[1].get("mastery", 0)))
+        return [name for name, _ in weakest]
+
+    # -------- index-backed queries -------- #
+
+    def _load_for_index(self, student_id: str) -> CompactGraph:
+        # Straight from the store so indexing a cohort does not churn the graph cache
+        return self.store.load_compact(student_id) or CompactGraph()
+
+    def _load_compact(self, student_id: str) -> CompactGraph:
+        return CompactGraph.from_wire(self.load_graph(student_id))
+
+    def weak_topics(self, student_id: str, limit: int = 5) -> List[str]:
+        return self.index.weakest(student_id, self._load_compact, limit)
+
+    def due_topics(self, student_id: str, now: Optional[datetime] = None, limit: Optional[int] = None) -> List[str]:
+        return self.index.due(student_id, self._load_compact, to_micros(now or datetime.utcnow()), limit)
+
+    def overdue_students(self, more_than: int = 0, now: Optional[datetime] = None) -> List[dict]:
+        """Students with more than more_than topics past their next_review."""
+        self.flush()
+        return self.index.overdue_students(
+            self.store.student_ids(), self._load_for_index, to_micros(now or datetime.utcnow()), more_than,
+        )
 
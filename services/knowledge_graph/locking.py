@@ -0,0 +1,67 @@
+import os
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from filelock import FileLock
+
+# Seconds to wait for another process to release a student's lock file
+LOCK_TIMEOUT = 30.0
+
+
+class StudentLock:
+    """A student's re-entrant thread lock, plus its lock file when the store has one."""
+
+    __slots__ = ("thread_lock", "file_lock", "__weakref__")
+
+    def __init__(self, file_lock: Optional[FileLock] = None):
+        self.thread_lock = threading.RLock()
+        self.file_lock = file_lock
+
+    def try_acquire(self) -> bool:
+        """Take the thread lock if nobody holds it; the lock file is left alone."""
+        return self.thread_lock.acquire(blocking=False)
+
+    def release(self) -> None:
+        self.thread_lock.release()
+
+
+class StudentLocks:
+    """One lock per student, so work on different students never waits on each other.
+
+    With lock_path, holding a student also holds the file lock at
+    lock_path(student_id), which serialises that student across processes
+    (e.g. several uvicorn workers sharing one students/ directory). Locks are
+    created on first use and dropped once nobody references them.
+    """
+
+    def __init__(self, lock_path: Optional[Callable[[str], Optional[str]]] = None, timeout: float = LOCK_TIMEOUT):
+        self.lock_path = lock_path
+        self.timeout = timeout
+        self._mutex = threading.Lock()
+        self._locks = weakref.WeakValueDictionary()
+
+    def get(self, student_id: str) -> StudentLock:
+        """The student's lock; keep a reference for as long as it is held."""
+        with self._mutex:
+            lock = self._locks.get(student_id)
+            if lock is None:
+                path = self.lock_path(student_id) if self.lock_path is not None else None
+                lock = StudentLock(FileLock(path, timeout=self.timeout) if path else None)
+                self._locks[student_id] = lock
+            return lock
+
+    @contextmanager
+    def hold(self, student_id: str) -> Iterator[None]:
+        """Hold the student's lock (re-entrant within a thread) for the duration of the block."""
+        lock = self.get(student_id)
+        with lock.thread_lock:
+            if lock.file_lock is None:
+                yield
+                return
+            os.makedirs(os.path.dirname(lock.file_lock.lock_file) or ".", exist_ok=True)
+            # Only the thread holding thread_lock gets here, so the file lock's own
+            # re-entrancy count is never shared between threads
+            with lock.file_lock:
+                yield
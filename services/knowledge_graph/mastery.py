@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import Dict, Optional
+
+from services.knowledge_graph.compact import DAY_US, CompactGraph, CompactTopic, to_micros
+
+
+def new_topic_state() -> dict:
+    return CompactTopic().to_wire()
+
+
+def ensure_topic(graph: Dict[str, dict], topic: str) -> None:
+    topics = graph.setdefault("topics", {})
+    if topic not in topics:
+        topics[topic] = new_topic_state()
+
+
+def review_interval_days(delta: float, mastery: float) -> int:
+    if delta > 0:
+        if mastery >= 70:
+            return 3
+        if mastery >= 40:
+            return 2
+        return 1
+    return 1
+
+
+def apply_delta(state: CompactTopic, delta: float, now_us: int) -> None:
+    new = max(0.0, min(100.0, float(state.mastery) + float(delta)))
+    state.mastery = new
+    state.attempts = int(state.attempts) + 1
+    if delta > 0:
+        state.correct = int(state.correct) + 1
+    elif delta < 0:
+        state.wrong = int(state.wrong) + 1
+    state.last_review = now_us
+    state.next_review = now_us + review_interval_days(delta, new) * DAY_US
+
+
+def update_compact(graph: CompactGraph, topic: str, delta: float, now_us: int) -> CompactTopic:
+    state = graph.topic(topic)
+    apply_delta(state, delta, now_us)
+    return state
+
+
+def update_mastery(graph: Dict[str, dict], topic: str, delta: float, now: Optional[datetime] = None) -> None:
+    if now is None:
+        now = datetime.utcnow()
+    ensure_topic(graph, topic)
+    entry = graph["topics"][topic]
+    state = CompactTopic.from_wire(entry)
+    apply_delta(state, delta, to_micros(now))
+    entry.update(state.to_wire())
@@ -0,0 +1,43 @@
+"""Import per-student knowledge.json files into the SQLite knowledge store.
+
+Usage:
+    python -m services.knowledge_graph.migrate [--source students] [--target students/knowledge.sqlite3]
+"""
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+from services.knowledge_graph.storage import CorruptGraphError, JSONFileStore, SQLiteStore
+
+
+def migrate(source: JSONFileStore, target: SQLiteStore) -> dict:
+    migrated, skipped = 0, []
+    for student_id in source.student_ids():
+        try:
+            graph = source.load(student_id)
+        except CorruptGraphError as e:
+            skipped.append((student_id, str(e)))
+            continue
+        if graph is None:
+            continue
+        target.save(student_id, graph)
+        migrated += 1
+    return {"migrated": migrated, "skipped": skipped}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", default="students", help="directory holding <student_id>/knowledge.json")
+    parser.add_argument("--target", default=os.path.join("students", "knowledge.sqlite3"), help="SQLite database to write")
+    args = parser.parse_args(argv)
+
+    report = migrate(JSONFileStore(args.source), SQLiteStore(args.target))
+    print(f"Migrated {report['migrated']} student graph(s) into {args.target}")
+    for student_id, reason in report["skipped"]:
+        print(f"Skipped {student_id}: {reason}", file=sys.stderr)
+    return 1 if report["skipped"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional
+
+from services.knowledge_graph.compact import CompactGraph, CompactTopic
+
+# Never equal to a store's stamp, so the next read rebuilds
+_UNKNOWN = object()
+
+
+def _due_times(graph: CompactGraph) -> array:
+    return array("q", sorted(state.next_review for state in graph.topics.values() if state.next_review is not None))
+
+
+class StudentIndex:
+    """Topics of one student kept sorted by next_review and by mastery.
+
+    Each update is a binary search plus a list insert/remove, so reads never
+    sort. Topics without a next_review (never reviewed) are never due. Ties in
+    mastery keep the order in which topics were first added to the graph,
+    exactly like a stable sort of the graph would.
+    """
+
+    def __init__(self):
+        # (next_review micros, topic) and (mastery, first-seen order, topic), both sorted
+        self._due = []
+        self._mastery = []
+        self._keys = {}
+        self._next_order = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _discard(self, topic: str) -> Optional[int]:
+        keys = self._keys.pop(topic, None)
+        if keys is None:
+            return None
+        due, mastery_key = keys
+        if due is not None:
+            del self._due[bisect_left(self._due, (due, topic))]
+        del self._mastery[bisect_left(self._mastery, mastery_key)]
+        return mastery_key[1]
+
+    def update(self, topic: str, state: CompactTopic) -> None:
+        order = self._discard(topic)
+        if order is None:
+            order = self._next_order
+            self._next_order += 1
+        due = state.next_review
+        mastery_key = (float(state.mastery), order, topic)
+        if due is not None:
+            insort(self._due, (due, topic))
+        insort(self._mastery, mastery_key)
+        self._keys[topic] = (due, mastery_key)
+
+    def remove(self, topic: str) -> None:
+        self._discard(topic)
+
+    def due(self, now: int, limit: Optional[int] = None) -> List[str]:
+        """Topics whose next_review is at or before now, most overdue first."""
+        end = bisect_right(self._due, (now, "\U0010ffff"))
+        if limit is not None:
+            end = min(end, limit)
+        return [topic for _, topic in self._due[:end]]
+
+    def overdue_count(self, now: int) -> int:
+        return bisect_right(self._due, (now, "\U0010ffff"))
+
+    def weakest(self, limit: int) -> List[str]:
+        return [topic for _, _, topic in self._mastery[:limit]]
+
+    def due_times(self) -> array:
+        return array("q", (due for due, _ in self._due))
+
+
+class ReviewIndex:
+    """StudentIndex per student, kept current by KnowledgeGraphService on every write.
+
+    At most max_students indexes are kept, least recently used first out,
+    and the service drops a student's index when the graph cache evicts
+    them. With summaries, what remains of a dropped student is the sorted
+    list of their next_review times (8 bytes a topic), enough for
+    overdue_students() to answer cohort queries without loading every
+    graph again. Without them nothing remains, so the index never holds
+    more students than the graph cache it follows.
+
+    Writes from other processes never pass through index_graph(). When
+    stamp is given (the store's modified_at) an index or summary built
+    under another stamp is rebuilt on its next read; without it the index
+    assumes this process is the only writer, as the graph cache does.
+    """
+
+    def __init__(self, max_students: int = 2000, stamp: Optional[Callable[[str], object]] = None,
+                 summaries: bool = True):
+        self.max_students = max_students
+        self.stamp = stamp
+        self.summaries = summaries
+        self._lock = threading.RLock()
+        self._students = OrderedDict()
+        # student_id -> sorted array of next_review micros, for students without an index
+        self._due_times = {}
+        # student_id -> stamp the index or summary was built at; _UNKNOWN after our own writes
+        self._stamps = {}
+
+    def _current(self, student_id: str) -> bool:
+        return self.stamp is None or self._stamps.get(student_id, _UNKNOWN) == self.stamp(student_id)
+
+    def index_graph(self, student_id: str, graph: CompactGraph, topics: Optional[Iterable[str]] = None) -> None:
+        """Re-index the given topics of graph, or the whole graph when topics is None."""
+        entries = graph.topics
+        with self._lock:
+            index = self._students.get(student_id)
+            if index is None or topics is None:
+                index = StudentIndex()
+                self._students[student_id] = index
+                topics = entries.keys()
+            self._students.move_to_end(student_id)
+            self._due_times.pop(student_id, None)
+            # The write lands in the store after this; rebuild if anyone else wrote in between
+            self._stamps[student_id] = _UNKNOWN
+            for topic in topics:
+                entry = entries.get(topic)
+                if entry is None:
+                    index.remove(topic)
+                else:
+                    index.update(topic, entry)
+            self._trim()
+
+    def _trim(self) -> None:
+        while len(self._students) > self.max_students:
+            student_id, index = self._students.popitem(last=False)
+            self._summarise(student_id, index)
+
+    def _summarise(self, student_id: str, index: Optional[StudentIndex]) -> None:
+        # Call with self._lock held, once the student's index is gone
+        if self.summaries:
+            self._due_times[student_id] = index.due_times()
+        else:
+            self._due_times.pop(student_id, None)
+            self._stamps.pop(student_id, None)
+
+    def drop(self, student_id: str) -> None:
+        """Forget the student's index, keeping at most their due times; called when the graph cache evicts them."""
+        with self._lock:
+            index = self._students.pop(student_id, None)
+            if index is not None or not self.summaries:
+                self._summarise(student_id, index)
+
+    def student(self, student_id: str, load: Callable[[str], CompactGraph]) -> StudentIndex:
+        """The student's index, built from load(student_id) when missing or out of date."""
+        with self._lock:
+            index = self._students.get(student_id)
+            if index is not None and self._current(student_id):
+                self._students.move_to_end(student_id)
+                return index
+        # Stamp before loading, so a write racing the load leaves the index out of date
+        stamp = self.stamp(student_id) if self.stamp is not None else None
+        # Load outside our lock: writers index while holding the graph cache's lock
+        graph = load(student_id)
+        with self._lock:
+            index = self._students.get(student_id)
+            if index is None or not self._current(student_id):
+                self.index_graph(student_id, graph)
+                self._stamps[student_id] = stamp
+                index = self._students[student_id]
+            return index
+
+    def due(self, student_id: str, load: Callable[[str], CompactGraph], now: int, limit: Optional[int] = None) -> List[str]:
+        index = self.student(student_id, load)
+        with self._lock:
+            return index.due(now, limit)
+
+    def weakest(self, student_id: str, load: Callable[[str], CompactGraph], limit: int) -> List[str]:
+        index = self.student(student_id, load)
+        with self._lock:
+            return index.weakest(limit)
+
+    def _overdue_count(self, student_id: str, now: int) -> Optional[int]:
+        # Call with self._lock held; None when the student has to be loaded first
+        if not self._current(student_id):
+            return None
+        index = self._students.get(student_id)
+        if index is not None:
+            return index.overdue_count(now)
+        due_times = self._due_times.get(student_id)
+        return bisect_right(due_times, now) if due_times is not None else None
+
+    def overdue_students(
+        self, student_ids: Iterable[str], load: Callable[[str], CompactGraph], now: int, more_than: int = 0,
+    ) -> List[dict]:
+        """Students with more than more_than due topics, most overdue first.
+
+        Students with neither an index nor a summary are loaded once and
+        summarised; no full index is built for them.
+        """
+        found = []
+        for student_id in student_ids:
+            with self._lock:
+                count = self._overdue_count(student_id, now)
+            if count is None:
+                stamp = self.stamp(student_id) if self.stamp is not None else None
+                due_times = _due_times(load(student_id))
+                with self._lock:
+                    if self.summaries and student_id not in self._students:
+                        self._due_times[student_id] = due_times
+                        self._stamps[student_id] = stamp
+                count = bisect_right(due_times, now)
+            if count > more_than:
+                found.append((count, student_id))
+        found.sort(key=lambda item: (-item[0], item[1]))
+        return [{"student_id": sid, "overdue": count} for count, sid in found]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "students": len(self._students),
+                "topics": sum(len(index) for index in self._students.values()),
+                "summarised": len(self._due_times),
+                "max_students": self.max_students,
+            }
@@ -0,0 +1,414 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from typing import ContextManager, Dict, Iterable, Iterator, List, Optional
+
+from services.knowledge_graph import mastery
+from services.knowledge_graph.compact import VERSION_KEY, CompactGraph, to_micros
+from services.knowledge_graph.locking import StudentLocks
+
+
+class CorruptGraphError(ValueError):
+    pass
+
+
+class VersionConflictError(RuntimeError):
+    """A compare-and-swap update kept losing to concurrent writers."""
+
+
+# Per-student lock file of the file-based stores, next to the graph
+LOCK_FILE = "knowledge.lock"
+
+
+def graph_version(graph: Optional[Dict[str, object]]) -> int:
+    """Version of a wire graph; 0 when it has none or there is no graph."""
+    if not graph:
+        return 0
+    return int(graph.get(VERSION_KEY, 0))
+
+
+TOPIC_FIELDS = ("mastery", "last_review", "next_review", "attempts", "correct", "wrong", "decay_rate")
+
+
+class GraphStore(ABC):
+    """Persistence backend for per-student knowledge graphs ({"topics": {name: state}}).
+
+    Graphs carry a "version" that goes up with every write made through
+    save_topics(), transaction() or compare_and_swap(). Those hold the
+    student's lock, which file-based backends back with a lock file so that
+    writers in other processes are serialised as well.
+    """
+
+    # Event-sourced stores persist mastery updates themselves through append_events
+    appends_events = False
+
+    @property
+    def locks(self) -> StudentLocks:
+        # Created on first use so backends need not call a base __init__
+        locks = self.__dict__.get("_locks")
+        if locks is None:
+            locks = self.__dict__.setdefault("_locks", StudentLocks(self._lock_path))
+        return locks
+
+    def _lock_path(self, student_id: str) -> Optional[str]:
+        """Lock file shared with other processes; None when the backend locks by itself."""
+        return None
+
+    def lock(self, student_id: str) -> ContextManager[None]:
+        """Hold the student's lock; different students never block each other."""
+        return self.locks.hold(student_id)
+
+    @abstractmethod
+    def load(self, student_id: str) -> Optional[Dict[str, dict]]:
+        """Return the stored graph, or None if the student has none yet."""
+
+    @abstractmethod
+    def save(self, student_id: str, graph: Dict[str, dict]) -> None:
+        """Replace the student's whole graph."""
+
+    def load_compact(self, student_id: str) -> Optional[CompactGraph]:
+        """load() as a CompactGraph; binary stores build it without going through JSON types."""
+        graph = self.load(student_id)
+        return CompactGraph.from_wire(graph) if graph is not None else None
+
+    def save_compact(self, student_id: str, graph: CompactGraph) -> None:
+        self.save(student_id, graph.to_wire())
+
+    def save_topics(self, student_id: str, topics: Dict[str, dict], version: Optional[int] = None) -> None:
+        """Insert or replace only the given topics, leaving the rest untouched.
+
+        The graph's version becomes version, or goes up by one when it is None.
+        """
+        with self.lock(student_id):
+            graph = self.load(student_id) or {"topics": {}}
+            graph.setdefault("topics", {}).update(topics)
+            graph[VERSION_KEY] = graph_version(graph) + 1 if version is None else version
+            self.save(student_id, graph)
+
+    @contextmanager
+    def transaction(self, student_id: str) -> Iterator[Dict[str, dict]]:
+        """Yield the student's graph for mutation and persist it, one version up, when the block exits cleanly.
+
+        The student's lock is held throughout, so transactions on the same
+        student run one after another in any thread or process.
+        """
+        with self.lock(student_id):
+            graph = self.load(student_id) or {"topics": {}}
+            version = graph_version(graph)
+            yield graph
+            graph[VERSION_KEY] = version + 1
+            self.save(student_id, graph)
+
+    def compare_and_swap(self, student_id: str, expected_version: int, graph: Dict[str, dict]) -> bool:
+        """Replace the student's graph only if its stored version is still expected_version.
+
+        A student without a graph is at version 0. On success graph's version
+        is set to expected_version + 1; on a conflict nothing is written and
+        False is returned.
+        """
+        with self.lock(student_id):
+            if graph_version(self.load(student_id)) != expected_version:
+                return False
+            graph[VERSION_KEY] = expected_version + 1
+            self.save(student_id, graph)
+            return True
+
+    @abstractmethod
+    def append_events(self, student_id: str, events: Iterable[dict], now: datetime) -> int:
+        """Persist (topic, delta) updates applied at now; returns the graph's new version.
+
+        Stores with appends_events = False keep snapshots only; they
+        implement this with _save_events().
+        """
+
+    def _save_events(self, student_id: str, events: Iterable[dict], now: datetime) -> int:
+        # Snapshot stores: apply the updates and write back only the topics they touched
+        now_us = to_micros(now)
+        with self.lock(student_id):
+            graph = self.load_compact(student_id) or CompactGraph()
+            touched = set()
+            for event in events:
+                topic = event.get("topic", "")
+                mastery.update_compact(graph, topic, float(event.get("delta", 0)), now_us)
+                touched.add(topic)
+            if not touched:
+                return graph.version
+            self.save_topics(student_id, {t: graph.topics[t].to_wire() for t in touched}, version=graph.version + 1)
+            return graph.version + 1
+
+    def modified_at(self, student_id: str) -> Optional[float]:
+        """Time of the student's last write (epoch seconds), or None when the backend cannot tell cheaply."""
+        return None
+
+    @abstractmethod
+    def student_ids(self) -> List[str]:
+        """Every student with a stored graph."""
+
+
+class JSONFileStore(GraphStore):
+    """One pretty-printed students/<id>/knowledge.json per student, replaced atomically on save."""
+
+    def __init__(self, base_dir: str = "students"):
+        self.base_dir = base_dir
+
+    def _path(self, student_id: str) -> str:
+        return os.path.join(self.base_dir, student_id, "knowledge.json")
+
+    def _lock_path(self, student_id: str) -> str:
+        return os.path.join(self.base_dir, student_id, LOCK_FILE)
+
+    def load(self, student_id: str) -> Optional[Dict[str, dict]]:
+        path = self._path(student_id)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            raise CorruptGraphError(f"Unreadable knowledge graph at {path}: {e}") from e
+        if not isinstance(data, dict) or "topics" not in data:
+            raise CorruptGraphError(f"Knowledge graph at {path} has no 'topics'")
+        return data
+
+    def save(self, student_id: str, graph: Dict[str, dict]) -> None:
+        path = self._path(student_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename over the old one so a crash never leaves half a file
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(graph, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def modified_at(self, student_id: str) -> Optional[float]:
+        try:
+            return os.path.getmtime(self._path(student_id))
+        except OSError:
+            return None
+
+    def append_events(self, student_id: str, events: Iterable[dict], now: datetime) -> int:
+        return self._save_events(student_id, events, now)
+
+    def student_ids(self) -> List[str]:
+        if not os.path.isdir(self.base_dir):
+            return []
+        return sorted(
+            name for name in os.listdir(self.base_dir)
+            if os.path.isfile(self._path(name))
+        )
+
+
+class SQLiteStore(GraphStore):
+    """SQLite (WAL) backend storing one row per (student, topic).
+
+    Topic updates touch only the changed rows and multi-topic updates run in a
+    single transaction. mastery and next_review are indexed per student.
+    Single writes are serialised across processes by SQLite's own write
+    lock. A read-modify-write made of several statements (decay, event
+    appends, write-back of a cached graph) holds the student's lock, which
+    is backed by a lock file in <path>.locks/ so that it covers other
+    processes too, as the file stores' locks do.
+    """
+
+    def __init__(self, path: str = os.path.join("students", "knowledge.sqlite3")):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS students (
+                student_id TEXT PRIMARY KEY,
+                meta TEXT NOT NULL DEFAULT '{}',
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS topics (
+                student_id TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                mastery REAL NOT NULL,
+                last_review TEXT,
+                next_review TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                correct INTEGER NOT NULL DEFAULT 0,
+                wrong INTEGER NOT NULL DEFAULT 0,
+                decay_rate REAL NOT NULL DEFAULT 0.05,
+                extra TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (student_id, topic)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS topics_mastery ON topics(student_id, mastery);
+            CREATE INDEX IF NOT EXISTS topics_next_review ON topics(student_id, next_review);
+            """
+        )
+
+    def _lock_path(self, student_id: str) -> Optional[str]:
+        if self.path == ":memory:":
+            return None
+        return os.path.join(f"{self.path}.locks", f"{student_id}.lock")
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _read(self, conn: sqlite3.Connection, student_id: str) -> Optional[Dict[str, dict]]:
+        row = conn.execute("SELECT meta FROM students WHERE student_id = ?", (student_id,)).fetchone()
+        if row is None:
+            return None
+        graph = json.loads(row[0])
+        topics = {}
+        for (topic, mastery, last_review, next_review, attempts, correct, wrong, decay_rate, extra) in conn.execute(
+            "SELECT topic, mastery, last_review, next_review, attempts, correct, wrong, decay_rate, extra"
+            " FROM topics WHERE student_id = ?",
+            (student_id,),
+        ):
+            entry = json.loads(extra) if extra else {}
+            entry.update({
+                "mastery": mastery,
+                "last_review": last_review,
+                "next_review": next_review,
+                "attempts": attempts,
+                "correct": correct,
+                "wrong": wrong,
+                "decay_rate": decay_rate,
+            })
+            topics[topic] = entry
+        graph["topics"] = topics
+        return graph
+
+    def _write_meta(self, conn: sqlite3.Connection, student_id: str, graph: Dict[str, dict], now: float) -> None:
+        meta = {k: v for k, v in graph.items() if k != "topics"}
+        conn.execute(
+            "INSERT INTO students (student_id, meta, updated_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(student_id) DO UPDATE SET meta = excluded.meta, updated_at = excluded.updated_at",
+            (student_id, json.dumps(meta, ensure_ascii=False), now),
+        )
+
+    def _write_topics(self, conn: sqlite3.Connection, student_id: str, topics: Dict[str, dict], now: float) -> None:
+        rows = []
+        for topic, entry in topics.items():
+            extra = {k: v for k, v in entry.items() if k not in TOPIC_FIELDS}
+            rows.append((
+                student_id,
+                topic,
+                float(entry.get("mastery", 0)),
+                entry.get("last_review"),
+                entry.get("next_review"),
+                int(entry.get("attempts", 0)),
+                int(entry.get("correct", 0)),
+                int(entry.get("wrong", 0)),
+                float(entry.get("decay_rate", 0.05)),
+                json.dumps(extra, ensure_ascii=False) if extra else None,
+                now,
+            ))
+        conn.executemany(
+            "INSERT OR REPLACE INTO topics (student_id, topic, mastery, last_review, next_review,"
+            " attempts, correct, wrong, decay_rate, extra, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    @contextmanager
+    def _write_txn(self) -> Iterator[sqlite3.Connection]:
+        conn = self._conn()
+        # IMMEDIATE takes the write lock up front so read-modify-write cannot interleave
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def load(self, student_id: str) -> Optional[Dict[str, dict]]:
+        return self._read(self._conn(), student_id)
+
+    def save(self, student_id: str, graph: Dict[str, dict]) -> None:
+        now = time.time()
+        with self._write_txn() as conn:
+            self._write_meta(conn, student_id, graph, now)
+            conn.execute("DELETE FROM topics WHERE student_id = ?", (student_id,))
+            self._write_topics(conn, student_id, graph.get("topics", {}), now)
+
+    def _read_meta(self, conn: sqlite3.Connection, student_id: str) -> Optional[dict]:
+        row = conn.execute("SELECT meta FROM students WHERE student_id = ?", (student_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def save_topics(self, student_id: str, topics: Dict[str, dict], version: Optional[int] = None) -> None:
+        now = time.time()
+        with self.lock(student_id), self._write_txn() as conn:
+            meta = self._read_meta(conn, student_id) or {}
+            meta[VERSION_KEY] = graph_version(meta) + 1 if version is None else version
+            self._write_meta(conn, student_id, meta, now)
+            self._write_topics(conn, student_id, topics, now)
+
+    @contextmanager
+    def transaction(self, student_id: str) -> Iterator[Dict[str, dict]]:
+        now = time.time()
+        with self.lock(student_id), self._write_txn() as conn:
+            graph = self._read(conn, student_id) or {"topics": {}}
+            before = {t: dict(e) for t, e in graph["topics"].items()}
+            meta_before = {k: v for k, v in graph.items() if k != "topics"}
+            yield graph
+            topics = graph.get("topics", {})
+            changed = {t: e for t, e in topics.items() if before.get(t) != e}
+            removed = [t for t in before if t not in topics]
+            if changed or removed or meta_before != {k: v for k, v in graph.items() if k != "topics"}:
+                graph[VERSION_KEY] = graph_version(meta_before) + 1
+                self._write_meta(conn, student_id, graph, now)
+            if removed:
+                conn.executemany(
+                    "DELETE FROM topics WHERE student_id = ? AND topic = ?",
+                    [(student_id, t) for t in removed],
+                )
+            self._write_topics(conn, student_id, changed, now)
+
+    def compare_and_swap(self, student_id: str, expected_version: int, graph: Dict[str, dict]) -> bool:
+        now = time.time()
+        with self.lock(student_id), self._write_txn() as conn:
+            if graph_version(self._read_meta(conn, student_id)) != expected_version:
+                return False
+            graph[VERSION_KEY] = expected_version + 1
+            self._write_meta(conn, student_id, graph, now)
+            conn.execute("DELETE FROM topics WHERE student_id = ?", (student_id,))
+            self._write_topics(conn, student_id, graph.get("topics", {}), now)
+            return True
+
+    def modified_at(self, student_id: str) -> Optional[float]:
+        row = self._conn().execute("SELECT updated_at FROM students WHERE student_id = ?", (student_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def append_events(self, student_id: str, events: Iterable[dict], now: datetime) -> int:
+        return self._save_events(student_id, events, now)
+
+    def student_ids(self) -> List[str]:
+        return [row[0] for row in self._conn().execute("SELECT student_id FROM students ORDER BY student_id")]
+
+
+def make_store(kind: Optional[str] = None, path: Optional[str] = None) -> GraphStore:
+    """Build the configured store; defaults come from KNOWLEDGE_STORE / KNOWLEDGE_STORE_PATH."""
+    kind = (kind or os.environ.get("KNOWLEDGE_STORE", "arrow")).lower()
+    path = path or os.environ.get("KNOWLEDGE_STORE_PATH")
+    if kind == "arrow":
+        from services.knowledge_graph.arrow_store import ArrowFileStore
+        return ArrowFileStore(path or "students")
+    if kind == "json":
+        return JSONFileStore(path or "students")
+    if kind == "sqlite":
+        return SQLiteStore(path or os.path.join("students", "knowledge.sqlite3"))
+    if kind == "eventlog":
+        from services.knowledge_graph.event_log import EventLogStore
+        return EventLogStore(path or "students")
+    raise ValueError(f"Unknown knowledge store '{kind}'")
@@ -0,0 +1,196 @@
+import heapq
+import itertools
+import threading
+from collections import deque
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Dict, Iterable, List, Tuple
+
+from services.content_store import ContentStore
+
+
+class Pregenerator:
+    """
+    Generates study content for syllabus topics in the background, before anyone asks for it.
+
+    Topics arrive in batches, usually every topic of a parsed syllabus, and
+    each becomes one job per kind of content. Jobs run weakest topic first by
+    the cohort's mean mastery; topics nobody has studied yet count as 0 and
+    keep their syllabus order. Every generation holds a slot from `slot`,
+    which is how the jobs stay out of the way of students' own requests.
+    Results go to the content store, and content already there is never
+    generated again (a question bank counts as holding a topic until its
+    pool runs low). Queued jobs are not persisted: after a restart they are
+    queued again the next time the syllabus is parsed.
+    """
+    def __init__(
+        self,
+        generators: Dict[str, Callable[[str], Any]],
+        store: ContentStore,
+        weakness: Callable[[List[str]], Dict[str, float]] = None,
+        slot: Callable[[], ContextManager] = None,
+        workers: int = 2,
+        stores: Dict[str, Any] = None,
+        kinds: Iterable[str] = None,
+    ):
+        """
+        Initialize the pipeline; worker threads start with the first submission.
+
+        Args:
+            generators (dict): Kind -> function generating that content for a topic, or
+                returning None when the answer is unusable. For each topic the kinds run in this order.
+            store (ContentStore): Where generated content is kept.
+            weakness (callable, optional): Maps topics to the cohort's mean mastery of the
+                topics studied so far (default: every topic ranks the same).
+            slot (callable, optional): Returns the context manager held while generating (default: none).
+            workers (int): Jobs generated at once (default: 2).
+            stores (dict, optional): Kind -> store for kinds kept elsewhere, e.g. in the
+                question bank; it needs the same has() and put() as a ContentStore.
+            kinds (iterable, optional): Kinds generated for a submission that names none
+                (default: every kind in generators). Other kinds only run when submitted by name.
+        """
+        self.generators = generators
+        self.store = store
+        self.weakness = weakness
+        self.slot = slot or nullcontext
+        self.workers = workers
+        self.stores = stores or {}
+        self.kinds = tuple(kinds) if kinds is not None else tuple(generators)
+        self._cond = threading.Condition()
+        self._incoming = deque()
+        self._heap = []
+        self._queued = set()
+        self._order = itertools.count()
+        self._threads = []
+        self._running = 0
+        self._stopped = False
+        self._last_error = None
+        self._counters = {"submitted": 0, "generated": 0, "failed": 0, "already_stored": 0}
+
+    def submit(self, topics: Iterable[str], kinds: Iterable[str] = None) -> None:
+        """
+        Queue content for topics and return at once; ranking and generation happen on the workers.
+
+        Args:
+            topics (iterable): Topics to generate content for.
+            kinds (iterable, optional): Kinds to generate, in order (default: self.kinds).
+        """
+        batch = [topic.strip() for topic in topics if isinstance(topic, str) and topic.strip()]
+        kinds = self.kinds if kinds is None else tuple(kind for kind in kinds if kind in self.generators)
+        if not batch or not kinds:
+            return
+        with self._cond:
+            if self._stopped:
+                return
+            self._incoming.append((batch, kinds))
+            self._counters["submitted"] += len(batch)
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"pregenerate-{len(self._threads)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify()
+
+    def pending(self, kind: str, topic: str) -> bool:
+        """
+        Tell whether content of this kind for topic is already waiting or being generated.
+        """
+        topic = topic.strip()
+        with self._cond:
+            return (kind, topic) in self._queued or any(
+                kind in kinds and topic in batch for batch, kinds in self._incoming
+            )
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        Drop queued jobs and wait up to timeout seconds for the running ones.
+        """
+        with self._cond:
+            self._stopped = True
+            self._incoming.clear()
+            self._heap.clear()
+            self._cond.notify_all()
+            threads = list(self._threads)
+        for thread in threads:
+            thread.join(timeout)
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while not (self._stopped or self._incoming or self._heap):
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                if self._incoming:
+                    (batch, kinds), job = self._incoming.popleft(), None
+                else:
+                    batch, job = None, heapq.heappop(self._heap)
+                    self._running += 1
+            if batch is not None:
+                try:
+                    self._admit(batch, kinds)
+                except Exception as e:
+                    # A worker is never replaced, so nothing may end this loop
+                    self._last_error = f"admitting {len(batch)} topics: {e}"
+                continue
+            kind, topic = job[-2:]
+            try:
+                self._generate(kind, topic)
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._queued.discard((kind, topic))
+
+    def _admit(self, batch: List[str], kinds: Tuple[str, ...]) -> None:
+        # Off the request path: the cohort lookup reads the exported dataset
+        try:
+            mastery = self.weakness(batch) if self.weakness is not None else {}
+        except Exception as e:
+            self._last_error = f"weakness lookup: {e}"
+            mastery = {}
+        jobs, stored = [], 0
+        for topic in dict.fromkeys(batch):
+            order = next(self._order)
+            for rank, kind in enumerate(kinds):
+                try:
+                    if self._store(kind).has(kind, topic):
+                        stored += 1
+                        continue
+                except Exception as e:
+                    # The store is unusable for now; the topic is queued again with its next syllabus
+                    self._last_error = f"looking up {kind} for {topic!r}: {e}"
+                    continue
+                jobs.append((mastery.get(topic, 0.0), order, rank, kind, topic))
+        with self._cond:
+            self._counters["already_stored"] += stored
+            for job in jobs:
+                if job[-2:] not in self._queued:
+                    self._queued.add(job[-2:])
+                    heapq.heappush(self._heap, job)
+            self._cond.notify_all()
+
+    def _store(self, kind: str):
+        return self.stores.get(kind, self.store)
+
+    def _generate(self, kind: str, topic: str) -> None:
+        try:
+            with self.slot():
+                value = self.generators[kind](topic)
+            if value is not None:
+                self._store(kind).put(kind, topic, value)
+        except Exception as e:
+            value = None
+            self._last_error = f"{kind} for {topic!r}: {e}"
+        with self._cond:
+            self._counters["generated" if value is not None else "failed"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return job counters, queue depth and the last failure, if any.
+        """
+        with self._cond:
+            return {
+                **self._counters,
+                "queued": len(self._heap) + sum(len(batch) * len(kinds) for batch, kinds in self._incoming),
+                "running": self._running,
+                "workers": len(self._threads),
+                "last_error": self._last_error,
+            }
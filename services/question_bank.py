@@ -0,0 +1,255 @@
+import hashlib
+import heapq
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from utilities.paths import cache_path
+
+DIFFICULTIES = ("easy", "medium", "hard")
+# MCQs are banked per difficulty; flashcards have none
+DEFAULT_DIFFICULTY = {"mcqs": "medium", "flashcards": ""}
+# A topic's pool is running low below this many items, and gets refilled
+LOW_WATER = {"mcqs": 10, "flashcards": 16}
+# Separates kind and difficulty in a pool name, e.g. "mcqs:hard"
+_POOL_SEP = ":"
+
+_NOT_WORD = re.compile(r"[\W_]+")
+
+
+def _text(value) -> Optional[str]:
+    return value.strip() if isinstance(value, str) and value.strip() else None
+
+
+def _valid_mcq(item) -> Optional[Dict[str, Any]]:
+    if not isinstance(item, dict):
+        return None
+    question = _text(item.get("question"))
+    options = item.get("options")
+    index = item.get("answer_index")
+    if question is None or not isinstance(options, list) or len(options) != 4:
+        return None
+    options = [_text(option) for option in options]
+    if None in options or len({option.lower() for option in options}) != 4:
+        return None
+    if isinstance(index, bool) or not isinstance(index, int) or not 0 <= index < 4:
+        return None
+    return {"question": question, "options": options, "answer_index": index, "explanation": _text(item.get("explanation")) or ""}
+
+
+def _valid_flashcard(item) -> Optional[Dict[str, Any]]:
+    if not isinstance(item, dict):
+        return None
+    q, a = _text(item.get("q")), _text(item.get("a"))
+    if q is None or a is None:
+        return None
+    return {"q": q, "a": a}
+
+
+_VALIDATORS = {"mcqs": _valid_mcq, "flashcards": _valid_flashcard}
+
+
+def validate_item(kind: str, item) -> Optional[Dict[str, Any]]:
+    """
+    Return the item cleaned up (strings stripped, only known fields) if it is a usable
+    MCQ or flashcard, else None. An MCQ needs a question, 4 distinct options and an
+    answer_index in range; a flashcard needs 'q' and 'a'.
+    """
+    return _VALIDATORS[kind](item)
+
+
+def pool_name(kind: str, difficulty: str = None) -> str:
+    """
+    Name of the pool of a kind at difficulty, as has() and put() take it: the bare
+    kind at the kind's default difficulty (so "mcqs" is the medium pool), else
+    "kind:difficulty".
+    """
+    if difficulty is None or difficulty == DEFAULT_DIFFICULTY[kind]:
+        return kind
+    return f"{kind}{_POOL_SEP}{difficulty}"
+
+
+def _split_pool(pool: str):
+    kind, _, difficulty = pool.partition(_POOL_SEP)
+    return kind, difficulty or DEFAULT_DIFFICULTY[kind]
+
+
+def _fingerprint(kind: str, item: Dict[str, Any]) -> str:
+    # Same question up to case, spacing and punctuation counts as a duplicate
+    question = item["question"] if kind == "mcqs" else item["q"]
+    return hashlib.sha1(_NOT_WORD.sub(" ", question.lower()).strip().encode("utf-8")).hexdigest()
+
+
+def _quality(kind: str, item: Dict[str, Any]) -> float:
+    # Cheap signals of a well-formed question, in [0.5, 1]; better questions are sampled more often
+    score = 0.5
+    if kind == "mcqs":
+        lengths = [len(option) for option in item["options"]]
+        score += 0.2 if item["explanation"] else 0.0
+        score += 0.1 if item["question"].endswith("?") else 0.0
+        score += 0.1 if max(lengths) <= 3 * min(lengths) else 0.0
+        score += 0.1 if not any("of the above" in option.lower() for option in item["options"]) else 0.0
+    else:
+        score += 0.2 if item["q"].endswith("?") else 0.0
+        score += 0.2 if len(item["a"]) <= 200 else 0.0
+        score += 0.1 if item["a"].lower() not in item["q"].lower() else 0.0
+    return round(score, 3)
+
+
+class QuestionBank:
+    """
+    Persistent bank of validated MCQs and flashcards, indexed by topic, difficulty and quality.
+
+    Generated items are validated, scored and deduplicated per topic before
+    they are banked, and quizzes are sampled from the bank at random with
+    better scoring items more likely, so a topic's questions vary between
+    quizzes without asking the LLM again. has() and put() let the bank stand
+    in for a content store in the Pregenerator, with pool names (see
+    pool_name()) as kinds: a topic counts as stored at a difficulty until
+    that pool runs low.
+    """
+    def __init__(self, path: Optional[str] = cache_path("question_bank.sqlite3"), seed: int = None):
+        """
+        Initialize the bank.
+
+        Args:
+            path (str, optional): SQLite file; None keeps the bank in memory only.
+            seed (int, optional): Seed for sampling, for reproducible quizzes.
+        """
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._counters = {"added": 0, "duplicates": 0, "sampled": 0}
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False, isolation_level=None)
+        if path:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._create(self._db)
+
+    @staticmethod
+    def _create(db: sqlite3.Connection) -> None:
+        # The same question may be banked once per difficulty
+        schema = (
+            "CREATE TABLE {table} ("
+            " id INTEGER PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " topic TEXT NOT NULL,"
+            " difficulty TEXT NOT NULL,"
+            " fingerprint TEXT NOT NULL,"
+            " quality REAL NOT NULL,"
+            " body TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " UNIQUE (kind, topic, difficulty, fingerprint))"
+        )
+        row = db.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'questions'").fetchone()
+        if row is None:
+            db.execute(schema.format(table="questions"))
+        elif "difficulty, fingerprint" not in row[0]:
+            # Banks from before difficulty was part of the key: rebuild the table, keeping every row
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute(schema.format(table="questions_rebuilt"))
+                db.execute("INSERT INTO questions_rebuilt SELECT id, kind, topic, difficulty, fingerprint, quality, body, created FROM questions")
+                db.execute("DROP TABLE questions")
+                db.execute("ALTER TABLE questions_rebuilt RENAME TO questions")
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        db.execute("CREATE INDEX IF NOT EXISTS questions_pool ON questions(kind, topic, difficulty, quality)")
+
+    def add(self, kind: str, topic: str, items: Iterable, difficulty: str = None) -> List[Dict[str, Any]]:
+        """
+        Validate and bank generated items; returns the ones that were new.
+
+        Args:
+            kind (str): "mcqs" or "flashcards".
+            topic (str): Topic the items were generated for.
+            items (iterable): Items as the model produced them; invalid ones are dropped.
+            difficulty (str, optional): Difficulty they were generated at (default: the kind's default).
+        """
+        difficulty = DEFAULT_DIFFICULTY[kind] if difficulty is None else difficulty
+        rows, valid = {}, 0
+        for item in items:
+            item = validate_item(kind, item)
+            if item is not None:
+                valid += 1
+                rows.setdefault(_fingerprint(kind, item), item)
+        added = []
+        now = time.time()
+        with self._lock:
+            for fingerprint, item in rows.items():
+                cursor = self._db.execute(
+                    "INSERT OR IGNORE INTO questions (kind, topic, difficulty, fingerprint, quality, body, created)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (kind, topic, difficulty, fingerprint, _quality(kind, item), json.dumps(item, ensure_ascii=False), now),
+                )
+                if cursor.rowcount:
+                    added.append(item)
+            self._counters["added"] += len(added)
+            self._counters["duplicates"] += valid - len(added)
+        return added
+
+    def count(self, kind: str, topic: str, difficulty: str = None) -> int:
+        """
+        Number of banked items of a kind for topic at difficulty (default: the kind's default).
+        """
+        difficulty = DEFAULT_DIFFICULTY[kind] if difficulty is None else difficulty
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM questions WHERE kind = ? AND topic = ? AND difficulty = ?", (kind, topic, difficulty)
+            ).fetchone()[0]
+
+    def sample(self, kind: str, topic: str, count: int, difficulty: str = None) -> List[Dict[str, Any]]:
+        """
+        Draw up to count distinct items at random, each weighted by its quality score.
+        """
+        difficulty = DEFAULT_DIFFICULTY[kind] if difficulty is None else difficulty
+        with self._lock:
+            # Served from the index alone; only the chosen bodies are read
+            rows = self._db.execute(
+                "SELECT id, quality FROM questions WHERE kind = ? AND topic = ? AND difficulty = ?",
+                (kind, topic, difficulty),
+            ).fetchall()
+            # Weighted sampling without replacement: keep the count largest u ** (1 / weight)
+            chosen = heapq.nlargest(count, rows, key=lambda row: self._random.random() ** (1.0 / row[1]))
+            ids = [row[0] for row in chosen]
+            bodies = dict(self._db.execute(
+                f"SELECT id, body FROM questions WHERE id IN ({','.join('?' * len(ids))})", ids
+            ).fetchall())
+            self._counters["sampled"] += len(ids)
+        return [json.loads(bodies[i]) for i in ids]
+
+    def has(self, pool: str, topic: str) -> bool:
+        """
+        Tell whether topic's pool (e.g. "mcqs" or "mcqs:hard") is still above its kind's low-water mark.
+        """
+        kind, difficulty = _split_pool(pool)
+        return self.count(kind, topic, difficulty) >= LOW_WATER[kind]
+
+    def put(self, pool: str, topic: str, items: Iterable) -> None:
+        """
+        Bank items generated for topic's pool, at the pool's difficulty.
+        """
+        kind, difficulty = _split_pool(pool)
+        self.add(kind, topic, items, difficulty)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return counters, banked items per kind and the number of pools, at any difficulty, running low.
+        """
+        with self._lock:
+            data = dict(self._counters)
+            data["items"] = dict(self._db.execute("SELECT kind, COUNT(*) FROM questions GROUP BY kind").fetchall())
+            pools = self._db.execute(
+                "SELECT kind, difficulty, COUNT(*) FROM questions GROUP BY kind, topic, difficulty"
+            ).fetchall()
+        data["low_pools"] = sum(1 for kind, _, size in pools if size < LOW_WATER.get(kind, 0))
+        return data
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from utilities.paths import cache_path
+
+
+class SyllabusCache:
+    """
+    Cache of parsed syllabi keyed by the SHA-256 of the PDF bytes.
+
+    Each entry holds the extracted text, the cleaned text and the topics, so a
+    course PDF uploaded by many students is only parsed once. Entries never
+    expire (the key is the content) but are tied to the parser version that
+    produced them. A small in-memory LRU sits in front of an SQLite file; the
+    file evicts its least recently used entries once over max_disk_bytes.
+    """
+    def __init__(
+        self,
+        path: Optional[str] = cache_path("syllabi.sqlite3"),
+        parser_version: int = 1,
+        max_memory_entries: int = 32,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            path (str, optional): SQLite file for the disk tier; None keeps the cache in memory only.
+            parser_version (int): Version of the extraction rules; entries from other versions are misses.
+            max_memory_entries (int): Parsed syllabi kept in memory (default: 32).
+            max_disk_bytes (int): Total entry bytes kept on disk (default: 512 MiB).
+        """
+        self.parser_version = parser_version
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "disk_evictions": 0}
+        self._db = None
+        self._disk_entries = 0
+        self._disk_bytes = 0
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS syllabi ("
+                " key TEXT PRIMARY KEY,"
+                " version INTEGER NOT NULL,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS syllabi_accessed ON syllabi(accessed)")
+            # Parses from other parser versions will never be read again
+            self._db.execute("DELETE FROM syllabi WHERE version != ?", (parser_version,))
+            count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM syllabi").fetchone()
+            self._disk_entries = count
+            self._disk_bytes = total
+
+    @staticmethod
+    def make_key(pdf: bytes) -> str:
+        """
+        Hex SHA-256 of the PDF bytes, the key clients can look a syllabus up by.
+        """
+        return hashlib.sha256(pdf).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Return the cached parse ({"raw_text", "cleaned_text", "topics", ...}) for key, or None.
+        """
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return json.loads(value)
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value FROM syllabi WHERE key = ? AND version = ?", (key, self.parser_version)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE syllabi SET accessed = ? WHERE key = ?", (time.time(), key))
+                    self._remember(key, row[0])
+                    self._counters["disk_hits"] += 1
+                    return json.loads(row[0])
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key: str, entry: dict) -> None:
+        """
+        Store a parse in both tiers, evicting old entries if the disk tier is over its limit.
+        """
+        value = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, value)
+            self._counters["stores"] += 1
+            if self._db is None:
+                return
+            size = len(value.encode("utf-8"))
+            old = self._db.execute("SELECT size FROM syllabi WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO syllabi (key, version, value, size, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, self.parser_version, value, size, time.time()),
+            )
+            if old is None:
+                self._disk_entries += 1
+            else:
+                self._disk_bytes -= old[0]
+            self._disk_bytes += size
+            self._evict_disk(keep=key)
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counters and current tier sizes.
+        """
+        with self._lock:
+            data = dict(self._counters)
+            data["memory_entries"] = len(self._memory)
+            data["disk_entries"] = self._disk_entries
+            data["disk_bytes"] = self._disk_bytes
+        lookups = data["memory_hits"] + data["disk_hits"] + data["misses"]
+        data["hit_ratio"] = ((data["memory_hits"] + data["disk_hits"]) / lookups) if lookups else 0.0
+        return data
+
+    def _remember(self, key: str, value: str) -> None:
+        # Kept serialized so callers can never mutate a cached entry
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, keep: str) -> None:
+        while self._disk_bytes > self.max_disk_bytes:
+            row = self._db.execute(
+                "SELECT key, size FROM syllabi WHERE key != ? ORDER BY accessed LIMIT 1", (keep,)
+            ).fetchone()
+            if row is None:
+                return
+            self._db.execute("DELETE FROM syllabi WHERE key = ?", (row[0],))
+            self._disk_entries -= 1
+            self._disk_bytes -= row[1]
+            self._counters["disk_evictions"] += 1
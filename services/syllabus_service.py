@@ -1,78 +1,408 @@
+import bisect
+import multiprocessing
+import os
 import re
-from typing import List, Dict
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from io import StringIO
+from typing import List, Dict, Iterable, Iterator, Optional, Set, Tuple
 
-from pdfminer.high_level import extract_text as _extract_text
+from pdfminer.converter import TextConverter
+from pdfminer.layout import LAParams
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+
+
+# Bump whenever extraction, cleaning or topic rules change: cached parses are keyed to it
+PARSER_VERSION = 1
+
+
+def _page_count(file_path: str) -> int:
+    # Walks the page tree only; no page content is parsed
+    with open(file_path, "rb") as fp:
+        return sum(1 for _ in PDFPage.create_pages(PDFDocument(PDFParser(fp))))
+
+
+def _iter_page_range(file_path: str, start: int, stop: int) -> Iterator[str]:
+    """Text of pages [start, stop), one string per page, exactly as pdfminer's extract_text renders them."""
+    with open(file_path, "rb") as fp, StringIO() as output:
+        rsrcmgr = PDFResourceManager(caching=True)
+        device = TextConverter(rsrcmgr, output, laparams=LAParams())
+        interpreter = PDFPageInterpreter(rsrcmgr, device)
+        for done, page in enumerate(PDFPage.get_pages(fp, range(start, stop)), start + 1):
+            interpreter.process_page(page)
+            text = output.getvalue()
+            output.seek(0)
+            output.truncate()
+            yield text
+            if done == stop:
+                break
+
+
+def _extract_chunk(chunk: Tuple[str, int, int]) -> List[str]:
+    return list(_iter_page_range(*chunk))
+
+
+# clean_text rules. Lines end at the characters str.splitlines breaks on
+_LINE_BREAKS = frozenset("\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029")
+_PAGE_NUMBER = re.compile(r"^\s*Page\s+\d+\s*$", re.IGNORECASE)
+_RULE_LINE = re.compile(r"^[\-_=]{3,}$")
+_SPACE_RUN = re.compile(r"\s+")
+# A line of at most REPEATED_MAX_LEN characters seen REPEATED_MIN times is a header or footer
+REPEATED_MIN = 3
+REPEATED_MAX_LEN = 60
+
+
+def _iter_lines(pages: Iterable[str]) -> Iterator[str]:
+    """Stripped, non-empty lines of the concatenated pages, holding one page's lines at a time."""
+    carry = ""
+    for page in pages:
+        if not page:
+            continue
+        lines = page.splitlines()
+        # A line broken across pages; lines[0] is "" when the page starts with a break
+        lines[0] = carry + lines[0]
+        carry = "" if page[-1] in _LINE_BREAKS else lines.pop()
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield line
+    carry = carry.strip()
+    if carry:
+        yield carry
+
+
+class _Slices:
+    """A string as re-iterable fixed-size pieces, so a whole document is never split into lines at once."""
+
+    def __init__(self, text: str, size: int = 1 << 16):
+        self.text = text
+        self.size = size
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.text[i:i + self.size] for i in range(0, len(self.text), self.size))
+
+
+class _LineSketch:
+    """Count-min sketch of lines: 4 rows of 2**16 one-byte counters saturating at REPEATED_MIN."""
+
+    def __init__(self):
+        self.rows = [bytearray(1 << 16) for _ in range(4)]
+
+    @staticmethod
+    def _slots(line: str) -> Iterator[int]:
+        # The 64-bit string hash split into one 16-bit index per row
+        h = hash(line)
+        return ((h >> shift) & 0xFFFF for shift in (0, 16, 32, 48))
+
+    def add(self, line: str) -> None:
+        for row, j in zip(self.rows, self._slots(line)):
+            if row[j] < REPEATED_MIN:
+                row[j] += 1
+
+    def estimate(self, line: str) -> int:
+        # Never below the true count (up to REPEATED_MIN); above it only on collisions in every row
+        return min(row[j] for row, j in zip(self.rows, self._slots(line)))
+
+
+def _repeated_lines(pages: Iterable[str]) -> Set[str]:
+    """Short lines occurring at least REPEATED_MIN times, found in two passes over the pages."""
+    sketch = _LineSketch()
+    for line in _iter_lines(pages):
+        if len(line) <= REPEATED_MAX_LEN:
+            sketch.add(line)
+    # Exact counts, kept only for the few lines the sketch flags
+    counts: Dict[str, int] = {}
+    for line in _iter_lines(pages):
+        if len(line) <= REPEATED_MAX_LEN and sketch.estimate(line) >= REPEATED_MIN:
+            counts[line] = counts.get(line, 0) + 1
+    return {line for line, count in counts.items() if count >= REPEATED_MIN}
+
+
+# Topic rules, applied by a single scan of the text:
+#   1. "Unit 3: Title" / "Module: Title" / "Chapter 2 - Title", the title running up to the next
+#      heading keyword, section number, "." or ";" (or the end of the line at the end of the text)
+#   2. "Unit 3", every heading keyword followed by a number
+#   3. "2.1 Title", a section number of one or two digits followed by a capitalised title
+# One pass of _TOKENS finds everything the rules key on; the small anchored patterns below only
+# ever run forward from a token, so the whole extraction is linear in the length of the text.
+_TOKENS = re.compile(r"\b(?:(unit|module|chapter)|(\d+))|[.;]|\n", re.IGNORECASE)
+_SPACES = re.compile(r"\s*")
+# Whatever follows a heading keyword: its number, if any, and the ":" or "-" of rule 1
+_HEADING_TAIL = re.compile(r"\s*(\d*)\s*([:\-]?)")
+_DOTTED = re.compile(r"(?:\.\d+)*")
+_SECTION_TITLE = re.compile(r"[A-Z][^\d:;\-]{0,100}")
+
+
+def _is_word(ch: str) -> bool:
+    # What \b treats as a word character
+    return ch.isalnum() or ch == "_"
+
+
+def _heading_title(text: str, start: int, stops: List[int], newlines: List[int]) -> Optional[Tuple[int, int]]:
+    """Span of a rule 1 title whose separator ends at start, or None if the heading has no title."""
+    first = _SPACES.match(text, start).end()
+    # The title is the shortest run of at least one character, not crossing a newline, that ends
+    # at a stop; leading whitespace is only given back to it when nothing can follow it
+    for begin in range(first, start - 1, -1):
+        end = stops[bisect.bisect_right(stops, begin)] if begin < len(text) else None
+        if end is not None and newlines[bisect.bisect_left(newlines, begin)] >= end:
+            return begin, end
+    return None
+
+
+def _scan_topics(text: str) -> Tuple[List[str], List[str], List[str]]:
+    """Topics found by rules 1, 2 and 3, each in order of appearance."""
+    n = len(text)
+    headings, numbers = [], []
+    # Positions a rule 1 title can end at: heading keywords and short section numbers standing
+    # as whole words, "." and ";", the end of the text and a newline ending it
+    stops, newlines = [], []
+    for m in _TOKENS.finditer(text):
+        start, end = m.span()
+        after_word = end < n and _is_word(text[end])
+        if m.group(1):
+            headings.append((start, end, m.group(1).title()))
+            if not after_word:
+                stops.append(start)
+        elif m.group(2):
+            numbers.append((start, end))
+            if end - start <= 2 and not after_word:
+                stops.append(start)
+        elif text[start] == "\n":
+            newlines.append(start)
+        else:
+            stops.append(start)
+    if newlines and newlines[-1] == n - 1:
+        stops.append(n - 1)
+    stops.append(n)
+    newlines.append(n)
+
+    titled, numbered, sections = [], [], []
+    titled_end = numbered_end = 0
+    for start, end, label in headings:
+        tail = _HEADING_TAIL.match(text, end)
+        num = tail.group(1)
+        digits_end = tail.end(1)
+        if start >= numbered_end and num and (digits_end == n or not _is_word(text[digits_end])):
+            numbered.append(f"{label} {num}")
+            numbered_end = digits_end
+        if start < titled_end or not tail.group(2):
+            continue
+        span = _heading_title(text, tail.end(), stops, newlines)
+        if span is None:
+            continue
+        title = text[span[0]:span[1]].strip()
+        titled.append(f"{label} {num}: {title}" if num else f"{label}: {title}")
+        titled_end = span[1]
+
+    sections_end = dotted_end = 0
+    for start, end in numbers:
+        if start < sections_end or end - start > 2:
+            continue
+        # Every part of a long dotted number is a token; measure the number once
+        if start >= dotted_end:
+            dotted_end = _DOTTED.match(text, end).end()
+        if dotted_end == n or not text[dotted_end].isspace():
+            continue
+        m = _SECTION_TITLE.match(text, _SPACES.match(text, dotted_end).end())
+        if m is None:
+            continue
+        sections.append(f"{text[start:dotted_end]} {m.group().strip()}")
+        sections_end = m.end()
+    return titled, numbered, sections
 
 
 class SyllabusService:
+    def __init__(
+        self,
+        max_pages: int = 300,
+        timeout: float = 120.0,
+        workers: Optional[int] = None,
+        chunk_pages: int = 8,
+        parallel_pages: int = 64,
+    ):
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.workers = workers
+        self.chunk_pages = chunk_pages
+        # Shorter documents are read in this process: starting work on the pool costs more than it saves
+        self.parallel_pages = parallel_pages
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        # One pool for the service's lifetime. Spawned, not forked: the server runs threads
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers or os.cpu_count() or 1,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def _discard_executor(self, pool: ProcessPoolExecutor) -> None:
+        # Workers stuck on a slow page must not hold up later documents; they exit once done
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def close(self) -> None:
+        """Shut the extraction pool down; a later parse starts a new one."""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def page_count(self, file_path: str, max_pages: Optional[int] = None) -> int:
+        """Pages that will be extracted: the document's page count, capped at max_pages."""
+        limit = self.max_pages if max_pages is None else max_pages
+        return min(_page_count(file_path), limit)
+
+    def iter_pdf_pages(self, file_path: str, max_pages: Optional[int] = None, timeout: Optional[float] = None) -> Iterator[str]:
+        """
+        Yield the text of each page, in order, as soon as it is extracted.
+
+        Ranges of chunk_pages pages are extracted in parallel on the
+        service's process pool; documents under parallel_pages pages, or a
+        single worker, are read in this process. Raises TimeoutError once
+        timeout seconds have passed; every page yielded before that is
+        complete. Stopping the iteration early cancels the ranges not yet
+        started.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        count = self.page_count(file_path, max_pages)
+        chunks = [(file_path, start, min(start + self.chunk_pages, count)) for start in range(0, count, self.chunk_pages)]
+        workers = min(self.workers or os.cpu_count() or 1, len(chunks))
+        if workers <= 1 or count < self.parallel_pages:
+            for done, text in enumerate(_iter_page_range(file_path, 0, count), 1):
+                yield text
+                # In-process extraction can only give up between pages
+                if done < count and time.monotonic() > deadline:
+                    raise TimeoutError(f"PDF extraction stopped after {done} of {count} pages ({timeout:g}s limit)")
+            return
+        pool = self._executor()
+        futures = []
+        try:
+            futures = [pool.submit(_extract_chunk, chunk) for chunk in chunks]
+            # Results are taken in page order while later ranges are still being extracted
+            for (_, start, _), future in zip(chunks, futures):
+                try:
+                    pages = future.result(timeout=max(deadline - time.monotonic(), 0))
+                except FutureTimeout:
+                    self._discard_executor(pool)
+                    raise TimeoutError(f"PDF extraction stopped after {start} of {count} pages ({timeout:g}s limit)") from None
+                yield from pages
+        except BrokenProcessPool:
+            # A worker died; the next document gets a new pool
+            self._discard_executor(pool)
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+
     def extract_text_from_pdf(self, file_path: str) -> str:
+        pages = []
         try:
-            text = _extract_text(file_path) or ""
-            return text
+            for text in self.iter_pdf_pages(file_path):
+                pages.append(text)
         except Exception:
-            return ""
+            # Keep what was read before a timeout or a page pdfminer cannot handle
+            pass
+        return "".join(pages)
 
     def clean_text(self, text: str) -> str:
         if not text or not text.strip():
             return ""
-        lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-        freq = {}
-        for ln in lines:
-            freq[ln] = freq.get(ln, 0) + 1
-        filtered = []
-        for ln in lines:
-            if re.match(r"^\s*Page\s+\d+\s*$", ln, flags=re.IGNORECASE):
-                continue
-            if freq.get(ln, 0) >= 3 and len(ln) <= 60:
-                continue
-            if re.match(r"^[\-_=]{3,}$", ln):
+        return self.clean_pages(_Slices(text))
+
+    def clean_pages(self, pages: Iterable[str]) -> str:
+        """
+        Clean a document given as page texts; the same result as clean_text on their concatenation.
+
+        Drops blank lines, "Page N" lines, rules made of -, _ or =, and short
+        lines repeated REPEATED_MIN times or more (running headers and footers),
+        then joins what is left with single spaces. Lines are streamed: pages
+        is read three times (it must be a list or another re-iterable, not an
+        iterator) and only one page plus the output is held at a time, besides
+        a fixed-size sketch and the lines that really repeat.
+        """
+        if iter(pages) is pages:
+            raise TypeError("clean_pages reads the pages more than once; pass a list, not an iterator")
+        repeated = _repeated_lines(pages)
+        out = StringIO()
+        for line in _iter_lines(pages):
+            if line in repeated or _PAGE_NUMBER.match(line) or _RULE_LINE.match(line):
                 continue
-            filtered.append(ln)
-        s = " ".join(filtered)
-        s = re.sub(r"\s+", " ", s)
-        return s.strip()
+            if out.tell():
+                out.write(" ")
+            out.write(_SPACE_RUN.sub(" ", line))
+        return out.getvalue()
 
     def extract_topics(self, text: str) -> List[str]:
         if not text or not text.strip():
             return []
-        topics: List[str] = []
-        for m in re.finditer(
-            r"\b(Unit|Module|Chapter)\s*(\d+)?\s*[:\-]\s*(.+?)(?=\b(?:Unit|Module|Chapter)\b|\b\d{1,2}(?:\.\d+)*\b|[.;]|$)",
-            text,
-            flags=re.IGNORECASE,
-        ):
-            label = m.group(1).title()
-            num = m.group(2) or ""
-            title = m.group(3).strip()
-            if num:
-                topics.append(f"{label} {num}: {title}")
-            else:
-                topics.append(f"{label}: {title}")
-        for m in re.finditer(
-            r"\b(Unit|Module|Chapter)\s*(\d+)\b",
-            text,
-            flags=re.IGNORECASE,
-        ):
-            label = m.group(1).title()
-            num = m.group(2)
-            topics.append(f"{label} {num}")
-        for m in re.finditer(
-            r"\b(\d{1,2}(?:\.\d+)*)\s+([A-Z][^\d:;\-]{0,100})",
-            text,
-            flags=0,
-        ):
-            num = m.group(1)
-            title = m.group(2).strip()
-            topics.append(f"{num} {title}")
+        titled, numbered, sections = _scan_topics(text)
         dedup: List[str] = []
         seen = set()
-        for t in topics:
+        for t in titled + numbered + sections:
             k = t.lower().strip()
             if k not in seen:
                 seen.add(k)
                 dedup.append(t.strip())
         return dedup
 
+    def iter_parse_pdf(self, file_path: str, every: Optional[int] = None) -> Iterator[Dict[str, object]]:
+        """
+        Parse a PDF progressively, yielding the topics found so far every `every` pages.
+
+        Each update has pages, page_count, topics and done; the final one
+        (done=True) also has raw_text, cleaned_text and timed_out. Updates
+        only look at the pages new since the previous one, so the whole
+        parse stays linear; they are a preview, cleaned a batch of pages at
+        a time, and the final update's topics, from the whole document, are
+        the result.
+        """
+        every = every or self.chunk_pages
+        total = 0
+        pages: List[str] = []
+        found: List[str] = []
+        seen: Set[str] = set()
+        timed_out = False
+        try:
+            total = self.page_count(file_path)
+            for text in self.iter_pdf_pages(file_path):
+                pages.append(text)
+                if len(pages) % every == 0 and len(pages) < total:
+                    for topic in self.extract_topics(self.clean_pages(pages[-every:])):
+                        if topic.lower() not in seen:
+                            seen.add(topic.lower())
+                            found.append(topic)
+                    yield {"pages": len(pages), "page_count": total, "topics": list(found), "done": False}
+        except TimeoutError:
+            timed_out = True
+        except Exception:
+            pass
+        raw = "".join(pages)
+        cleaned = self.clean_pages(pages)
+        topics = self.extract_topics(cleaned) if cleaned else []
+        yield {
+            "pages": len(pages),
+            "page_count": total,
+            "topics": topics,
+            "done": True,
+            "raw_text": raw,
+            "cleaned_text": cleaned,
+            "timed_out": timed_out,
+        }
+
     def parse_pdf(self, file_path: str) -> Dict[str, object]:
         raw = self.extract_text_from_pdf(file_path)
         if not raw or not raw.strip():
@@ -1,3 +1,5 @@
+import base64
+import hashlib
 import os
 import sys
 import pathlib
@@ -12,12 +14,20 @@ if str(_PROJECT_ROOT) not in sys.path:
 
 # Now imports from 'ui' and 'services' will work
 from ui.mcp_client import MCPClient
-from services.syllabus_service import SyllabusService
 
 client = MCPClient()
 
 st.set_page_config(page_title="AI Study Coach", layout="wide")
 
+# Fetch everything the tabs read from the knowledge graph in a single round trip
+try:
+    graph_result, weak_result = client.call_tools([
+        ("knowledge.get_graph", {"student_id": "user_1"}),
+        ("knowledge.get_weak_topics", {"student_id": "user_1", "limit": 5}),
+    ])
+except Exception as e:
+    graph_result = weak_result = {"_error": str(e)}
+
 tab1, tab2, tab3, tab4, tab5 = st.tabs([
     "Upload Syllabus",
     "Extracted Topics",
@@ -34,11 +44,37 @@ with tab1:
         pdf_path = os.path.join(base_dir, "syllabus.pdf")
         with open(pdf_path, "wb") as f:
             f.write(pdf.getbuffer())
-        service = SyllabusService()
-        extracted_text = service.extract_text_from_pdf(pdf_path)
-        result = client.call_tool("syllabus.parse", {"text": extracted_text})
+        # Same PDF as another student (or an earlier upload)? Then the hash is enough
+        pdf_bytes = pdf.getvalue()
+        digest = hashlib.sha256(pdf_bytes).hexdigest()
+        result = client.call_tool("syllabus.parse_pdf", {"sha256": digest})
+        if not result.get("found"):
+            progress = st.progress(0.0, text="Reading syllabus...")
+            partial = st.empty()
+            # Pages are extracted in parallel; show the topics found so far while the rest is read
+            stream = client.call_tool_stream("syllabus.parse_pdf", {
+                "sha256": digest,
+                "pdf_base64": base64.b64encode(pdf_bytes).decode("ascii"),
+            })
+            while True:
+                try:
+                    update = next(stream)
+                except StopIteration as stop:
+                    result = stop.value or {}
+                    break
+                if update.get("page_count"):
+                    progress.progress(
+                        update["pages"] / update["page_count"],
+                        text=f"Read {update['pages']} of {update['page_count']} pages",
+                    )
+                partial.markdown("\n".join(f"- {t}" for t in update.get("topics", [])) or "_No topics yet_")
+            partial.empty()
+            progress.empty()
+        extracted_text = result.get("raw_text", "")
         st.session_state["topics"] = result.get("topics", [])
-        st.success("Syllabus processed")
+        if result.get("timed_out"):
+            st.warning(f"Stopped after {result['pages']} of {result['page_count']} pages (time limit); later topics may be missing")
+        st.success("Syllabus processed" + (" (cached)" if result.get("cached") else ""))
         st.text_area("Preview", value=extracted_text, height=300)
 
 with tab2:
@@ -54,12 +90,7 @@ with tab3:
     topics = st.session_state.get("topics", [])
     # If no topics in session, try getting from knowledge graph if available
     if not topics:
-         try:
-            res = client.call_tool("knowledge.get_graph", {"student_id": "user_1"})
-            g = res.get("graph", {}).get("topics", {})
-            topics = list(g.keys())
-         except:
-            pass
+        topics = list(graph_result.get("graph", {}).get("topics", {}).keys())
 
     days = st.selectbox("Plan duration (days)", [3, 7, 14, 30], index=1)
     
@@ -68,19 +99,15 @@ with tab3:
             st.warning("No topics found. Please upload a syllabus or ensure knowledge graph is populated.")
         else:
             with st.spinner("Consulting LLM for personalized plan..."):
-                # Get current mastery
-                try:
-                    res = client.call_tool("knowledge.get_graph", {"student_id": "user_1"})
-                    graph_topics = res.get("graph", {}).get("topics", {})
-                    # Simplify state to topic->mastery map
-                    student_state = {t: data.get("mastery", 0) for t, data in graph_topics.items()}
-                except:
-                    student_state = {}
+                # Current mastery, simplified to a topic->mastery map
+                graph_topics = graph_result.get("graph", {}).get("topics", {})
+                student_state = {t: data.get("mastery", 0) for t, data in graph_topics.items()}
 
                 plan_response = client.call_tool("llm.studyplan", {
                     "topics": topics, 
                     "days": days, 
-                    "student_state": student_state
+                    "student_state": student_state,
+                    "student_id": "user_1",
                 })
                 
                 # Store
@@ -112,8 +139,9 @@ with tab3:
 
 with tab4:
     try:
-        result = client.call_tool("knowledge.get_graph", {"student_id": "user_1"})
-        graph = result.get("graph", {})
+        if "_error" in graph_result:
+            raise RuntimeError(graph_result["_error"])
+        graph = graph_result.get("graph", {})
         topics = graph.get("topics", {})
         rows = [
             {
@@ -136,11 +164,12 @@ with tab4:
 
 with tab5:
     try:
-        weak = client.call_tool("knowledge.get_weak_topics", {"student_id": "user_1", "limit": 5})
-        result = client.call_tool("knowledge.get_graph", {"student_id": "user_1"})
-        graph = result.get("graph", {})
+        for res in (weak_result, graph_result):
+            if "_error" in res:
+                raise RuntimeError(res["_error"])
+        graph = graph_result.get("graph", {})
         topics = graph.get("topics", {})
-        names = weak.get("topics", [])
+        names = weak_result.get("topics", [])
         if names:
             st.subheader("Weakest Topics")
             for name in names:
@@ -1,15 +1,70 @@
-import requests
+import json
+
+from llm_runtime.http_pool import HTTPPool, get_pool
 
 
 class MCPClient:
-    def __init__(self, base_url: str = "http://127.0.0.1:8000"):
+    def __init__(self, base_url: str = "http://127.0.0.1:8000", pool: HTTPPool = None):
         self.base_url = base_url.rstrip("/")
+        self.pool = pool or get_pool()
 
     def call_tool(self, name: str, args: dict) -> dict:
         payload = {"name": name, "args": args}
         url = f"{self.base_url}/call"
-        r = requests.post(url, json=payload, timeout=30)
+        r = self.pool.post(url, json=payload, timeout=30)
         r.raise_for_status()
         data = r.json()
         return data.get("result", {})
 
+    def call_tools(self, calls: list) -> list:
+        """
+        Run several tool calls in one round trip through /call_batch.
+
+        Args:
+            calls (list): (name, args) pairs.
+
+        Returns:
+            list: One result per call, in order. A call that failed on the server
+            yields {"_error": message} instead of raising.
+        """
+        payload = {"calls": [{"name": name, "args": args} for name, args in calls]}
+        url = f"{self.base_url}/call_batch"
+        r = self.pool.post(url, json=payload, timeout=30)
+        r.raise_for_status()
+        data = r.json()
+        return [
+            {"_error": item["error"]} if "error" in item else item.get("result", {})
+            for item in data.get("results", [])
+        ]
+
+    def call_tool_stream(self, name: str, args: dict):
+        """
+        Call a tool through /call_stream, yielding chunks as the server sends them.
+
+        The generator's return value is the tool's final result.
+        """
+        payload = {"name": name, "args": args}
+        url = f"{self.base_url}/call_stream"
+        with self.pool.post(url, json=payload, timeout=30, stream=True) as r:
+            r.raise_for_status()
+            event = "message"
+            for raw in r.iter_lines():
+                line = raw.decode("utf-8")
+                if not line:
+                    event = "message"
+                    continue
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                    continue
+                if not line.startswith("data:"):
+                    continue
+                data = json.loads(line[len("data:"):])
+                if event == "done":
+                    return data.get("result", {})
+                if event == "error":
+                    raise RuntimeError(data.get("error", "Tool stream failed"))
+                yield data.get("chunk")
+        return {}
+
+    def pool_stats(self) -> dict:
+        return self.pool.stats()
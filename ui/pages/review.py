@@ -12,6 +12,22 @@ from ui.mcp_client import MCPClient
 
 client = MCPClient()
 
+
+def stream_items(name, args, render):
+    """Call a streaming tool, rendering the items received so far; returns the final result."""
+    items = []
+    placeholder = st.empty()
+    stream = client.call_tool_stream(name, args)
+    while True:
+        try:
+            item = next(stream)
+        except StopIteration as stop:
+            placeholder.empty()
+            return stop.value or {}
+        items.append(item)
+        with placeholder.container():
+            render(items)
+
 st.title("Review Topic")
 
 topic = st.session_state.get("selected_topic", None)
@@ -23,18 +39,14 @@ st.header(f"Topic: {topic}")
 
 # --- Explanation ---
 explain_key = f"explain_{topic}"
-if explain_key not in st.session_state:
-    with st.spinner("Generating explanation..."):
-        # We assume context is not strictly needed or unavailable here, or could be fetched.
-        # Prompt only asked to call 'llm.explain' for the selected topic.
-        resp = client.call_tool("llm.explain", {"topic": topic})
-        if isinstance(resp, dict):
-            st.session_state[explain_key] = resp.get("explanation", str(resp))
-        else:
-            st.session_state[explain_key] = str(resp)
-
 st.subheader("Explanation")
-st.write(st.session_state[explain_key])
+if explain_key not in st.session_state:
+    # Render tokens as they arrive instead of waiting for the whole answer.
+    # We assume context is not strictly needed or unavailable here, or could be fetched.
+    chunks = client.call_tool_stream("llm.explain", {"topic": topic, "student_id": "user_1"})
+    st.session_state[explain_key] = st.write_stream(chunks)
+else:
+    st.write(st.session_state[explain_key])
 
 st.divider()
 
@@ -43,7 +55,12 @@ fc_key = f"flashcards_{topic}"
 
 if st.button("Generate Flashcards"):
     with st.spinner("Generating flashcards..."):
-        resp = client.call_tool("llm.flashcards", {"topic": topic, "count": 5})
+        # Each card is shown as soon as the model has finished writing it
+        resp = stream_items(
+            "llm.flashcards",
+            {"topic": topic, "count": 5, "student_id": "user_1"},
+            lambda cards: st.markdown("\n".join(f"- {fc.get('q', 'Question')}" for fc in cards)),
+        )
         # Check if fallback or real list
         if "flashcards" in resp:
             st.session_state[fc_key] = resp["flashcards"]
@@ -66,7 +83,11 @@ mcq_key = f"mcqs_{topic}"
 
 if st.button("Generate MCQs"):
     with st.spinner("Generating MCQs..."):
-        resp = client.call_tool("llm.generate_mcq", {"topic": topic, "count": 3})
+        resp = stream_items(
+            "llm.generate_mcq",
+            {"topic": topic, "count": 3, "student_id": "user_1"},
+            lambda mcqs: st.markdown("\n".join(f"{i + 1}. {q.get('question', '')}" for i, q in enumerate(mcqs))),
+        )
         if "mcqs" in resp:
             st.session_state[mcq_key] = resp["mcqs"]
         else:
@@ -94,6 +115,7 @@ if mcq_key in st.session_state:
         if submitted:
             score = 0
             total = len(mcqs)
+            events = []
             
             for i, q in enumerate(mcqs):
                 user_choice = answers.get(i)
@@ -107,11 +129,14 @@ if mcq_key in st.session_state:
 
                 if user_choice == correct_text:
                     score += 1
-                    client.call_tool("knowledge.update", {"student_id": "user_1", "topic": topic, "delta": 5})
+                    events.append({"topic": topic, "delta": 5})
                     st.success(f"Q{i+1}: Correct!")
                 else:
-                    client.call_tool("knowledge.update", {"student_id": "user_1", "topic": topic, "delta": -3})
+                    events.append({"topic": topic, "delta": -3})
                     st.error(f"Q{i+1}: Incorrect. The correct answer was: {correct_text}")
                     st.caption(f"Explanation: {q.get('explanation', '')}")
             
+            # One update for the whole quiz instead of one per question
+            if events:
+                client.call_tool("knowledge.update_many", {"student_id": "user_1", "events": events})
             st.metric("Final Score", f"{score}/{total}")
@@ -1,6 +1,171 @@
 import json
 import re
 
+# Characters that matter while scanning: outside any object only "{" does; inside one, the
+# brackets and quotes; inside a string, only the closing quote and escapes
+_OPEN = re.compile(r"\{")
+_STRUCTURE = re.compile(r'[{}\[\]"]')
+_STRING = re.compile(r'["\\]')
+_DECODER = json.JSONDecoder()
+
+
+class JSONStreamScanner:
+    """
+    Incremental, brace- and string-aware scanner for JSON objects in model output.
+
+    Text is fed in arbitrary pieces (whole responses or streamed tokens) and
+    every character is looked at once. Prose, code fences and stray braces
+    around the JSON are skipped. Events are reported as soon as the text
+    that completes them arrives:
+
+    - ("item", key, value): an object or array element of an array that is a
+      direct member of a top-level object, such as one flashcard of
+      {"flashcards": [...]}; key is that member's name.
+    - ("object", None, value): a complete top-level object.
+
+    Candidates that turn out not to be valid JSON (e.g. "{like this}" in
+    prose) are dropped and scanning carries on after them.
+
+    Example:
+        >>> scanner = JSONStreamScanner()
+        >>> scanner.feed('Sure! {"mcqs": [{"q": 1}, ')
+        [('item', 'mcqs', {'q': 1})]
+        >>> scanner.feed('{"q": 2}]} Done {"x": 3}')
+        [('item', 'mcqs', {'q': 2}), ('object', None, {'mcqs': [{'q': 1}, {'q': 2}]}), ('object', None, {'x': 3})]
+    """
+
+    def __init__(self):
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        # Text of the current top-level object, and of the array element being read
+        self._object = []
+        self._element = None
+        # Raw text of the last string closed directly inside the top-level object
+        self._string = []
+        self._last_string = None
+        self._array_key = None
+
+    def feed(self, text: str) -> list:
+        """
+        Scan the next piece of text.
+
+        Args:
+            text (str): The text following everything fed so far.
+
+        Returns:
+            list: The events completed by this piece, in order.
+        """
+        events = []
+        pos = 0
+        end = len(text)
+        while pos < end:
+            if self._depth == 0:
+                m = _OPEN.search(text, pos)
+                if m is None:
+                    break
+                pos = m.end()
+                self._depth = 1
+                self._object = ["{"]
+                self._last_string = None
+                continue
+            if self._in_string:
+                pos = self._scan_string(text, pos)
+                continue
+            m = _STRUCTURE.search(text, pos)
+            if m is None:
+                self._append(text[pos:])
+                break
+            ch = m.group()
+            self._append(text[pos:m.end()])
+            pos = m.end()
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    self._string = ['"']
+            elif ch in "{[":
+                self._open(ch)
+            else:
+                self._close(events)
+        return events
+
+    def _append(self, piece: str) -> None:
+        self._object.append(piece)
+        if self._element is not None:
+            self._element.append(piece)
+
+    def _scan_string(self, text: str, pos: int) -> int:
+        if self._escaped:
+            # The escaped character was the first one of this piece
+            self._escaped = False
+            piece = text[pos]
+            self._append(piece)
+            if self._depth == 1:
+                self._string.append(piece)
+            return pos + 1
+        m = _STRING.search(text, pos)
+        stop = m.end() if m is not None else len(text)
+        piece = text[pos:stop]
+        self._append(piece)
+        if self._depth == 1:
+            self._string.append(piece)
+        if m is not None:
+            if m.group() == "\\":
+                self._escaped = True
+            else:
+                self._in_string = False
+                if self._depth == 1:
+                    self._last_string = "".join(self._string)
+        return stop
+
+    def _open(self, ch: str) -> None:
+        self._depth += 1
+        if self._depth == 2 and ch == "[":
+            # The string just before a member's "[" is its name
+            self._array_key = _loads_or_none(self._last_string)
+        elif self._depth == 3 and self._array_key is not None and self._element is None:
+            self._element = [ch]
+
+    def _close(self, events: list) -> None:
+        self._depth -= 1
+        if self._depth == 2 and self._element is not None:
+            value = _loads_or_none("".join(self._element))
+            self._element = None
+            if value is not None:
+                events.append(("item", self._array_key, value))
+        elif self._depth == 1:
+            self._array_key = None
+        elif self._depth == 0:
+            value = _loads_or_none("".join(self._object))
+            self._object = []
+            if isinstance(value, dict):
+                events.append(("object", None, value))
+
+
+def _loads_or_none(text):
+    if text is None:
+        return None
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return None
+
+
+def iter_json_events(chunks):
+    """
+    Scan streamed text and yield JSONStreamScanner events as they complete.
+
+    Args:
+        chunks (iterable): Text fragments, in order (e.g. from OllamaClient.ask_stream).
+
+    Yields:
+        tuple: ("item", key, value) and ("object", None, value) events.
+    """
+    scanner = JSONStreamScanner()
+    for chunk in chunks:
+        yield from scanner.feed(chunk)
+
+
 def extract_json_from_text(text: str) -> dict:
     """
     Finds the first JSON object in text and returns the parsed dict.
@@ -18,14 +183,24 @@ def extract_json_from_text(text: str) -> dict:
         >>> text = "Here is the data: {\"key\": \"value\"} end."
         >>> extract_json_from_text(text)
         {'key': 'value'}
+        >>> extract_json_from_text('{"a": 1} and also {"b": 2}')
+        {'a': 1}
     """
-    # Find first balanced JSON object using regex for { ... }
-    # This is a naive regex but works for the prompt's context
-    m = re.search(r'\{.*\}', text, flags=re.S)
-    if not m:
+    start = text.find("{")
+    if start < 0:
         raise ValueError("No JSON object found")
-    candidate = m.group(0)
-    return json.loads(candidate)
+    # Usually the first brace opens the answer: let the C decoder read it and ignore what follows
+    try:
+        value, _ = _DECODER.raw_decode(text, start)
+        if isinstance(value, dict):
+            return value
+    except json.JSONDecodeError:
+        pass
+    # Otherwise brace matching skips prose and stray braces around the first real object
+    for kind, _, value in JSONStreamScanner().feed(text):
+        if kind == "object":
+            return value
+    raise ValueError("No JSON object found")
 
 def safe_parse_json(text: str) -> dict:
     """
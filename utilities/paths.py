@@ -0,0 +1,16 @@
+import os
+
+# Where local state goes, relative to the working directory unless set:
+# CACHE_DIR for the SQLite caches and stores, EXPORTS_DIR for exported datasets.
+# Like KNOWLEDGE_STORE_PATH, they are read when a default path is built, so
+# set them before the server or a CLI starts.
+
+
+def cache_path(*parts: str) -> str:
+    """Path under CACHE_DIR (default: cache/)."""
+    return os.path.join(os.environ.get("CACHE_DIR") or "cache", *parts)
+
+
+def export_path(*parts: str) -> str:
+    """Path under EXPORTS_DIR (default: exports/)."""
+    return os.path.join(os.environ.get("EXPORTS_DIR") or "exports", *parts)